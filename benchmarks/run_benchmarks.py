@@ -0,0 +1,407 @@
+""" Times and memory-profiles the readers, grid loaders and writers of readice.
+
+Every benchmark runs in its own Python process, so that its peak RSS isn't polluted by the benchmarks before it and
+the grid caches start cold. The results (wall times, decode throughput in MB/s, tracemalloc peak and peak RSS) are
+written as JSON, and a previous results file can be compared against to flag regressions:
+
+    python benchmarks/run_benchmarks.py --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results.json --threshold 0.2
+
+The inputs are the sample files in tests/test_files. The multi-file benchmarks replicate them under new (dated) names
+in a temporary directory, see --files. There is no AMSR-E sample file, so a netCDF file with the same variable layout
+is written for that benchmark.
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_FILES = os.path.join(REPO_DIR, 'tests', 'test_files')
+
+sys.path.insert(0, REPO_DIR)
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+def _sample(name):
+
+    return(os.path.join(TEST_FILES, name))
+
+
+def _replicate(tmp_dir, name, n_files, pattern):
+
+    # copies a sample file n_files times, with a date in each name so that read_many can parse a time axis
+
+    start = datetime.date(2019, 1, 1)
+
+    file_locations = []
+
+    for i in range(n_files):
+        file_location = os.path.join(tmp_dir, pattern.format(date=(start + datetime.timedelta(days=i)).strftime('%Y%m%d')))
+        shutil.copyfile(_sample(name), file_location)
+        file_locations.append(file_location)
+
+    return(file_locations)
+
+
+def _amsr_e_file(tmp_dir):
+
+    from netCDF4 import Dataset
+
+    file_location = os.path.join(tmp_dir, 'AMSR_E_L3_SeaIce25km_V15_20100101.nc')
+
+    with Dataset(file_location, 'w') as dataset:
+        dataset.createDimension('YDim', 448)
+        dataset.createDimension('XDim', 304)
+        variable = dataset.createVariable('SI_25km_NH_36V_DAY', 'i2', ('YDim', 'XDim'))
+        variable[:] = np.random.default_rng(0).integers(1000, 3000, size=(448, 304), dtype=np.int16)
+
+    return(file_location)
+
+
+# Each benchmark is setup(tmp_dir, n_files) -> (function, args, kwargs, bytes read). cold=True empties the grid cache
+# before every repeat, so that the grid (and not a cache lookup) is what gets timed.
+
+def _setup_concentration(tmp_dir, n_files):
+    file_location = _sample('nt_19781111_n07_v1.1_n.bin')
+    from readice.read_file import concentration
+    return(concentration, (file_location, 'n'), {}, os.path.getsize(file_location))
+
+
+def _setup_SSMI_Tb(tmp_dir, n_files):
+    file_location = _sample('tb_f17_20190711_v5_n37h.bin')
+    from readice.read_file import SSMI_Tb
+    return(SSMI_Tb, (file_location, 'n', 37), {}, os.path.getsize(file_location))
+
+
+def _setup_SSMI_Tb_with_coords(tmp_dir, n_files):
+    file_location = _sample('tb_f17_20190711_v5_n37h.bin')
+    from readice.read_file import SSMI_Tb
+    return(SSMI_Tb, (file_location, 'n', 37), {'with_coords': True}, os.path.getsize(file_location))
+
+
+def _setup_piomas(tmp_dir, n_files):
+    file_location = _sample('heff.H1993')
+    from readice.read_file import piomas
+    return(piomas, (file_location,), {}, os.path.getsize(file_location))
+
+
+def _setup_AMSR_E(tmp_dir, n_files):
+    file_location = _amsr_e_file(tmp_dir)
+    from readice.read_file import AMSR_E
+    return(AMSR_E, (file_location, 36, 'v', 'n'), {}, 448 * 304 * 2)
+
+
+def _setup_polar_stereo(tmp_dir, n_files):
+    from readice.get_geo_coords import polar_stereo
+    return(polar_stereo, (), {'resolution': 25, 'hemisphere': 'n'}, 0)
+
+
+def _setup_polar_stereo_12(tmp_dir, n_files):
+    from readice.get_geo_coords import polar_stereo
+    return(polar_stereo, (), {'resolution': 12.5, 'hemisphere': 'n'}, 0)
+
+
+def _setup_piomas_grid(tmp_dir, n_files):
+    from readice.get_geo_coords import piomas_grid
+    return(piomas_grid, (), {}, 0)
+
+
+def _setup_dict_to_nc(tmp_dir, n_files):
+    from readice.read_file import read_many
+    from readice.tools import dict_to_nc
+    file_locations = _replicate(tmp_dir, 'tb_f17_20190711_v5_n37h.bin', 30, 'tb_f17_{date}_v5_n37h.bin')
+    information = read_many(file_locations, 'SSMI_Tb', hemisphere='n', frequency=37)
+    return(dict_to_nc, (information, os.path.join(tmp_dir, 'out.nc'), 'Tb'), {}, information['data'].nbytes)
+
+
+def _setup_plot(tmp_dir, n_files):
+    from readice.read_file import SSMI_Tb
+    from readice.tools import plot
+    information = SSMI_Tb(_sample('tb_f17_20190711_v5_n37h.bin'), 'n', 37, with_coords=True)
+    return(plot, (information['lon'], information['lat'], information['data']),
+           {'land': False, 'show': False, 'save_dir': os.path.join(tmp_dir, 'plot.png')}, 0)
+
+
+def _setup_plot_frames(tmp_dir, n_files):
+    from readice.read_file import read_many
+    from readice.tools import plot_frames
+    file_locations = _replicate(tmp_dir, 'tb_f17_20190711_v5_n37h.bin', 10, 'tb_f17_{date}_v5_n37h.bin')
+    information = read_many(file_locations, 'SSMI_Tb', hemisphere='n', frequency=37)
+    return(plot_frames, (information['lon'], information['lat'], information['data']),
+           {'file_pattern': os.path.join(tmp_dir, 'frame_{:03d}.png'), 'land': False}, 0)
+
+
+def _setup_read_many(tmp_dir, n_files):
+    from readice.read_file import read_many
+    file_locations = _replicate(tmp_dir, 'tb_f17_20190711_v5_n37h.bin', n_files, 'tb_f17_{date}_v5_n37h.bin')
+    return(read_many, (file_locations, 'SSMI_Tb'), {'hemisphere': 'n', 'frequency': 37},
+           sum(os.path.getsize(f) for f in file_locations))
+
+
+def _setup_read_many_threads(tmp_dir, n_files):
+    function, args, kwargs, n_bytes = _setup_read_many(tmp_dir, n_files)
+    return(function, args, {**kwargs, 'workers': os.cpu_count()}, n_bytes)
+
+
+def _setup_read_many_concentration(tmp_dir, n_files):
+    from readice.read_file import read_many
+    file_locations = _replicate(tmp_dir, 'nt_19781111_n07_v1.1_n.bin', n_files, 'nt_{date}_n07_v1.1_n.bin')
+    return(read_many, (file_locations, 'concentration'), {'hemisphere': 'n'},
+           sum(os.path.getsize(f) for f in file_locations))
+
+
+def _setup_loop_SSMI_Tb(tmp_dir, n_files):
+
+    # the pre-read_many way of building a cube: one call and one array per file, then a stack
+
+    from readice.read_file import SSMI_Tb
+
+    file_locations = _replicate(tmp_dir, 'tb_f17_20190711_v5_n37h.bin', n_files, 'tb_f17_{date}_v5_n37h.bin')
+
+    def loop(file_locations):
+        return(np.stack([SSMI_Tb(f, 'n', 37) for f in file_locations]))
+
+    return(loop, (file_locations,), {}, sum(os.path.getsize(f) for f in file_locations))
+
+
+def _setup_piomas_years(tmp_dir, n_files):
+
+    from readice.read_file import piomas
+
+    file_locations = []
+
+    for year in range(1993, 1993 + max(1, n_files // 12)):
+        file_location = os.path.join(tmp_dir, f'heff.H{year}')
+        shutil.copyfile(_sample('heff.H1993'), file_location)
+        file_locations.append(file_location)
+
+    def loop(file_locations):
+        return(np.concatenate([piomas(f) for f in file_locations]))
+
+    return(loop, (file_locations,), {}, sum(os.path.getsize(f) for f in file_locations))
+
+
+BENCHMARKS = {'concentration': (_setup_concentration, False),
+              'SSMI_Tb': (_setup_SSMI_Tb, False),
+              'SSMI_Tb_with_coords': (_setup_SSMI_Tb_with_coords, True),
+              'piomas': (_setup_piomas, False),
+              'AMSR_E': (_setup_AMSR_E, False),
+              'polar_stereo_25': (_setup_polar_stereo, True),
+              'polar_stereo_12.5': (_setup_polar_stereo_12, True),
+              'piomas_grid': (_setup_piomas_grid, True),
+              'dict_to_nc': (_setup_dict_to_nc, False),
+              'plot': (_setup_plot, False),
+              'plot_frames_10': (_setup_plot_frames, False),
+              'read_many_SSMI_Tb': (_setup_read_many, False),
+              'read_many_SSMI_Tb_threads': (_setup_read_many_threads, False),
+              'read_many_concentration': (_setup_read_many_concentration, False),
+              'loop_SSMI_Tb': (_setup_loop_SSMI_Tb, False),
+              'piomas_years': (_setup_piomas_years, False)}
+
+
+def run_one(name, repeat, n_files):
+
+    """ Runs a single benchmark in this process and returns its results as a dictionary. """
+
+    from readice import get_geo_coords
+
+    setup, cold = BENCHMARKS[name]
+
+    with tempfile.TemporaryDirectory(prefix='readice_bench_') as tmp_dir:
+
+        function, args, kwargs, n_bytes = setup(tmp_dir, n_files)
+
+        # one untimed call, so imports and one-off initialisation aren't counted
+
+        function(*args, **kwargs)
+
+        times = []
+
+        for i in range(repeat):
+
+            if cold:
+                get_geo_coords.clear_cache()
+
+            start = time.perf_counter()
+            function(*args, **kwargs)
+            times.append(time.perf_counter() - start)
+
+        if cold:
+            get_geo_coords.clear_cache()
+
+        tracemalloc.start()
+        function(*args, **kwargs)
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    best = min(times)
+
+    return({'name': name,
+            'repeat': repeat,
+            'times_s': times,
+            'min_s': best,
+            'median_s': statistics.median(times),
+            'bytes': n_bytes,
+            'mb_per_s': n_bytes / 1e6 / best if n_bytes and best > 0 else None,
+            'tracemalloc_peak_mb': traced_peak / 1e6,
+            'peak_rss_mb': _peak_rss_mb()})
+
+
+def _peak_rss_mb():
+
+    if resource is None:
+        return(None)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+
+    return(peak / 1e6 if sys.platform == 'darwin' else peak / 1e3)
+
+
+def run_all(names, repeat, n_files):
+
+    """ Runs each benchmark in a fresh interpreter and collects the results. """
+
+    results = []
+
+    for name in names:
+
+        command = [sys.executable, os.path.abspath(__file__), '--single', name, '--repeat', str(repeat),
+                   '--files', str(n_files)]
+
+        process = subprocess.run(command, capture_output=True, text=True)
+
+        if process.returncode != 0:
+            results.append({'name': name, 'error': process.stderr.strip().splitlines()[-1:]})
+            print(f'{name:30s} failed: {process.stderr.strip().splitlines()[-1:]}', file=sys.stderr)
+            continue
+
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        results.append(result)
+
+        throughput = f"{result['mb_per_s']:9.1f} MB/s" if result['mb_per_s'] else ' ' * 14
+        print(f"{name:30s} {result['min_s'] * 1000:10.2f} ms {throughput} {result['peak_rss_mb']:9.1f} MB RSS",
+              file=sys.stderr)
+
+    return(results)
+
+
+def machine_info():
+
+    """ Describes the machine and library versions, so that results files can be compared like for like. """
+
+    import numpy
+
+    return({'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'numpy': numpy.__version__,
+            'git_commit': _git_commit()})
+
+
+def _git_commit():
+
+    try:
+        return(subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return(None)
+
+
+def compare(results, baseline, threshold):
+
+    """ Lists the benchmarks that got slower (or hungrier) than baseline by more than threshold (a fraction).
+
+    Returns:
+        regressions (list): of (name, metric, baseline value, new value).
+
+    """
+
+    baseline = {result['name']: result for result in baseline['results'] if 'error' not in result}
+
+    regressions = []
+
+    for result in results:
+
+        old = baseline.get(result['name'])
+
+        if old is None or 'error' in result:
+            continue
+
+        for metric in ('min_s', 'peak_rss_mb'):
+            if old.get(metric) and result.get(metric) and result[metric] > old[metric] * (1 + threshold):
+                regressions.append((result['name'], metric, old[metric], result[metric]))
+
+    return(regressions)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*', help=f'benchmarks to run (default: all of {", ".join(BENCHMARKS)})')
+    parser.add_argument('--repeat', type=int, default=5, help='timed repeats of each benchmark')
+    parser.add_argument('--files', type=int, default=100, help='number of files in the multi-file benchmarks')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='a previous results file to check for regressions against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown counted as a regression')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+
+    args = parser.parse_args(argv)
+
+    if args.single:
+        print(json.dumps(run_one(args.single, args.repeat, args.files)))
+        return(0)
+
+    names = args.names or list(BENCHMARKS)
+
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+
+    report = {'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+              'machine': machine_info(),
+              'config': {'repeat': args.repeat, 'files': args.files},
+              'results': run_all(names, args.repeat, args.files)}
+
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(report, fout, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+
+        with open(args.compare) as fin:
+            regressions = compare(report['results'], json.load(fin), args.threshold)
+
+        for name, metric, old, new in regressions:
+            print(f'REGRESSION {name} {metric}: {old:.4g} -> {new:.4g}', file=sys.stderr)
+
+        return(1 if regressions else 0)
+
+    return(0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
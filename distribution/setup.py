@@ -7,13 +7,16 @@ setuptools.setup(
     author="Robbie Mallett",
     author_email="robbie.mallett.17@ucl.co.uk",
     url="https://github.com/robbiemallett/read_ice",
-    install_requires=['pandas',
-                      'numpy',
+    install_requires=['numpy',
                       'matplotlib',
                       'pyproj',
+                      'scipy',
                       'xarray',
                       'Pygments',
                       'netCDF4',
                       'cartopy'],
+    extras_require={'zarr': ['zarr', 'dask'],
+                    'dask': ['dask']},
+    entry_points={'xarray.backends': ['readice=readice.xarray_backend:ReadiceBackendEntrypoint']},
     python_requires='>=3.6',
 )
\ No newline at end of file
@@ -0,0 +1,106 @@
+import numpy as np
+from readice import flags
+
+
+def concentration_totals(concentration, area, threshold=0.15, masks=None, scale=flags.CONCENTRATION_SCALE):
+
+    """ Computes sea ice extent and area for every time step of a concentration cube.
+
+    Every time step (and every region) is reduced at once with a single matrix product over the flattened grid, so
+    40 years of daily fields take one pass rather than a Python loop per file.
+
+    Args:
+        concentration (numpy.array): 2D grid or (time, y, x) cube, e.g. from read_file.concentration or read_many
+        (packed uint8 values, e.g. with raw=True, are converted with a single table lookup). Masked cells of a
+        numpy masked array don't count.
+        area (numpy.array): cell areas in square km, e.g. from get_geo_coords.cell_area('ps', 25, 'n').
+        threshold (float): concentration (as a fraction) above which a cell counts towards the extent. Default 0.15.
+        masks (numpy.array or dict): optional, a boolean grid (or a dictionary of them, e.g. from
+        get_geo_coords.region_mask) restricting the totals to a region.
+        scale (float): the value representing 100 % concentration. Values above it, and NaNs, are treated as not
+        being sea ice. Defaults to 250 (Nasa Team); use 1 for concentrations that are already fractions.
+
+    Returns:
+        dictionary with keys 'extent' and 'area' (in square km): a float for a 2D grid, or an array with one value per
+        time step. If masks is a dictionary, each value is a dictionary of those, keyed like masks.
+
+    """
+
+    if np.ma.isMaskedArray(concentration):
+        concentration = np.ma.filled(concentration.astype(np.float64), np.nan)
+
+    concentration = np.asarray(concentration)
+
+    if scale == flags.CONCENTRATION_SCALE:
+        fraction = flags.concentration_fraction(concentration.reshape(-1, area.size), dtype=np.float64)
+    else:
+        fraction = concentration.reshape(-1, area.size) / scale
+
+    # flags and missing values (NaN) don't count
+
+    with np.errstate(invalid='ignore'):
+        fraction = np.where((fraction <= 1) & (fraction > 0), fraction, 0)
+
+    weights, names = _area_weights(area, masks)
+
+    totals = {'extent': (fraction >= threshold).astype(np.float64) @ weights,
+              'area': fraction @ weights}
+
+    return({key: _unpack(value, concentration.ndim, names) for key, value in totals.items()})
+
+
+def piomas_volume(thickness, area, masks=None):
+
+    """ Computes sea ice volume for every time step of a PIOMAS thickness cube.
+
+    PIOMAS 'heff' is the effective thickness (volume per unit area), so the volume is its area-weighted sum.
+
+    Args:
+        thickness (numpy.array): 2D grid or (time, y, x) cube of effective thickness in metres, e.g. from
+        read_file.piomas.
+        area (numpy.array): cell areas in square km, e.g. from get_geo_coords.cell_area('piomas', None, 'n').
+        masks (numpy.array or dict): optional, a boolean grid (or a dictionary of them) restricting the totals to a
+        region.
+
+    Returns:
+        volume (float or numpy.array): in cubic km, one value per time step (a dictionary of them if masks is a
+        dictionary).
+
+    """
+
+    thickness = np.asarray(thickness)
+
+    flat = np.nan_to_num(thickness.reshape(-1, area.size).astype(np.float64))
+
+    weights, names = _area_weights(area, masks)
+
+    return(_unpack(flat @ weights / 1000, thickness.ndim, names))
+
+
+def _area_weights(area, masks):
+
+    # an (n_cells, n_regions) matrix of cell areas, zero outside each region
+
+    area = np.asarray(area, dtype=np.float64).ravel()
+
+    if masks is None:
+        return(area[:, np.newaxis], None)
+
+    if isinstance(masks, dict):
+        names = list(masks.keys())
+        stacked = np.stack([np.asarray(masks[name], dtype=bool).ravel() for name in names], axis=1)
+        return(area[:, np.newaxis] * stacked, names)
+
+    return((area * np.asarray(masks, dtype=bool).ravel())[:, np.newaxis], None)
+
+
+def _unpack(totals, ndim, names):
+
+    # totals is (n_times, n_regions); a 2D input has a single time step, returned as a float
+
+    totals = totals[0] if ndim == 2 else totals.T
+
+    if names is None:
+        return(totals[0])
+
+    return({name: totals[i] for i, name in enumerate(names)})
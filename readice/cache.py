@@ -0,0 +1,259 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+# Decoded arrays are saved here as .npy files and served back memory-mapped, so a file is only decoded once however
+# many times an analysis is re-run. The size limit is in bytes; the least recently used arrays are evicted beyond it.
+
+CACHE_DIR = os.environ.get('READICE_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'readice', 'arrays'))
+
+MAX_CACHE_BYTES = int(float(os.environ.get('READICE_CACHE_SIZE', 10e9)))
+
+# bump to invalidate every cached array, e.g. if a reader's output changes
+
+CACHE_VERSION = 1
+
+_cache_bytes = None
+_cache_lock = threading.Lock()
+
+
+def read(file_location, reader, dtype=np.float32, content_hash=False, **kwargs):
+
+    """ Reads a file through the on-disk cache of decoded arrays.
+
+    The first read decodes the file with the read_file reader and saves the array to CACHE_DIR. Later reads (in any
+    process) return it memory-mapped, without reading or decoding the source file. Entries are keyed by the file's
+    path, size and modification time (or its contents, with content_hash) together with the reader and its arguments,
+    so a changed file or different arguments give a new entry.
+
+    Args:
+        file_location (str): location of the file to read (not an open file object).
+        reader (str or function): the read_file reader, e.g. 'SSMI_Tb', 'concentration' or read_file.piomas.
+        dtype (numpy.dtype): dtype of the cached values. Defaults to float32; ignored with raw=True, which caches the
+        packed values of the file.
+        content_hash (bool): If True, the entry is keyed by a hash of the file's contents rather than its path, size
+        and modification time, so copies of a file share an entry (at the cost of reading the file to hash it).
+        **kwargs: arguments for the reader other than file_location, e.g. hemisphere='n', frequency=37, raw=True.
+
+    Returns:
+        data (numpy.memmap): read-only array, as the reader would return it (without coordinates).
+
+    """
+
+    from readice import read_file
+
+    reader_name = reader if isinstance(reader, str) else reader.__name__
+
+    if kwargs.get('with_coords') or kwargs.get('mmap') or (kwargs.get('flags') == 'mask'):
+        raise ValueError('Only plain arrays can be cached, not with_coords, mmap or flags="mask".')
+
+    if hasattr(file_location, 'read'):
+        raise ValueError('Cache entries are keyed by the location of the file, so open file objects cannot be cached.')
+
+    if not kwargs.get('raw'):
+        kwargs['dtype'] = np.dtype(dtype).str
+
+    cache_file = os.path.join(CACHE_DIR, f'{_key(file_location, reader_name, kwargs, content_hash)}.npy')
+
+    try:
+        data = np.load(cache_file, mmap_mode='r')
+
+    except (OSError, ValueError):
+        data = None
+
+    if data is not None:
+
+        # the modification time of an entry records when it was last used, for the LRU eviction
+
+        try:
+            os.utime(cache_file)
+        except OSError:
+            pass
+
+        return(data)
+
+    data = getattr(read_file, reader_name)(file_location, **kwargs)
+
+    try:
+        _write(cache_file, data)
+
+        return(np.load(cache_file, mmap_mode='r'))
+
+    except OSError:
+        # the cache isn't writable, or the entry was evicted straight away (e.g. by another process, or because it is
+        # larger than MAX_CACHE_BYTES), so just return the decoded array
+        return(data)
+
+
+def cache_info():
+
+    """ Describes the cache.
+
+    Returns:
+        dictionary with the 'directory', the number of 'entries', their total 'bytes' and the 'limit' in bytes.
+
+    """
+
+    entries = _entries()
+
+    return({'directory': CACHE_DIR,
+            'entries': len(entries),
+            'bytes': sum(size for path, size, used in entries),
+            'limit': MAX_CACHE_BYTES})
+
+
+def clear_cache():
+
+    """ Deletes every array in the cache.
+
+    Returns:
+        the number of bytes freed.
+
+    """
+
+    return(evict(0))
+
+
+def evict(max_bytes=None):
+
+    """ Deletes the least recently used arrays until the cache takes at most max_bytes.
+
+    Args:
+        max_bytes (int): optional, the size to shrink the cache to. Defaults to MAX_CACHE_BYTES.
+
+    Returns:
+        the number of bytes freed.
+
+    """
+
+    global _cache_bytes
+
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+
+    with _cache_lock:
+
+        entries = sorted(_entries(), key=lambda entry: entry[2])
+
+        total = sum(size for path, size, used in entries)
+
+        freed = 0
+
+        for path, size, used in entries:
+
+            if total - freed <= max_bytes:
+                break
+
+            try:
+                os.remove(path)
+                freed += size
+            except OSError:
+                pass
+
+        _cache_bytes = total - freed
+
+    return(freed)
+
+
+def _key(file_location, reader_name, kwargs, content_hash):
+
+    if content_hash:
+
+        digest = hashlib.sha1()
+
+        with open(file_location, 'rb') as fin:
+            for block in iter(lambda: fin.read(1 << 20), b''):
+                digest.update(block)
+
+        source = digest.hexdigest()
+
+    else:
+        stat = os.stat(file_location)
+        source = [os.path.abspath(file_location), stat.st_size, stat.st_mtime_ns]
+
+    description = json.dumps([CACHE_VERSION, source, reader_name, sorted(kwargs.items())], default=str)
+
+    return(hashlib.sha1(description.encode('UTF-8')).hexdigest())
+
+
+def _write(cache_file, data):
+
+    global _cache_bytes
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    tmp_file = f'{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp.npy'
+
+    np.save(tmp_file, np.asarray(data))
+
+    os.replace(tmp_file, cache_file)
+
+    size = os.path.getsize(cache_file)
+
+    # the total is only rescanned when the running estimate says the limit has been passed
+
+    with _cache_lock:
+
+        if _cache_bytes is None:
+            _cache_bytes = sum(entry[1] for entry in _entries())
+        else:
+            _cache_bytes += size
+
+        over = _cache_bytes > MAX_CACHE_BYTES
+
+    if over:
+        evict()
+
+
+def _entries():
+
+    # (path, size, last used) of every cached array
+
+    entries = []
+
+    try:
+        scan = os.scandir(CACHE_DIR)
+    except OSError:
+        return(entries)
+
+    with scan:
+        for entry in scan:
+            if entry.name.endswith('.npy') and not entry.name.endswith('.tmp.npy'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+
+    return(entries)
+
+
+def main(argv=None):
+
+    """ Command line interface: python -m readice.cache info|clear|evict [--max-bytes N]. """
+
+    parser = argparse.ArgumentParser(prog='python -m readice.cache', description='Inspect or clear the readice cache of '
+                                                                                 'decoded arrays.')
+    parser.add_argument('command', choices=['info', 'clear', 'evict'])
+    parser.add_argument('--max-bytes', type=float, default=None, help='size to shrink the cache to with evict')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        info = cache_info()
+        print(f"{info['directory']}: {info['entries']} arrays, {info['bytes'] / 1e6:.1f} MB "
+              f"(limit {info['limit'] / 1e6:.1f} MB)")
+
+    elif args.command == 'clear':
+        print(f'Freed {clear_cache() / 1e6:.1f} MB')
+
+    else:
+        print(f'Freed {evict(None if args.max_bytes is None else int(args.max_bytes)) / 1e6:.1f} MB')
+
+    return(0)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+import numpy as np
+from readice import flags, instrument
+
+# A climatology is kept as running sums and counts per bin (calendar month, day of year or season), so memory grows
+# with the grid times the number of bins rather than with the number of days read. Accumulators built on separate
+# chunks of files (e.g. in worker processes) are combined with merge.
+
+BINS = {'month': 12, 'dayofyear': 366, 'season': 4}
+
+SEASONS = ('DJF', 'MAM', 'JJA', 'SON')
+
+# calendar month (1-12) -> index in SEASONS
+
+_SEASON_OF_MONTH = np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
+
+# first day of year (0 based) of each month on a leap year calendar
+
+_LEAP_MONTH_START = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+class Climatology:
+
+    """ Running per-bin sums and counts of gridded data, from which means, standard deviations and anomalies follow.
+
+    Missing values (NaN, numpy masked cells and, depending on values, NSIDC flags) are left out of both the sums and
+    the counts, so each cell is averaged over the time steps where it has data, e.g.
+
+        climatology = Climatology((448, 304), bins='month', values='concentration')
+
+        for time, data in read_file.iter_concentration(files, 'n'):
+            climatology.add(data, time)
+
+        means = climatology.mean()                   # (12, 448, 304)
+        anomaly = climatology.anomaly(data, time)    # (448, 304)
+
+    Attributes:
+        sums, sums_of_squares (numpy.array): (n_bins, *shape) float64 running totals.
+        counts (numpy.array): (n_bins, *shape) int32 number of valid values in each bin.
+
+    """
+
+    def __init__(self, shape, bins='month', values=None):
+
+        """
+        Args:
+            shape (tuple): shape of the grid of each time step.
+            bins (str): 'month' (12 calendar months), 'dayofyear' (366 days, 29 February being day 60 so that later
+            days keep their calendar position in leap years: day 61 is 1 March) or 'season' (DJF, MAM, JJA, SON).
+            values (str): how missing values are recognised, besides NaN. None for data that are already physical
+            values, 'concentration' for Nasa Team concentrations (0-250 with flags above 250, converted to fractions)
+            or 'tb' for brightness temperatures (0 means no data).
+        """
+
+        if bins not in BINS:
+            raise ValueError(f'bins must be one of {sorted(BINS)}, not {bins}.')
+
+        if values not in (None, 'concentration', 'tb'):
+            raise ValueError(f"values must be None, 'concentration' or 'tb', not {values}.")
+
+        self.shape = tuple(shape)
+        self.bins = bins
+        self.values = values
+
+        self.sums = np.zeros((BINS[bins],) + self.shape, dtype=np.float64)
+        self.sums_of_squares = np.zeros_like(self.sums)
+        self.counts = np.zeros(self.sums.shape, dtype=np.int32)
+
+    def bin_index(self, times):
+
+        """ Maps timestamps to bin indices (0 to n_bins - 1).
+
+        Args:
+            times (numpy.datetime64 or array of them)
+
+        Returns:
+            index (numpy.array): int array of the shape of times.
+
+        """
+
+        times = np.asarray(times, dtype='datetime64[D]')
+
+        if np.isnat(times).any():
+            raise ValueError('Every time step needs a date to be binned; got NaT.')
+
+        months = times.astype('datetime64[M]')
+        month = (months.astype(np.int64) % 12) + 1
+
+        if self.bins == 'month':
+            return(month - 1)
+
+        if self.bins == 'season':
+            return(_SEASON_OF_MONTH[month])
+
+        # day of year on a leap year calendar
+
+        day = (times - months).astype(np.int64)
+
+        return(_LEAP_MONTH_START[month - 1] + day)
+
+    def add(self, data, times):
+
+        """ Adds a time step, or a (time, *shape) cube with an array of times, to the running totals.
+
+        A cube is added bin by bin, each bin being summed over time in one vectorised reduction.
+
+        Args:
+            data (numpy.array): 2D grid or (time, *shape) cube, e.g. from read_file.read_many or iter_files.
+            times (numpy.datetime64 or array): the date of the grid, or of each step of the cube.
+
+        Returns:
+            self
+
+        """
+
+        times = np.atleast_1d(np.asarray(times, dtype='datetime64[D]'))
+
+        values = self._values(data).reshape((-1,) + self.shape)
+
+        if values.shape[0] != times.size:
+            raise ValueError(f'Got {values.shape[0]} time steps but {times.size} times.')
+
+        index = self.bin_index(times)
+
+        with instrument.stage('climatology', values.nbytes):
+
+            if np.all(index == index[0]):
+                self._add_bin(index[0], values)
+
+            else:
+                for i in np.unique(index):
+                    self._add_bin(i, values[index == i])
+
+        return(self)
+
+    def update(self, steps):
+
+        """ Adds every (time, data) pair of an iterator, e.g. read_file.iter_files, holding one step at a time.
+
+        Returns:
+            self
+
+        """
+
+        for time, data in steps:
+            self.add(data, time)
+
+        return(self)
+
+    def merge(self, other):
+
+        """ Adds the totals of another Climatology of the same grid and bins, e.g. one built by another worker.
+
+        Returns:
+            self
+
+        """
+
+        if (other.shape != self.shape) or (other.bins != self.bins):
+            raise ValueError(f'Can only merge climatologies of the same shape and bins, not {other.shape} '
+                             f'{other.bins} into {self.shape} {self.bins}.')
+
+        self.sums += other.sums
+        self.sums_of_squares += other.sums_of_squares
+        self.counts += other.counts
+
+        return(self)
+
+    def mean(self):
+
+        """ Returns the (n_bins, *shape) mean of each bin, NaN where a cell has no data in a bin. """
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return(np.where(self.counts > 0, self.sums / self.counts, np.nan))
+
+    def std(self):
+
+        """ Returns the (n_bins, *shape) population standard deviation of each bin, NaN where there are no data. """
+
+        mean = self.mean()
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = self.sums_of_squares / self.counts - mean ** 2
+
+        return(np.sqrt(np.maximum(variance, 0)))
+
+    def anomaly(self, data, times, mean=None):
+
+        """ Subtracts the climatological mean of each time step's bin.
+
+        Args:
+            data (numpy.array): 2D grid or (time, *shape) cube, in the same form as was added.
+            times (numpy.datetime64 or array): the date of the grid, or of each step of the cube.
+            mean (numpy.array): optional, the result of mean(), to save recomputing it for every step of a stream.
+
+        Returns:
+            anomaly (numpy.array): float64 array of the shape of data, NaN where data or the mean are missing.
+
+        """
+
+        if mean is None:
+            mean = self.mean()
+
+        values = self._values(data)
+
+        index = self.bin_index(times)
+
+        return(values - mean[index])
+
+    def _values(self, data):
+
+        # float64 values with every missing value as NaN
+
+        if self.values == 'concentration':
+            return(flags.concentration_fraction(np.ma.filled(data, 255), dtype=np.float64))
+
+        if np.ma.isMaskedArray(data):
+            data = np.ma.filled(data.astype(np.float64), np.nan)
+
+        values = np.asarray(data, dtype=np.float64)
+
+        if self.values == 'tb':
+            values = np.where(flags.tb_missing(data), np.nan, values)
+
+        return(values)
+
+    def _add_bin(self, i, values):
+
+        valid = ~np.isnan(values)
+
+        filled = np.where(valid, values, 0)
+
+        self.sums[i] += filled.sum(axis=0)
+        self.sums_of_squares[i] += np.einsum('t...,t...->...', filled, filled)
+        self.counts[i] += valid.sum(axis=0, dtype=np.int32)
+
+
+def climatology(data, times, bins='month', values=None):
+
+    """ Builds a Climatology from an in-memory cube.
+
+    Args:
+        data (numpy.array): (time, y, x) cube, e.g. read_many(...)['data'] or read_file.piomas.
+        times (numpy.array): the date of each time step, e.g. read_many(...)['time'].
+        bins (str): 'month', 'dayofyear' or 'season'.
+        values (str): None, 'concentration' or 'tb' (see Climatology).
+
+    Returns:
+        climatology (Climatology)
+
+    """
+
+    return(Climatology(np.shape(data)[1:], bins=bins, values=values).add(data, times))
+
+
+def climatology_files(file_locations, reader, bins='month', values=None, workers=None, **kwargs):
+
+    """ Builds a Climatology from files, streaming them so that only one file is held in memory per worker.
+
+    With workers, the files are split into contiguous chunks, each worker process builds a partial Climatology of its
+    chunk, and the partial totals are merged at the end.
+
+    Args:
+        file_locations (list): the files to read.
+        reader (str or function): 'concentration', 'SSMI_Tb' or 'AMSR_E' (daily files, read with read_file.iter_files
+        and dated from their names) or 'piomas' (yearly files of monthly records, dated from the .HYYYY suffix).
+        bins (str): 'month', 'dayofyear' or 'season'.
+        values (str): None, 'concentration' or 'tb' (see Climatology). Defaults to the one matching the reader.
+        workers (int): optional, the number of worker processes. Defaults to reading in this process.
+        **kwargs: arguments for the reader, e.g. hemisphere='n', frequency=37.
+
+    Returns:
+        climatology (Climatology)
+
+    """
+
+    reader_name = reader if isinstance(reader, str) else reader.__name__
+
+    if values is None:
+        values = {'concentration': 'concentration', 'SSMI_Tb': 'tb'}.get(reader_name)
+
+    file_locations = list(file_locations)
+
+    if not workers or (workers == 1) or (len(file_locations) < 2):
+        return(_climatology_chunk(file_locations, reader_name, bins, values, kwargs))
+
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import repeat
+
+    chunks = [list(chunk) for chunk in np.array_split(np.array(file_locations, dtype=object),
+                                                       min(workers, len(file_locations)))]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(_climatology_chunk, chunks, repeat(reader_name), repeat(bins), repeat(values),
+                                     repeat(kwargs)))
+
+    total = partials[0]
+
+    for partial in partials[1:]:
+        total.merge(partial)
+
+    return(total)
+
+
+def _climatology_chunk(file_locations, reader_name, bins, values, kwargs):
+
+    total = None
+
+    for time, data in _steps(file_locations, reader_name, values, kwargs):
+
+        if total is None:
+            total = Climatology(data.shape[1:] if np.ndim(time) else data.shape, bins=bins, values=values)
+
+        total.add(data, time)
+
+    if total is None:
+        raise ValueError('No files to build a climatology from.')
+
+    return(total)
+
+
+def _steps(file_locations, reader_name, values, kwargs):
+
+    # (time, data) pairs; concentrations stay packed, as the accumulator converts them with a table lookup
+
+    from readice import read_file
+
+    if reader_name == 'piomas':
+        for file_location in file_locations:
+            data = read_file.piomas(file_location, **kwargs)
+            yield(read_file._piomas_times(file_location, data.shape[0], kwargs.get('daily')), data)
+        return
+
+    if (reader_name == 'concentration') and (values == 'concentration'):
+        kwargs = dict(kwargs, raw=True)
+
+    yield from read_file.iter_files(file_locations, reader_name, **kwargs)
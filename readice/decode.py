@@ -0,0 +1,372 @@
+import contextlib
+import os
+import numpy as np
+from collections import namedtuple
+from readice import instrument
+
+Layout = namedtuple('Layout', ['header', 'dtype', 'shape', 'divisor'])
+Layout.__doc__ = """ Describes how a flat binary file maps onto a NumPy array.
+
+    Args:
+        header (int): size of the file header in bytes (0 if there is none).
+        dtype (numpy.dtype): explicit, endian-aware dtype of the payload (e.g. '<i2').
+        shape (tuple): shape of the payload once decoded.
+        divisor (float): physical values are raw values divided by this number. None if the values are unscaled.
+"""
+
+# magic bytes at the start of compressed files -> the module that decompresses them
+
+_COMPRESSION = {b'\x1f\x8b': 'gzip', b'BZh': 'bz2', b'\xfd7zXZ\x00': 'lzma'}
+
+# largest number of bytes asked of a file in one call, so that a decompressing stream only ever holds one chunk of
+# decompressed bytes before they are copied into the array
+
+READ_CHUNK = 1 << 24
+
+
+def layout(header, dtype, shape, divisor=None):
+
+    """ Builds a Layout, normalising the dtype and shape.
+
+    Args:
+        header (int): size of the file header in bytes.
+        dtype (str or numpy.dtype): dtype of the payload, including its byte order (e.g. '<i2', 'u1', '<f4').
+        shape (tuple): shape of the decoded payload.
+        divisor (float): optional, physical values are raw values divided by this number.
+
+    Returns:
+        layout (Layout)
+
+    """
+
+    return(Layout(header=int(header),
+                  dtype=np.dtype(dtype),
+                  shape=tuple(int(x) for x in shape),
+                  divisor=divisor))
+
+
+def payload_size(layout):
+
+    """ Number of bytes taken up by the payload described by a Layout. """
+
+    return(int(np.prod(layout.shape)) * layout.dtype.itemsize)
+
+
+def compression(source):
+
+    """ Detects whether a file is gzip, bzip2 or xz compressed, from the magic bytes at its start.
+
+    Args:
+        source (str or file): location of the file, or an open binary file object (peekable or seekable; its position
+        is left unchanged).
+
+    Returns:
+        compression (str): 'gzip', 'bz2' or 'lzma', or None if the file isn't compressed.
+
+    """
+
+    if hasattr(source, 'read'):
+
+        if hasattr(source, 'peek'):
+            start = source.peek(6)[:6]
+
+        elif hasattr(source, 'seekable') and source.seekable():
+            position = source.tell()
+            start = source.read(6)
+            source.seek(position)
+
+        else:
+            return(None)
+
+    else:
+        with open(source, 'rb') as fin:
+            start = fin.read(6)
+
+    for magic, name in _COMPRESSION.items():
+        if start.startswith(magic):
+            return(name)
+
+    return(None)
+
+
+def open_file(source):
+
+    """ Opens a file for binary reading, decompressing gzip, bzip2 and xz files on the fly.
+
+    Compressed files are recognised from their contents, not their names, and are decompressed as they are read, so
+    that e.g. read_payload decompresses straight into its array without a temporary file.
+
+    Args:
+        source (str or file): location of the file, or an open binary file object. A file object is not closed when
+        the with block ends.
+
+    Returns:
+        context manager giving a binary file object, for use as with decode.open_file(source) as fin: ...
+
+    """
+
+    name = compression(source)
+
+    if hasattr(source, 'read') and (name is None):
+        return(contextlib.nullcontext(source))
+
+    if name is None:
+        return(open(source, 'rb'))
+
+    # imported here so that plain files don't pay for the compression modules
+
+    module = __import__(name)
+
+    instrument.count('decompress')
+
+    # given a file object, the decompressing reader leaves it open when it is closed
+
+    return(module.open(source, 'rb'))
+
+
+def data_size(source):
+
+    """ Number of bytes in a file once decompressed, without reading it.
+
+    Args:
+        source (str or file): location of the file, or an open binary file object.
+
+    Returns:
+        size (int): the size in bytes, counted from the current position for a file object. None if it can't be known
+        without decompressing the file (bzip2 and xz files, and file objects that aren't seekable).
+
+    """
+
+    name = compression(source)
+
+    if hasattr(source, 'read'):
+
+        if (name is not None) or not (hasattr(source, 'seekable') and source.seekable()):
+            return(None)
+
+        position = source.tell()
+        size = source.seek(0, os.SEEK_END) - position
+        source.seek(position)
+
+        return(size)
+
+    if name is None:
+        return(os.path.getsize(source))
+
+    if name == 'gzip':
+
+        # the last four bytes of a gzip file hold the decompressed size (modulo 4 GB)
+
+        with open(source, 'rb') as fin:
+            fin.seek(-4, os.SEEK_END)
+            return(int.from_bytes(fin.read(4), 'little'))
+
+    return(None)
+
+
+def read_header(fin, layout):
+
+    """ Reads the header described by a Layout from an open binary file.
+
+    Args:
+        fin (file): binary file object positioned at the start of the file.
+        layout (Layout): layout of the file.
+
+    Returns:
+        header (str): the decoded header, or None if the format has no header.
+
+    """
+
+    if not layout.header:
+        return(None)
+
+    return(_read_exact(fin, layout.header).decode('UTF-8'))
+
+
+def read_payload(fin, layout, out=None):
+
+    """ Reads the payload described by a Layout straight into a typed array.
+
+    The bytes are read from the file directly into the memory of the array, so no intermediate bytes object or
+    Python-level per-element work is involved.
+
+    Args:
+        fin (file): binary file object positioned at the start of the payload.
+        layout (Layout): layout of the file.
+        out (numpy.array): optional, a C-contiguous array of layout.dtype and layout.shape to read into.
+
+    Returns:
+        raw (numpy.array): the raw (unscaled) payload.
+
+    """
+
+    if out is None:
+        out = np.empty(layout.shape, dtype=layout.dtype)
+        instrument.count('allocated_bytes', out.nbytes)
+
+    elif (out.shape != layout.shape) or (out.dtype != layout.dtype) or (not out.flags['C_CONTIGUOUS']):
+        raise ValueError(f'out must be a C-contiguous {layout.dtype} array of shape {layout.shape}.')
+
+    _readinto_exact(fin, out)
+
+    return(out)
+
+
+def read_binary(file_location, layout, out=None):
+
+    """ Reads the header and payload of a flat binary file.
+
+    Args:
+        file_location (str or file): location of the file to be read (which may be gzip, bzip2 or xz compressed), or
+        an open binary file object positioned at its start (see open_file).
+        layout (Layout): layout of the file.
+        out (numpy.array): optional, array to read the raw payload into (see read_payload).
+
+    Returns:
+        header (str), raw (numpy.array): the decoded header (None if there isn't one) and the raw payload.
+
+    """
+
+    with instrument.stage('io', layout.header + payload_size(layout)), open_file(file_location) as fin:
+
+        header = read_header(fin, layout)
+
+        raw = read_payload(fin, layout, out=out)
+
+    return(header, raw)
+
+
+def read_window(fin, layout, rows, cols, out=None):
+
+    """ Reads a row/column window of the payload, using one seek and one contiguous read per row.
+
+    Only the bytes of the window are read from disk. If the payload has leading dimensions (e.g. twelve monthly
+    records), the window is read from every record.
+
+    Args:
+        fin (file): seekable binary file object.
+        layout (Layout): layout of the file.
+        rows (slice): rows of the window (step 1).
+        cols (slice): columns of the window (step 1).
+        out (numpy.array): optional, C-contiguous array of layout.dtype to read the window into.
+
+    Returns:
+        raw (numpy.array): the raw (unscaled) window, of shape layout.shape[:-2] + (n_rows, n_cols).
+
+    """
+
+    n_rows, n_cols = layout.shape[-2:]
+
+    row_range = range(*rows.indices(n_rows))
+    col_range = range(*cols.indices(n_cols))
+
+    if (row_range.step != 1) or (col_range.step != 1):
+        raise ValueError('Windows must be contiguous (slices with a step of 1).')
+
+    records = int(np.prod(layout.shape[:-2]))
+
+    shape = layout.shape[:-2] + (len(row_range), len(col_range))
+
+    if out is None:
+        out = np.empty(shape, dtype=layout.dtype)
+        instrument.count('allocated_bytes', out.nbytes)
+
+    elif (out.shape != shape) or (out.dtype != layout.dtype) or (not out.flags['C_CONTIGUOUS']):
+        raise ValueError(f'out must be a C-contiguous {layout.dtype} array of shape {shape}.')
+
+    flat_out = out.reshape((records, len(row_range), len(col_range)))
+
+    with instrument.stage('io', out.nbytes):
+        for record in range(records):
+            for i, row in enumerate(row_range):
+                fin.seek(layout.header + ((record * n_rows + row) * n_cols + col_range.start) * layout.dtype.itemsize)
+                _readinto_exact(fin, flat_out[record, i])
+
+    return(out)
+
+
+def memmap(file_location, layout):
+
+    """ Maps the payload of a flat binary file into memory without reading it.
+
+    The returned array is read-only and backed by the file, so slicing it (e.g. one month, or a subregion) only
+    touches the pages of the file that are actually needed.
+
+    Args:
+        file_location (str or file): location of the file to be mapped, or an open binary file object, which is
+        mapped from its current position and left there. Compressed files can't be mapped.
+        layout (Layout): layout of the file.
+
+    Returns:
+        raw (numpy.memmap): read-only view of the raw (unscaled) payload.
+
+    """
+
+    if compression(file_location) is not None:
+        raise ValueError(f'{file_location} is compressed, so it cannot be memory-mapped; read it without mmap.')
+
+    instrument.count('memmap')
+
+    if not hasattr(file_location, 'read'):
+        return(np.memmap(file_location, dtype=layout.dtype, mode='r', offset=layout.header, shape=layout.shape))
+
+    # np.memmap seeks to the end of a file object, so put it back for the header to be read
+
+    position = file_location.tell()
+
+    raw = np.memmap(file_location, dtype=layout.dtype, mode='r', offset=position + layout.header, shape=layout.shape)
+
+    file_location.seek(position)
+
+    return(raw)
+
+
+def to_physical(raw, layout, out=None, dtype=np.float64):
+
+    """ Converts a raw payload into physical values.
+
+    Args:
+        raw (numpy.array): raw payload, as returned by read_payload.
+        layout (Layout): layout of the file (provides the divisor).
+        out (numpy.array): optional, array in which to place the result.
+        dtype (numpy.dtype): dtype of the result if out is not given. Defaults to float64.
+
+    Returns:
+        data (numpy.array): physical values.
+
+    """
+
+    if out is None:
+        out = np.empty(raw.shape, dtype=dtype)
+        instrument.count('allocated_bytes', out.nbytes)
+
+    with instrument.stage('decode', raw.nbytes):
+        if layout.divisor:
+            np.divide(raw, layout.divisor, out=out)
+        else:
+            out[...] = raw
+
+    return(out)
+
+
+def _read_exact(fin, size):
+
+    data = fin.read(size)
+
+    if len(data) != size:
+        raise ValueError(f'Unexpected end of file: wanted {size} bytes, got {len(data)}.')
+
+    return(data)
+
+
+def _readinto_exact(fin, array):
+
+    view = memoryview(array).cast('B')
+
+    filled = 0
+
+    while filled < len(view):
+        n = fin.readinto(view[filled:filled + READ_CHUNK])
+        if not n:
+            raise ValueError(f'Unexpected end of file: wanted {len(view)} bytes, got {filled}.')
+        filled += n
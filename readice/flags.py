@@ -0,0 +1,138 @@
+import numpy as np
+
+# Nasa Team concentrations (https://nsidc.org/data/nsidc-0051) are stored as 0-250 for 0-100 %; values above 250 are
+# flags.
+
+CONCENTRATION_SCALE = 250
+
+CONCENTRATION_FLAGS = {251: 'pole_hole', 252: 'unused', 253: 'coast', 254: 'land', 255: 'missing'}
+
+# NSIDC-0001 brightness temperatures of 0 are cells with no data
+
+TB_MISSING = 0
+
+# Lookup tables over every possible uint8 value, so that converting or masking a file is a single np.take rather
+# than a comparison per flag.
+
+_FRACTION_LUT = np.arange(256, dtype=np.float64) / CONCENTRATION_SCALE
+_FRACTION_LUT[CONCENTRATION_SCALE + 1:] = np.nan
+
+_FLAG_LUTS = {name: np.arange(256) == value for value, name in CONCENTRATION_FLAGS.items()}
+_FLAG_LUTS['any'] = np.arange(256) > CONCENTRATION_SCALE
+
+
+def concentration_fraction(data, out=None, dtype=np.float32):
+
+    """ Converts Nasa Team concentrations to fractions (0-1), with every flagged cell NaN.
+
+    Works on a single grid or a whole (time, y, x) cube at once.
+
+    Args:
+        data (numpy.array): concentrations as 0-250 with flags above 250, either the packed uint8 values (e.g. from
+        read_file.concentration with raw=True or mmap=True) or the float values the readers return by default.
+        out (numpy.array): optional, array in which to place the result.
+        dtype (numpy.dtype): dtype of the result if out is not given. Defaults to float32.
+
+    Returns:
+        fraction (numpy.array): concentration as a fraction, NaN where the data are flagged (or NaN).
+
+    """
+
+    data = np.asarray(data)
+
+    if data.dtype == np.uint8:
+        return(np.take(_FRACTION_LUT.astype(dtype if out is None else out.dtype), data, out=out))
+
+    if out is None:
+        out = np.empty(data.shape, dtype=dtype)
+
+    with np.errstate(invalid='ignore'):
+        np.divide(data, CONCENTRATION_SCALE, out=out)
+        out[~(data <= CONCENTRATION_SCALE)] = np.nan
+
+    return(out)
+
+
+def flag_mask(data, names=('any',)):
+
+    """ Flags the cells of Nasa Team concentrations that carry any of the given flags.
+
+    Args:
+        data (numpy.array): concentrations as 0-250 with flags above 250 (uint8 or float), a grid or a cube.
+        names (tuple): flag names from CONCENTRATION_FLAGS ('pole_hole', 'unused', 'coast', 'land', 'missing'), or
+        'any' for every flag.
+
+    Returns:
+        mask (numpy.array): boolean array of the data's shape, True where a cell carries one of the flags.
+
+    """
+
+    if isinstance(names, str):
+        names = (names,)
+
+    lut = np.zeros(256, dtype=bool)
+
+    for name in names:
+        lut |= _FLAG_LUTS[name]
+
+    data = np.asarray(data)
+
+    if data.dtype != np.uint8:
+        # the float values the readers return are whole numbers; NaN counts as missing
+        data = np.where(np.isnan(data), 255, data).astype(np.uint8)
+
+    return(np.take(lut, data))
+
+
+def flag_masks(data):
+
+    """ Splits Nasa Team concentrations into one boolean mask per flag.
+
+    Args:
+        data (numpy.array): concentrations as 0-250 with flags above 250 (uint8 or float), a grid or a cube.
+
+    Returns:
+        dictionary of boolean arrays, keyed by the names in CONCENTRATION_FLAGS.
+
+    """
+
+    return({name: flag_mask(data, name) for name in CONCENTRATION_FLAGS.values()})
+
+
+def tb_missing(data):
+
+    """ Flags the cells of NSIDC-0001 brightness temperatures that have no data (stored as 0).
+
+    Args:
+        data (numpy.array): brightness temperatures, packed or in Kelvin, a grid or a cube.
+
+    Returns:
+        mask (numpy.array): boolean array, True where there are no data.
+
+    """
+
+    return(np.asarray(data) == TB_MISSING)
+
+
+def apply(data, mask, flags='nan'):
+
+    """ Hides the masked cells of an array, either as NaN or with a numpy masked array.
+
+    Args:
+        data (numpy.array): the values (floating point, for flags='nan'). NaN is written into data itself.
+        mask (numpy.array): boolean array of the cells to hide.
+        flags (str): 'nan' or 'mask'.
+
+    Returns:
+        data (numpy.array or numpy.ma.MaskedArray)
+
+    """
+
+    if flags == 'mask':
+        return(np.ma.MaskedArray(data, mask=mask))
+
+    elif flags == 'nan':
+        data[mask] = np.nan
+        return(data)
+
+    raise ValueError(f"flags must be 'nan' or 'mask', not {flags}.")
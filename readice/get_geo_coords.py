@@ -1,5 +1,58 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
-import pandas as pd
+from readice import instrument
+
+GRID_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grid_files')
+
+# Decoded copies of the files in GRID_DIR are kept as .npy files so that they can be memory-mapped rather than parsed.
+# Set READICE_GRID_STORE to keep them somewhere other than GRID_DIR (e.g. if the package is installed read-only).
+
+GRID_STORE_DIR = os.environ.get('READICE_GRID_STORE', GRID_DIR)
+
+# Decoded lon/lat grids, shared by every reader in the process. Keys are (projection, resolution, hemisphere).
+
+MAX_CACHED_GRIDS = 8
+
+_grid_cache = OrderedDict()
+_grid_cache_lock = threading.RLock()
+
+# Approximate lat/lon boxes of commonly studied seas: (lat_min, lat_max, lon_min, lon_max), in decimal degrees.
+# A box with lon_min > lon_max crosses the antimeridian.
+
+REGIONS = {'beaufort': (68, 80, -160, -120),
+           'chukchi': (65, 78, 175, -155),
+           'east_siberian': (68, 80, 140, 180),
+           'laptev': (70, 81, 100, 145),
+           'kara': (68, 82, 55, 100),
+           'barents': (67, 82, 15, 60),
+           'weddell': (-78, -60, -65, -10),
+           'ross': (-80, -65, 160, -135),
+           'bellingshausen_amundsen': (-75, -62, -135, -65)}
+
+# NSIDC polar stereographic grids: Hughes 1980 ellipsoid, true at 70 degrees N/S. 'origin' is the (x, y) of the
+# top-left corner of the grid, in metres.
+
+PS_SEMI_MAJOR_AXIS = 6378273.0
+PS_ECCENTRICITY = 0.081816153
+PS_TRUE_LATITUDE = 70
+
+PS_GRIDS = {'n': {'central_meridian': -45, 'origin': (-3850_000, 5850_000), 'extent': (11200, 7600)},
+            's': {'central_meridian': 0, 'origin': (-3950_000, 4350_000), 'extent': (8300, 7900)}}
+
+# EASE-Grid 2.0 northern and southern grids: Lambert azimuthal equal-area on the WGS84 ellipsoid, centred on the pole
+# and spanning +/- 9000 km in x and y.
+
+EASE2_SEMI_MAJOR_AXIS = 6378137.0
+EASE2_ECCENTRICITY = 0.0818191908426215
+EASE2_HALF_EXTENT = 9000_000
+
+# The PIOMAS model grid is 120 x 360 and periodic along its second axis. readice returns PIOMAS arrays with the same
+# memory layout but shaped (360, 120), so spatial neighbours are only neighbours in a reshape to PIOMAS_NATIVE_SHAPE.
+
+PIOMAS_NATIVE_SHAPE = (120, 360)
 
 def get_dims(proj, resolution, hemisphere):
 
@@ -14,6 +67,12 @@ def get_dims(proj, resolution, hemisphere):
         dims = (896,608)
     elif (proj == 'ps') & (resolution == 12.5) & (hemisphere == 's'):
         dims = (664,632)
+    elif (proj == 'ps') & (resolution == 6.25) & (hemisphere == 'n'):
+        dims = (1792,1216)
+    elif (proj == 'ps') & (resolution == 6.25) & (hemisphere == 's'):
+        dims = (1328,1264)
+    elif (proj == 'ease2') & (resolution in (36, 25, 12.5, 6.25, 3.125)) & (hemisphere in ('n', 's')):
+        dims = (int(2 * EASE2_HALF_EXTENT / 1000 / resolution),) * 2
     else:
         print('dims not available')
         raise
@@ -22,51 +81,610 @@ def get_dims(proj, resolution, hemisphere):
 
 def piomas_grid():
 
-    grids = {}
+    """ Gets the lon/lat grid of the PIOMAS model.
 
-    for i in ['lon', 'lat']:
-        grid = np.array(pd.read_csv(f'readice/grid_files/pio_{i}grid.dat', header=None, delim_whitespace=True))
+    The grid is decoded once per process and then served from the grid cache (see clear_cache).
 
-        flat_grid = grid.ravel()
-
-        shaped_grid = flat_grid.reshape(360, 120)
-
-        grids[i] = shaped_grid
+    Returns:
+        dictionary of coords, keys: "lon", "lat". The arrays are read-only.
+    """
 
-    return(grids)
+    return(_cached_grid(('piomas', None, 'n'), _load_piomas_grid))
 
 
 def polar_stereo(resolution, hemisphere):
 
     """
 
+    The grid is decoded once per process and then served from the grid cache (see clear_cache). The 6.25 km grids,
+    for which no grid files are shipped, are computed with polar_stereo_analytic.
+
     Args:
-        resolution (int): should be '25' for 25 km
+        resolution (int): should be '25' for 25 km, '12.5' for 12.5 km or '6.25' for 6.25 km
         hemisphere (str): 'n' or 's'
 
     Returns:
-        dictionary of coords, keys: "lon", "lat".
+        dictionary of coords, keys: "lon", "lat". The arrays are read-only.
+    """
+
+    return(_cached_grid(('ps', resolution, hemisphere),
+                        lambda: _load_polar_stereo(resolution, hemisphere)))
+
+
+def polar_stereo_analytic(resolution, hemisphere):
+
+    """ Computes the lon/lat and cell area of an NSIDC polar stereographic grid, without reading any grid files.
+
+    Supports the 25 km, 12.5 km and 6.25 km grids. The coordinates agree with the shipped v3 grid files to within
+    their 1e-5 degree precision. Cell areas are those of the projected cells corrected by the map scale factor at the
+    cell centre.
+
+    Args:
+        resolution (float): 25, 12.5 or 6.25.
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        dictionary of coords, keys: "lon", "lat", "area" (in square km).
     """
 
     dims = get_dims(proj='ps', hemisphere=hemisphere, resolution=resolution)
 
-    return_dict = {}
+    x0, y0 = PS_GRIDS[hemisphere]['origin']
 
-    if resolution == 25: res_code = 25
-    elif resolution == 12.5: res_code = 12
-    else: raise
+    cell = resolution * 1000
+
+    x = x0 + (np.arange(dims[1]) + 0.5) * cell
+    y = y0 - (np.arange(dims[0]) + 0.5) * cell
+
+    x, y = np.meshgrid(x, y)
+
+    lon, lat, scale = _ps_inverse(x, y, hemisphere)
+
+    return({'lon': lon, 'lat': lat, 'area': resolution ** 2 / scale ** 2})
+
+
+def ease2_grid(resolution, hemisphere):
+
+    """ Computes the lon/lat and cell area of an EASE-Grid 2.0 northern or southern grid.
+
+    Args:
+        resolution (float): 36, 25, 12.5, 6.25 or 3.125.
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        dictionary of coords, keys: "lon", "lat", "area" (in square km). The grid is equal-area, so every cell has an
+        area of resolution ** 2. The grid is computed once per process and then served from the grid cache.
+    """
+
+    return(_cached_grid(('ease2', resolution, hemisphere), lambda: _compute_ease2_grid(resolution, hemisphere)))
+
+
+def _compute_ease2_grid(resolution, hemisphere):
+
+    dims = get_dims(proj='ease2', hemisphere=hemisphere, resolution=resolution)
+
+    cell = resolution * 1000
+
+    centres = -EASE2_HALF_EXTENT + (np.arange(dims[0]) + 0.5) * cell
+
+    x, y = np.meshgrid(centres, centres[::-1])
+
+    lon, lat = ease2_inverse(x, y, hemisphere)
+
+    return({'lon': lon, 'lat': lat, 'area': np.full(dims, resolution ** 2, dtype=np.float64)})
+
+
+def ease2_forward(lon, lat, hemisphere):
+
+    """ Projects lon/lat onto the EASE-Grid 2.0 northern or southern plane.
+
+    Args:
+        lon (numpy.array): longitudes in decimal degrees.
+        lat (numpy.array): latitudes in decimal degrees.
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        x (numpy.array), y (numpy.array): projected coordinates in metres.
+    """
+
+    sign = 1 if hemisphere == 'n' else -1
+
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+
+    rho = EASE2_SEMI_MAJOR_AXIS * np.sqrt(_authalic_q(np.pi / 2) - sign * _authalic_q(np.radians(lat)))
+
+    return(rho * np.sin(lam), -sign * rho * np.cos(lam))
+
+
+def ease2_inverse(x, y, hemisphere):
+
+    """ Inverse of ease2_forward: maps EASE-Grid 2.0 x/y (in metres) to lon/lat in decimal degrees. """
+
+    sign = 1 if hemisphere == 'n' else -1
+
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    q_p = _authalic_q(np.pi / 2)
+
+    q = sign * (q_p - (x ** 2 + y ** 2) / EASE2_SEMI_MAJOR_AXIS ** 2)
+
+    beta = np.arcsin(np.clip(q / q_p, -1, 1))
+
+    e2 = EASE2_ECCENTRICITY ** 2
+
+    # authalic to geodetic latitude (Snyder 1987, eq. 3-18)
 
-    for coord in ['lon', 'lat']:
+    phi = (beta
+           + (e2 / 3 + 31 * e2 ** 2 / 180 + 517 * e2 ** 3 / 5040) * np.sin(2 * beta)
+           + (23 * e2 ** 2 / 360 + 251 * e2 ** 3 / 3780) * np.sin(4 * beta)
+           + (761 * e2 ** 3 / 45360) * np.sin(6 * beta))
 
-        grid_dir = f'readice/grid_files/ps{hemisphere}{res_code}{coord}s_v3.dat'
-        with open(grid_dir, mode='rb') as file:
+    lon = np.degrees(np.arctan2(x, -sign * y))
 
-            # stored as 4-byte integers (little endian) scaled by 100,000
+    return(lon, np.degrees(phi))
 
-            data = [int.from_bytes(file.read(4), 'little',signed=True)/100_000 for i in range(dims[0]*dims[1])]
 
-            data = np.reshape(data, dims)
+def ps_forward(lon, lat, hemisphere):
 
-        return_dict[coord] = data
+    """ Projects lon/lat onto the NSIDC polar stereographic plane.
+
+    Args:
+        lon (numpy.array): longitudes in decimal degrees.
+        lat (numpy.array): latitudes in decimal degrees.
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        x (numpy.array), y (numpy.array): projected coordinates in metres.
+    """
+
+    sign = 1 if hemisphere == 'n' else -1
+
+    phi = np.radians(sign * np.asarray(lat, dtype=np.float64))
+    lam = np.radians(sign * (np.asarray(lon, dtype=np.float64) - PS_GRIDS[hemisphere]['central_meridian']))
+
+    phi_c = np.radians(PS_TRUE_LATITUDE)
+
+    # Snyder 1987, eq. 21-34, with the same t and m terms as the inverse projection
+
+    rho = PS_SEMI_MAJOR_AXIS * _ps_m(phi_c) * _ps_t(phi) / _ps_t(phi_c)
+
+    return(sign * rho * np.sin(lam), -sign * rho * np.cos(lam))
+
+
+def ps_index(lon, lat, resolution, hemisphere):
+
+    """ Maps lon/lat to fractional (row, column) positions on an NSIDC polar stereographic grid.
+
+    Integer positions are cell centres, so np.rint gives the index of the cell containing each point.
+
+    Args:
+        lon (numpy.array): longitudes in decimal degrees.
+        lat (numpy.array): latitudes in decimal degrees.
+        resolution (float): resolution of the grid in km, e.g. 25 or 12.5.
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        rows (numpy.array), cols (numpy.array): fractional positions (which may fall outside the grid).
+    """
+
+    x, y = ps_forward(lon, lat, hemisphere)
+
+    x0, y0 = PS_GRIDS[hemisphere]['origin']
+
+    cell = resolution * 1000
+
+    return((y0 - y) / cell - 0.5, (x - x0) / cell - 0.5)
+
+
+def ps_inverse(x, y, hemisphere):
+
+    """ Inverse of ps_forward: maps NSIDC polar stereographic x/y (in metres) to lon/lat.
+
+    Args:
+        x (numpy.array): projected x coordinates in metres.
+        y (numpy.array): projected y coordinates in metres.
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        lon (numpy.array), lat (numpy.array): in decimal degrees, longitudes in [-180, 180).
+    """
+
+    lon, lat, scale = _ps_inverse(x, y, hemisphere)
+
+    return(lon, lat)
+
+
+def region_window(proj, resolution, hemisphere, region):
+
+    """ Maps a region to the smallest row/column window of a grid that contains it.
+
+    Args:
+        proj (str): 'ps', 'ease2' or 'piomas'.
+        resolution (float): resolution of the grid in km (None for PIOMAS).
+        hemisphere (str): 'n' or 's'.
+        region (str or tuple): a name from REGIONS, or a (lat_min, lat_max, lon_min, lon_max) box in decimal degrees.
+        Boxes with lon_min > lon_max cross the antimeridian.
+
+    Returns:
+        rows (slice), cols (slice): the window, for indexing the grid (and data on it) as data[rows, cols]. For PIOMAS
+        the window is on the native grid, i.e. it indexes data.reshape(..., *PIOMAS_NATIVE_SHAPE), where the cells of a
+        region lie close together (a window across the seam of the periodic columns takes every column).
+    """
+
+    if isinstance(region, str):
+        region = REGIONS[region.lower()]
+
+    return(_region_window(proj, resolution, hemisphere, tuple(float(x) for x in region)))
+
+
+def region_mask(proj, resolution, hemisphere, region):
+
+    """ Flags the cells of a grid whose centres lie inside a region.
+
+    Args:
+        proj (str): 'ps', 'ease2' or 'piomas'.
+        resolution (float): resolution of the grid in km (None for PIOMAS).
+        hemisphere (str): 'n' or 's'.
+        region (str or tuple): a name from REGIONS, or a (lat_min, lat_max, lon_min, lon_max) box in decimal degrees.
+
+    Returns:
+        mask (numpy.array): boolean array of the grid's shape, True inside the region.
+    """
+
+    if isinstance(region, str):
+        region = REGIONS[region.lower()]
+
+    return(_inside(_grid(proj, resolution, hemisphere), tuple(float(x) for x in region)))
+
+
+def cell_area(proj, resolution, hemisphere):
+
+    """ Gets the area of each cell of a grid, in square km.
+
+    The polar stereographic areas come from the shipped area files (psn25area_v3.dat etc.) where they exist and are
+    computed with polar_stereo_analytic otherwise. PIOMAS cell areas are estimated from the spacing of the cell centres
+    in the polar stereographic plane, corrected by the map scale factor. The arrays are read-only and cached.
+
+    Args:
+        proj (str): 'ps', 'ease2' or 'piomas'.
+        resolution (float): resolution of the grid in km (None for PIOMAS).
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        area (numpy.array): cell areas in square km, of the grid's shape.
+    """
+
+    if 'pio' in proj.lower():
+        proj, resolution, hemisphere = 'piomas', None, 'n'
+
+    return(_cached_grid((f'{proj}_area', resolution, hemisphere),
+                        lambda: {'area': _load_cell_area(proj, resolution, hemisphere)})['area'])
+
+
+def clear_cache():
+
+    """ Removes every lon/lat grid from the grid cache. """
+
+    with _grid_cache_lock:
+        _grid_cache.clear()
+
+
+def evict(proj, resolution, hemisphere):
+
+    """ Removes one lon/lat grid from the grid cache.
+
+    Args:
+        proj (str): 'ps', 'ease2' or 'piomas'.
+        resolution (float): resolution of the grid in km (None for PIOMAS).
+        hemisphere (str): 'n' or 's'.
+
+    Returns:
+        True if the grid was cached, False otherwise.
+    """
+
+    with _grid_cache_lock:
+        return(_grid_cache.pop((proj, resolution, hemisphere), None) is not None)
+
+
+def cached_grids():
+
+    """ Lists the (projection, resolution, hemisphere) keys currently held in the grid cache. """
+
+    with _grid_cache_lock:
+        return(list(_grid_cache.keys()))
+
+
+def _ps_t(phi):
+
+    e = PS_ECCENTRICITY
+
+    return(np.tan(np.pi / 4 - phi / 2) / ((1 - e * np.sin(phi)) / (1 + e * np.sin(phi))) ** (e / 2))
+
+
+def _ps_m(phi):
+
+    return(np.cos(phi) / np.sqrt(1 - PS_ECCENTRICITY ** 2 * np.sin(phi) ** 2))
+
+
+def _ps_inverse(x, y, hemisphere):
+
+    # returns lon, lat and the map scale factor (Snyder 1987, eqs. 21-33, 21-34, 3-5 and 21-32)
+
+    sign = 1 if hemisphere == 'n' else -1
+
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+
+    phi_c = np.radians(PS_TRUE_LATITUDE)
+
+    rho = np.hypot(x, y)
+
+    t = rho * _ps_t(phi_c) / (PS_SEMI_MAJOR_AXIS * _ps_m(phi_c))
+
+    chi = np.pi / 2 - 2 * np.arctan(t)
+
+    e2 = PS_ECCENTRICITY ** 2
+
+    phi = (chi
+           + (e2 / 2 + 5 * e2 ** 2 / 24 + e2 ** 3 / 12 + 13 * e2 ** 4 / 360) * np.sin(2 * chi)
+           + (7 * e2 ** 2 / 48 + 29 * e2 ** 3 / 240 + 811 * e2 ** 4 / 11520) * np.sin(4 * chi)
+           + (7 * e2 ** 3 / 120 + 81 * e2 ** 4 / 1120) * np.sin(6 * chi)
+           + (4279 * e2 ** 4 / 161280) * np.sin(8 * chi))
+
+    lam = np.arctan2(sign * x, -sign * y)
+
+    lon = (PS_GRIDS[hemisphere]['central_meridian'] + sign * np.degrees(lam) + 180) % 360 - 180
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = rho / (PS_SEMI_MAJOR_AXIS * _ps_m(phi))
+
+    return(lon, sign * np.degrees(phi), scale)
+
+
+def _authalic_q(phi):
+
+    e = EASE2_ECCENTRICITY
+
+    sin_phi = np.sin(phi)
+
+    return((1 - e ** 2) * (sin_phi / (1 - e ** 2 * sin_phi ** 2)
+                           - np.log((1 - e * sin_phi) / (1 + e * sin_phi)) / (2 * e)))
+
+
+@lru_cache(maxsize=64)
+def _region_window(proj, resolution, hemisphere, region):
+
+    inside = _inside(_grid(proj, resolution, hemisphere), region)
+
+    if 'pio' in proj.lower():
+        inside = inside.reshape(PIOMAS_NATIVE_SHAPE)
+
+    if not inside.any():
+        raise ValueError(f'The region {region} does not overlap the grid.')
+
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+
+    return(slice(int(rows[0]), int(rows[-1]) + 1), slice(int(cols[0]), int(cols[-1]) + 1))
+
+
+def _grid(proj, resolution, hemisphere):
+
+    if 'pio' in proj.lower():
+        return(piomas_grid())
+    elif proj == 'ease2':
+        return(ease2_grid(resolution=resolution, hemisphere=hemisphere))
+
+    return(polar_stereo(resolution=resolution, hemisphere=hemisphere))
+
+
+def _inside(grids, region):
+
+    lat_min, lat_max, lon_min, lon_max = region
+
+    lon = (np.asarray(grids['lon']) + 180) % 360 - 180
+    lat = np.asarray(grids['lat'])
+
+    in_lat = (lat >= lat_min) & (lat <= lat_max)
+
+    # a box spanning the whole circle would otherwise normalise to a single meridian
+
+    if lon_max - lon_min >= 360:
+        return(in_lat)
+
+    lon_min, lon_max = (lon_min + 180) % 360 - 180, (lon_max + 180) % 360 - 180
+
+    if lon_min <= lon_max:
+        in_lon = (lon >= lon_min) & (lon <= lon_max)
+    else:
+        in_lon = (lon >= lon_min) | (lon <= lon_max)
+
+    return(in_lon & in_lat)
+
+
+def _load_cell_area(proj, resolution, hemisphere):
+
+    if proj == 'ease2':
+        return(ease2_grid(resolution=resolution, hemisphere=hemisphere)['area'])
+
+    elif proj == 'piomas':
+
+        grids = piomas_grid()
+
+        x, y = ps_forward(grids['lon'], grids['lat'], 'n')
+
+        x, y = x.reshape(PIOMAS_NATIVE_SHAPE), y.reshape(PIOMAS_NATIVE_SHAPE)
+
+        # the columns of the native grid wrap around
+
+        dx_dcol = (np.roll(x, -1, axis=1) - np.roll(x, 1, axis=1)) / 2
+        dy_dcol = (np.roll(y, -1, axis=1) - np.roll(y, 1, axis=1)) / 2
+
+        projected_area = np.abs(np.gradient(x, axis=0) * dy_dcol - dx_dcol * np.gradient(y, axis=0))
+
+        scale = _ps_inverse(x, y, 'n')[2]
+
+        return((projected_area / scale ** 2 / 1e6).reshape(get_dims(proj='piomas', resolution=None, hemisphere='n')))
+
+    res_code = {25: 25, 12.5: 12}.get(resolution)
+
+    if (res_code is not None) and os.path.exists(os.path.join(GRID_DIR, f'ps{hemisphere}{res_code}area_v3.dat')):
+        return(_load_grid_file(f'ps{hemisphere}{res_code}area_v3.dat'))
+
+    return(polar_stereo_analytic(resolution, hemisphere)['area'])
+
+
+def _cached_grid(key, loader):
+
+    # The lock is held while loading so that concurrent callers decode each grid only once. It is re-entrant because
+    # some grids (e.g. cell areas) are derived from other cached grids.
+
+    with _grid_cache_lock:
+
+        if key in _grid_cache:
+            _grid_cache.move_to_end(key)
+            instrument.count('grid_cache_hit')
+
+        else:
+            instrument.count('grid_cache_miss')
+
+            with instrument.stage('grid_load'):
+                grids = loader()
+
+            for grid in grids.values():
+                grid.flags.writeable = False
+
+            _grid_cache[key] = grids
+
+            while len(_grid_cache) > MAX_CACHED_GRIDS:
+                _grid_cache.popitem(last=False)
+
+        return(dict(_grid_cache[key]))
+
+
+def build_grid_store(force=False):
+
+    """ Converts every file in grid_files into a memory-mappable .npy file in GRID_STORE_DIR.
+
+    This is done automatically (one file at a time) the first time a grid is needed, so calling it is only necessary
+    to do the conversion up front, e.g. when installing readice.
+
+    Args:
+        force (bool): if True, regenerate every .npy file even if it is up to date.
+
+    Returns:
+        list of the .npy files written.
+    """
+
+    written = []
+
+    for file_name in sorted(os.listdir(GRID_DIR)):
+
+        if not file_name.endswith('.dat'):
+            continue
+
+        store_file = _store_file(file_name)
+
+        if force or _is_stale(file_name, store_file):
+            _write_store_file(file_name, store_file)
+            written.append(store_file)
+
+    return(written)
+
+
+def _store_file(file_name):
+
+    return(os.path.join(GRID_STORE_DIR, file_name[:-len('.dat')] + '.npy'))
+
+
+def _is_stale(file_name, store_file):
+
+    if not os.path.exists(store_file):
+        return(True)
+
+    return(os.path.getmtime(store_file) < os.path.getmtime(os.path.join(GRID_DIR, file_name)))
+
+
+def _write_store_file(file_name, store_file):
+
+    grid = _decode_grid_file(file_name)
+
+    os.makedirs(os.path.dirname(store_file), exist_ok=True)
+
+    # write to a temporary file first so that a concurrent reader never sees a partial file
+
+    tmp_file = f'{store_file}.{os.getpid()}.tmp.npy'
+
+    np.save(tmp_file, grid)
+
+    os.replace(tmp_file, store_file)
+
+    return(grid)
+
+
+def _load_grid_file(file_name):
+
+    """ Loads a decoded grid file, (re)generating its .npy copy if it is missing or older than the .dat file. """
+
+    store_file = _store_file(file_name)
+
+    if _is_stale(file_name, store_file):
+
+        try:
+            _write_store_file(file_name, store_file)
+
+        except OSError:
+            # the store isn't writable, so just decode the grid in memory
+            return(_decode_grid_file(file_name))
+
+    instrument.count('grid_store_mmap')
+
+    return(np.load(store_file, mmap_mode='r'))
+
+
+def _decode_grid_file(file_name):
+
+    path = os.path.join(GRID_DIR, file_name)
+
+    if file_name.startswith('pio'):
+
+        # whitespace-separated text, ten values per line
+
+        with open(path) as fin:
+            grid = np.array(fin.read().split(), dtype=np.float64)
+
+        return(grid.reshape(get_dims(proj='piomas', resolution=None, hemisphere='n')))
+
+    # polar stereographic files, e.g. psn25lats_v3.dat, stored as 4-byte integers (little endian)
+
+    hemisphere = file_name[2]
+    resolution = {'25': 25, '12': 12.5}[file_name[3:5]]
+
+    dims = get_dims(proj='ps', hemisphere=hemisphere, resolution=resolution)
+
+    data = np.fromfile(path, dtype='<i4', count=dims[0]*dims[1])
+
+    if 'area' in file_name:
+        # scaled by 1,000, in square km
+        grid = data / 1_000
+    else:
+        # scaled by 100,000, in decimal degrees
+        grid = data / 100_000
+
+    return(grid.reshape(dims))
+
+
+def _load_piomas_grid():
+
+    return({i: _load_grid_file(f'pio_{i}grid.dat') for i in ['lon', 'lat']})
+
+
+def _load_polar_stereo(resolution, hemisphere):
+
+    if resolution == 25: res_code = 25
+    elif resolution == 12.5: res_code = 12
+    else:
+        # no grid files are shipped for this resolution
+        grids = polar_stereo_analytic(resolution, hemisphere)
+        return({coord: grids[coord] for coord in ['lon', 'lat']})
 
-    return(return_dict)
\ No newline at end of file
+    return({coord: _load_grid_file(f'ps{hemisphere}{res_code}{coord}s_v3.dat') for coord in ['lon', 'lat']})
@@ -0,0 +1,218 @@
+import json
+import threading
+import time
+
+# The recorder currently collecting measurements, or None. It is process-wide rather than per-thread so that the
+# worker threads of read_file.read_many report into the batch that started them.
+
+_active = None
+_active_lock = threading.Lock()
+
+
+class Recorder:
+
+    """ Collects per-stage durations, byte counts and counters from the read pipeline.
+
+    Use it through record(). Stages are e.g. 'io' (reading files), 'decode' (raw to physical values), 'grid_load'
+    (loading lon/lat grids) and 'netcdf_write'; counters are e.g. 'grid_cache_hit', 'grid_cache_miss' and
+    'allocated_bytes'. Recorders from different processes or batches can be combined with merge.
+
+    """
+
+    def __init__(self):
+
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def add(self, stage, seconds, n_bytes=0):
+
+        """ Adds one call of a stage, taking seconds and handling n_bytes. """
+
+        with self._lock:
+            totals = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+            totals['bytes'] += int(n_bytes)
+
+    def count(self, counter, n=1):
+
+        """ Adds n to a counter. """
+
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + int(n)
+
+    def merge(self, other):
+
+        """ Adds the measurements of another Recorder (or of its as_dict()) to this one. """
+
+        if isinstance(other, Recorder):
+            other = other.as_dict()
+
+        with self._lock:
+
+            for stage, totals in other['stages'].items():
+                mine = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+                for key in mine:
+                    mine[key] += totals[key]
+
+            for counter, n in other['counters'].items():
+                self.counters[counter] = self.counters.get(counter, 0) + n
+
+        return(self)
+
+    def as_dict(self):
+
+        """ Returns the measurements as a dictionary with 'stages' and 'counters' keys. Each stage has 'calls',
+        'seconds' and 'bytes', and 'mb_per_s' where bytes were handled. """
+
+        with self._lock:
+
+            stages = {}
+
+            for stage, totals in self.stages.items():
+                stages[stage] = dict(totals)
+                if totals['bytes'] and totals['seconds'] > 0:
+                    stages[stage]['mb_per_s'] = totals['bytes'] / 1e6 / totals['seconds']
+
+            return({'stages': stages, 'counters': dict(self.counters)})
+
+    def to_json(self, file_location=None):
+
+        """ Returns the measurements as a JSON string, also writing them to file_location if given. """
+
+        text = json.dumps(self.as_dict(), indent=2)
+
+        if file_location is not None:
+            with open(file_location, 'w') as fout:
+                fout.write(text)
+
+        return(text)
+
+    def __enter__(self):
+
+        global _active
+
+        with _active_lock:
+            self._previous, _active = _active, self
+
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        global _active
+
+        with _active_lock:
+            _active = self._previous
+
+        # measurements made inside a nested recorder also count towards the enclosing one
+
+        if self._previous is not None:
+            self._previous.merge(self)
+
+        self._previous = None
+
+        return(False)
+
+
+def record():
+
+    """ Starts recording where the time goes in readice.
+
+    Everything readice does inside the with block (in any thread) is recorded, e.g.
+
+        with instrument.record() as stats:
+            cube = read_file.read_many(files, 'SSMI_Tb', hemisphere='n', frequency=37)
+            tools.dict_to_nc(cube, 'tb.nc', 'Tb')
+
+        stats.as_dict()['stages']['io']  # {'calls': ..., 'seconds': ..., 'bytes': ..., 'mb_per_s': ...}
+
+    Outside of a record() block the hooks cost a global lookup and nothing is recorded.
+
+    Returns:
+        recorder (Recorder)
+
+    """
+
+    return(Recorder())
+
+
+def enabled():
+
+    """ True if a record() block is active. """
+
+    return(_active is not None)
+
+
+def stage(name, n_bytes=0):
+
+    """ Times a stage of the pipeline, for use as a context manager (with instrument.stage('io', size): ...).
+
+    If the number of bytes is only known inside the block, it can be set as the n_bytes attribute of the stage. """
+
+    if _active is None:
+        return(_NULL_STAGE)
+
+    return(_Stage(_active, name, n_bytes))
+
+
+def count(counter, n=1):
+
+    """ Adds n to a counter of the active recorder, if there is one. """
+
+    if _active is not None:
+        _active.count(counter, n)
+
+
+def merge(stats):
+
+    """ Adds measurements made elsewhere (e.g. the as_dict() of a worker process's Recorder) to the active recorder. """
+
+    if _active is not None:
+        _active.merge(stats)
+
+
+class _Stage:
+
+    __slots__ = ('recorder', 'name', 'n_bytes', 'start')
+
+    def __init__(self, recorder, name, n_bytes):
+
+        self.recorder = recorder
+        self.name = name
+        self.n_bytes = n_bytes
+
+    def __enter__(self):
+
+        self.start = time.perf_counter()
+
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.recorder.add(self.name, time.perf_counter() - self.start, self.n_bytes)
+
+        return(False)
+
+
+class _NullStage:
+
+    __slots__ = ()
+
+    @property
+    def n_bytes(self):
+        return(0)
+
+    @n_bytes.setter
+    def n_bytes(self, value):
+        pass
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return(False)
+
+
+_NULL_STAGE = _NullStage()
@@ -0,0 +1,162 @@
+import os
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from readice import decode, instrument
+
+
+def decode_files(file_locations, layout, out, workers=None, backend='thread', chunk_size=1, reader=None,
+                 reader_kwargs=None, raw=False):
+
+    """ Decodes many files into the slices of a (time, y, x) array using a pool of workers.
+
+    Each worker writes straight into its slices of the output array, so no arrays are pickled back to the parent
+    process. With the 'process' backend the output must be a numpy.memmap backed by a file (see shared_output), which
+    every worker process maps for itself. A file that fails to read does not abort the batch: its slice is filled with
+    NaN (or 0 for integer output, which looks like real data, so the returned errors are the only reliable record of
+    the failures) and the failure is reported.
+
+    Args:
+        file_locations (list): locations of the files to read (which may be gzip, bzip2 or xz compressed); file i is
+        decoded into out[i].
+        layout (decode.Layout): layout of every file.
+        out (numpy.array): output array of shape (len(file_locations),) + layout.shape.
+        workers (int): number of workers. Defaults to the number of CPUs.
+        backend (str): 'thread' or 'process'.
+        chunk_size (int): number of consecutive files handed to a worker at a time.
+        reader (function): optional, a function reading one file (file_location, **reader_kwargs) into a 2D array, for
+        formats that aren't flat binary. Must be picklable for the 'process' backend.
+        reader_kwargs (dict): optional, keyword arguments for reader.
+        raw (bool): If True, the packed values are read straight into out (which must then have layout.dtype) without
+        conversion to physical values.
+
+    Returns:
+        errors (list): (index, file_location, message) for every file that could not be read, in input order.
+
+    """
+
+    if backend == 'thread':
+        executor_class, target = ThreadPoolExecutor, out
+
+    elif backend == 'process':
+
+        if not (isinstance(out, np.memmap) and out.filename):
+            raise ValueError("The 'process' backend needs out to be a file-backed numpy.memmap.")
+
+        out.flush()
+
+        executor_class, target = ProcessPoolExecutor, (out.filename, out.offset, out.dtype, out.shape)
+
+    else:
+        raise ValueError(f"backend must be 'thread' or 'process', not {backend}.")
+
+    if raw and (reader is None) and (out.dtype != layout.dtype):
+        raise ValueError(f'raw output must have the dtype of the files, {layout.dtype}.')
+
+    jobs = list(enumerate(file_locations))
+
+    chunks = [jobs[i:i + max(1, chunk_size)] for i in range(0, len(jobs), max(1, chunk_size))]
+
+    # worker processes can't see the parent's instrument.record() block, so they record their own and send it back
+
+    measure = instrument.enabled() and (backend == 'process')
+
+    errors = []
+
+    with executor_class(max_workers=workers or os.cpu_count()) as executor:
+
+        futures = [executor.submit(_decode_chunk, chunk, layout, target, reader, reader_kwargs or {}, raw, measure)
+                   for chunk in chunks]
+
+        for future in futures:
+
+            chunk_errors, stats = future.result()
+
+            errors.extend(chunk_errors)
+
+            if stats is not None:
+                instrument.merge(stats)
+
+    if backend == 'process':
+        # drop any stale pages so the parent sees what the workers wrote
+        out.flush()
+
+    return(sorted(errors))
+
+
+def shared_output(shape, dtype, file_location=None):
+
+    """ Creates a file-backed numpy.memmap that worker processes can write into.
+
+    Args:
+        shape (tuple): shape of the array.
+        dtype (numpy.dtype): dtype of the array.
+        file_location (str): optional, location of the backing file. If not given, a temporary file is used, which is
+        unlinked once the batch is finished (see release_output) so that it disappears with the array.
+
+    Returns:
+        out (numpy.memmap)
+
+    """
+
+    if file_location is None:
+        handle, file_location = tempfile.mkstemp(prefix='readice_', suffix='.dat')
+        os.close(handle)
+
+    return(np.memmap(file_location, dtype=dtype, mode='w+', shape=shape))
+
+
+def release_output(out):
+
+    """ Unlinks the temporary file behind an array from shared_output. The mapping itself stays valid. """
+
+    try:
+        os.remove(out.filename)
+    except OSError:
+        # e.g. on Windows, where a mapped file can't be removed; it is left for the OS to clean up
+        pass
+
+
+def _decode_chunk(chunk, layout, target, reader, reader_kwargs, raw=False, measure=False):
+
+    if not measure:
+        return(_decode_into(chunk, layout, target, reader, reader_kwargs, raw), None)
+
+    with instrument.record() as recorder:
+        errors = _decode_into(chunk, layout, target, reader, reader_kwargs, raw)
+
+    return(errors, recorder.as_dict())
+
+
+def _decode_into(chunk, layout, target, reader, reader_kwargs, raw=False):
+
+    if isinstance(target, tuple):
+        file_name, offset, dtype, shape = target
+        out = np.memmap(file_name, dtype=dtype, mode='r+', offset=offset, shape=shape)
+    else:
+        out = target
+
+    packed = None if raw else np.empty(layout.shape, dtype=layout.dtype)
+
+    errors = []
+
+    for index, file_location in chunk:
+
+        try:
+            if (reader is None) and raw:
+                decode.read_binary(file_location, layout, out=out[index])
+            elif reader is None:
+                decode.read_binary(file_location, layout, out=packed)
+                decode.to_physical(packed, layout, out=out[index])
+            else:
+                out[index] = reader(file_location, **reader_kwargs)
+
+        except Exception as error:
+            out[index] = np.nan if np.issubdtype(out.dtype, np.floating) else 0
+            errors.append((index, str(file_location), ''.join(traceback.format_exception_only(type(error), error)).strip()))
+
+    if isinstance(out, np.memmap):
+        out.flush()
+
+    return(errors)
@@ -1,9 +1,14 @@
-import struct
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from readice import get_geo_coords
-from netCDF4 import Dataset
+from readice import get_geo_coords, decode, parallel, instrument
+from readice import flags as nsidc_flags
+from readice import cache as array_cache
 
-def concentration(file_location, hemisphere, with_coords=False):
+
+def concentration(file_location, hemisphere, with_coords=False, mmap=False, region=None, dtype=np.float64, raw=False,
+                  coord_dtype=None, fraction=False, flags=None):
 
     """ Reads Nasa Team sea ice concentration data.
 
@@ -12,12 +17,29 @@ def concentration(file_location, hemisphere, with_coords=False):
     For more information visit https://nsidc.org/data/nsidc-0051.
 
     Args:
-        file_location (str): location of the file to be read
+        file_location (str or file): location of the file to be read, which may be gzip, bzip2 or xz compressed (it
+        is then decompressed as it is read, see decode.open_file), or an open binary file object.
         hemisphere (str): 'n' or 's', an indication of the hemisphere of the data (affects the shape of the array).
         with_coords (bool): If false, a numpy.array is returned representing the file. If True, a dictionary is
-        returned with the following keys: 'data', 'lon', 'lat', 'header'. All corresponding values numpy arrays with
-        the exception of 'header', which is the contents of the https://nsidc.org/data/nsidc-0051300 byte header of
-        the file.
+        returned with the following keys: 'data', 'lon', 'lat', 'head', 'attrs'. All corresponding values numpy
+        arrays with the exception of 'head', which is the contents of the https://nsidc.org/data/nsidc-0051300 byte
+        header of the file, and 'attrs', a dictionary of metadata such as the flag values.
+        mmap (bool): If True, the data are returned as a read-only numpy.memmap of the raw uint8 values rather than
+        being read into memory. Only the pages of the file that are accessed are read.
+        region (str or tuple): optional, a region name from get_geo_coords.REGIONS or a (lat_min, lat_max, lon_min,
+        lon_max) box. Only the rows/columns of the grid covering the region are read, and the data (and coords) are
+        cropped to that window (see get_geo_coords.region_window).
+        dtype (numpy.dtype): dtype of the returned values. Defaults to float64; float32 halves the memory.
+        raw (bool): If True, the packed values stored in the file (uint8, 0-250 for 0-100 %, with the flags of
+        flags.CONCENTRATION_FLAGS above 250) are read into memory without conversion. The bare array carries no
+        metadata; the valid range and flag values are only returned under 'attrs' with with_coords=True.
+        coord_dtype (numpy.dtype): optional, dtype of the lon/lat arrays (e.g. np.float32). By default the cached
+        float64 grids are returned.
+        fraction (bool): If True, concentrations are returned as fractions (0-1) and every flagged cell (pole hole,
+        coast, land, missing) is NaN. Can't be combined with raw or mmap.
+        flags (str): optional, 'nan' to set flagged cells to NaN, or 'mask' to return a numpy masked array with the
+        flagged cells masked. Use flags.flag_mask or flags.flag_masks to tell the flags apart. Can't be combined with
+        raw or mmap.
 
     """
 
@@ -26,78 +48,109 @@ def concentration(file_location, hemisphere, with_coords=False):
     # to return a dictionary. Currently reads Nasa Team data, but nt can be changed to
     # bt (and version num changed) to read bootstrap, etc."""
 
-    dims = get_geo_coords.get_dims(proj='ps', hemisphere=hemisphere, resolution=25)
+    layout, grid_key = _concentration_spec(hemisphere)
+
+    window = _window(grid_key, region)
 
-    header_size = 300
+    if (fraction or flags) and (raw or mmap):
+        raise ValueError('fraction and flags convert the packed values, so they cannot be used with raw or mmap.')
 
-    with open(file_location, 'rb') as fin:
-        header = fin.read(header_size).decode('UTF-8')
+    if fraction or flags:
 
-        data = fin.read(dims[0] * dims[1])
+        header, packed = _read(file_location, layout, window=window, raw=True)
 
-        ints = [int(x) for x in data]
+        if fraction:
+            grid = nsidc_flags.concentration_fraction(packed, dtype=dtype)
+        else:
+            grid = decode.to_physical(packed, layout, dtype=dtype)
 
-        grid = np.reshape(ints, dims).astype(float)
+        if flags:
+            grid = nsidc_flags.apply(grid, nsidc_flags.flag_mask(packed), flags)
+
+    else:
+        header, grid = _read(file_location, layout, mmap, window, raw=raw, dtype=dtype)
 
     if with_coords:
 
-        geo_coords = get_geo_coords.polar_stereo(resolution=25,
-                                                    hemisphere=hemisphere)
+        geo_coords = _grid_coords(*grid_key, window=window, dtype=coord_dtype)
 
         return ({'head': header,
                  'data': grid,
                  'lon': geo_coords['lon'],
-                 'lat': geo_coords['lat']})
+                 'lat': geo_coords['lat'],
+                 'attrs': _attributes('concentration', layout, raw or mmap, fraction=fraction,
+                                      hidden=bool(fraction or flags))})
 
     else:
         return(grid)
 
 
-def piomas(file_location,with_coords=False):
+def piomas(file_location,with_coords=False, mmap=False, region=None, dtype=np.float64, raw=False, coord_dtype=None,
+           records=None, components=1, daily=None):
 
     """ Extracts PIOMAS variables from model grid.
 
-    Plots sea ice thickness monthly mean data from
-    http://psc.apl.uw.edu/research/projects/arctic-sea-ice-volume-anomaly/data/model_grid. This should be extended in
-    future to handle the daily mean files.
+    Reads the yearly files of gridded variables from
+    http://psc.apl.uw.edu/research/projects/arctic-sea-ice-volume-anomaly/data/model_grid, e.g. sea ice thickness
+    (heff.H1993), concentration (area.H1993) or snow depth (snow.H1993), either as monthly or as daily means. The number
+    of records is worked out from the size of the file.
 
     Args:
-        file_location (str): Location of file to be read.
+        file_location (str or file): Location of file to be read, which may be compressed, or an open binary file
+        object (see concentration).
         with_coords (bool): If false, a numpy.array is returned representing the file. If True, a dictionary is
         returned with the following keys: 'data', 'lon', 'lat', 'header'. All corresponding values numpy arrays with
         the exception of 'header', which is the contents of the https://nsidc.org/data/nsidc-0051300 byte header of
         the file.:
+        mmap (bool): If True, the data are returned as a read-only numpy.memmap of the raw float32 values rather than
+        being read into memory, so e.g. a single month can be accessed without reading the rest of the file.
+        region (str or tuple): optional, a region name from get_geo_coords.REGIONS or a (lat_min, lat_max, lon_min,
+        lon_max) box. Only the window of the grid covering the region is read (see concentration). The window is taken
+        on the native 120 x 360 model grid (see get_geo_coords.region_window), so the data and coords are then cropped
+        in that topology rather than as (360, 120) arrays.
+        dtype (numpy.dtype): dtype of the returned values. Defaults to float64; float32 halves the memory.
+        raw (bool): If True, the packed values stored in the file (float32, already in physical units) are read into
+        memory without conversion. Metadata are only returned under 'attrs' with with_coords=True.
+        coord_dtype (numpy.dtype): optional, dtype of the lon/lat arrays (e.g. np.float32). By default the cached
+        float64 grids are returned.
+        records (int): optional, the number of records (months or days) in the file. By default it is worked out from
+        the file size, which needs to be given for bzip2 and xz files.
+        components (int): number of fields per record, e.g. 2 for the u and v components of ice drift. Defaults to 1.
+        daily (bool): optional, True for a file of daily records and False for one of monthly records. By default
+        files of up to twelve records are taken as monthly, so this needs to be given for a daily file that only
+        covers the first days of a year.
 
     Returns:
-        native_data (numpy.array): 3D numpy array (first index of twelve represents months).
+        native_data (numpy.array): 3D numpy array (first index represents months, or days for daily files). With
+        components, 4D with the component as the second index. With with_coords, a dictionary that also has the
+        date of each record under 'time'.
 
     """
 
-    dims = get_geo_coords.get_dims(proj='piomas',
-                                   resolution=None,
-                                   hemisphere='n')
+    if records is None:
+        records = _piomas_records(file_location, components)
 
-    with open(file_location, mode='rb') as file:
-        fileContent = file.read()
-        data = struct.unpack("f" * (len(fileContent) // 4), fileContent)
+    layout, grid_key = _piomas_spec(records, components)
 
-    native_data = np.full((12, dims[0], dims[1]), np.nan)
+    time = _piomas_times(file_location, records, daily)
 
-    for month in range(1, 13):
-        start = (month - 1) * (dims[0] * dims[1])
-        end = month * (dims[0] * dims[1])
-        thickness_list = np.array(data[start:end])
+    window = _window(grid_key, region)
 
-        gridded = thickness_list.reshape(dims)
-        native_data[month - 1, :, :] = gridded
+    if window:
+        # region windows are on the native grid, where the cells of a region are close together
+        layout = layout._replace(shape=layout.shape[:-2] + get_geo_coords.PIOMAS_NATIVE_SHAPE)
+
+    header, native_data = _read(file_location, layout, mmap, window, raw=raw, dtype=dtype)
 
     if with_coords:
 
-        geo_coords = get_geo_coords.piomas_grid()
+        geo_coords = _grid_coords(*grid_key, window=window, dtype=coord_dtype)
 
         return_dict = {'data':native_data,
                    'lon':geo_coords['lon'],
-                   'lat':geo_coords['lat']}
+                   'lat':geo_coords['lat'],
+                   'time':time,
+                   'attrs':_attributes('piomas', layout, raw or mmap)}
 
         return(return_dict)
 
@@ -105,9 +158,106 @@ def piomas(file_location,with_coords=False):
         return(native_data)
 
 
+def piomas_many(file_locations, with_coords=True, dtype=np.float32, out=None, file_location=None, workers=None,
+                coord_dtype=None, components=1, daily=None, records=None):
+
+    """ Concatenates many yearly PIOMAS files into a single (time, 360, 120) cube with a date axis.
+
+    The records of every file (monthly or daily, worked out from the file sizes) are read straight into their slice
+    of the cube with one read per file, and with the default float32 dtype (that of the files) without any conversion,
+    so 40 years of daily thickness take no per-record copies. The cube is a numpy.memmap, so it is paged to disk
+    rather than held in memory.
+
+    Args:
+        file_locations (list): locations of the yearly files (e.g. heff.H1979 ... heff.H2019, or heff.H1979.gz ...),
+        in time order.
+        with_coords (bool): If True, the lon/lat grid is attached (once) to the returned dictionary.
+        dtype (numpy.dtype): dtype of the cube. Defaults to float32, the dtype stored in the files.
+        out (numpy.array): optional, a (time, 360, 120) array to read the files into instead. Its dtype is used, and
+        dtype is ignored.
+        file_location (str): optional, location of the file backing the memmap, so that the cube can be opened again
+        later (with np.memmap). By default a temporary file is used, which disappears with the array.
+        workers (int): optional, if given the files are read by this many threads.
+        coord_dtype (numpy.dtype): optional, dtype of the lon/lat arrays (e.g. np.float32).
+        components (int): number of fields per record, e.g. 2 for the u and v components of ice drift. Defaults to 1.
+        daily (bool): optional, True if the files hold daily records and False if monthly (see piomas). By default
+        each file is taken as monthly if it has up to twelve records and as daily otherwise.
+        records (int or list): optional, the number of records of every file, or a list with that of each file (None
+        where it is to be worked out from the file size). Needs to be given for bzip2 and xz files (see piomas).
+
+    Returns:
+        dictionary with keys 'data' (the cube), 'time' (numpy.datetime64 array, from the .HYYYY suffix of the file
+        names) and 'attrs', plus 'lon' and 'lat' if with_coords is True.
+
+    """
+
+    file_locations = list(file_locations)
+
+    if (records is None) or np.isscalar(records):
+        records = [records] * len(file_locations)
+
+    elif len(records) != len(file_locations):
+        raise ValueError(f'Got {len(records)} record counts for {len(file_locations)} files.')
+
+    records = [_piomas_records(f, components) if n is None else int(n) for f, n in zip(file_locations, records)]
+
+    starts = np.concatenate([[0], np.cumsum(records)])
+
+    time = np.concatenate([_piomas_times(f, n, daily) for f, n in zip(file_locations, records)])
+
+    layout, grid_key = _piomas_spec(int(starts[-1]), components)
+
+    temporary_output = (out is None) and (file_location is None)
+
+    if out is None:
+        out = parallel.shared_output(layout.shape, dtype, file_location)
+
+    elif out.shape != layout.shape:
+        raise ValueError(f'out must have shape {layout.shape}.')
+
+    # the records of a file are read as they are when the cube has the dtype of the files, and converted from a
+    # temporary buffer otherwise
+
+    direct = out.dtype == layout.dtype
+
+    def load(i):
+        file_layout = _piomas_layout(records[i], components)
+        target = out[starts[i]:starts[i + 1]]
+        if direct:
+            decode.read_binary(file_locations[i], file_layout, out=target)
+        else:
+            decode.to_physical(decode.read_binary(file_locations[i], file_layout)[1], file_layout, out=target)
+
+    try:
+        if workers is None:
+            for i in range(len(file_locations)):
+                load(i)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(load, range(len(file_locations))))
+
+    finally:
+        if temporary_output:
+            parallel.release_output(out)
+
+    return_dict = {'data': out,
+                   'time': time,
+                   'attrs': _attributes('piomas', layout)}
+
+    if with_coords:
+
+        geo_coords = _grid_coords(*grid_key, dtype=coord_dtype)
+
+        return_dict['lon'] = geo_coords['lon']
+        return_dict['lat'] = geo_coords['lat']
+
+    return(return_dict)
+
 
 
-def SSMI_Tb(file_location, hemisphere, frequency, with_coords=False):
+
+def SSMI_Tb(file_location, hemisphere, frequency, with_coords=False, mmap=False, region=None, dtype=np.float64,
+            raw=False, coord_dtype=None, flags=None):
 
     """ Retrieves daily brightness temperatures on polar stereographic grid from NSIDC-0001.
 
@@ -117,33 +267,53 @@ def SSMI_Tb(file_location, hemisphere, frequency, with_coords=False):
     Distributed Active Archive Center. doi: https://doi.org/10.5067/QU2UYQ6T0B3P. [Date Accessed].
 
     Args:
-        file_location (str): location of file to read
+        file_location (str or file): location of file to read, which may be compressed, or an open binary file object
+        (see concentration).
         hemisphere (str): 'n' or 's' to represent northern or southern hemisphere.
         frequency (float): Frequency of Tb to read (important as effects the resolution of the file).
         with_coords (bool): If True returns a dictionary that includes the geo_coordinats.
+        mmap (bool): If True, the data are returned as a read-only numpy.memmap of the raw int16 values (in tenths of
+        a Kelvin) rather than being read into memory.
+        region (str or tuple): optional, a region name from get_geo_coords.REGIONS or a (lat_min, lat_max, lon_min,
+        lon_max) box. Only the window of the grid covering the region is read (see concentration).
+        dtype (numpy.dtype): dtype of the returned values. Defaults to float64; float32 halves the memory.
+        raw (bool): If True, the packed values stored in the file (int16, in tenths of a Kelvin, 0 where there are no
+        data) are read into memory without conversion; divide by 10 for Kelvin. The bare array carries no metadata;
+        the scale_factor is only returned under 'attrs' with with_coords=True.
+        coord_dtype (numpy.dtype): optional, dtype of the lon/lat arrays (e.g. np.float32). By default the cached
+        float64 grids are returned.
+        flags (str): optional, 'nan' to set cells with no data (stored as 0) to NaN, or 'mask' to return a numpy
+        masked array with those cells masked. Can't be combined with raw or mmap.
 
     Returns:
         data (numpy.array): 2D array of brightness temperatures, shape of which depends on grid used.
 
     """
 
-    resolution = 25 if frequency < 40 else 12.5
+    layout, grid_key = _SSMI_Tb_spec(hemisphere, frequency)
 
-    dims = get_geo_coords.get_dims(proj='ps', hemisphere=hemisphere, resolution=resolution)
+    window = _window(grid_key, region)
 
-    with open(file_location, mode='rb') as file:
+    if flags and (raw or mmap):
+        raise ValueError('flags converts the packed values, so it cannot be used with raw or mmap.')
 
-        data = [int.from_bytes(file.read(2), 'little', signed=True) for i in range(dims[0] * dims[1])]
+    if flags:
 
-    data = np.reshape(data, dims).astype(float)/10
+        header, packed = _read(file_location, layout, window=window, raw=True)
 
-    geo_coords = get_geo_coords.polar_stereo(resolution=resolution,
-                                                hemisphere=hemisphere)
+        data = nsidc_flags.apply(decode.to_physical(packed, layout, dtype=dtype), nsidc_flags.tb_missing(packed), flags)
+
+    else:
+        header, data = _read(file_location, layout, mmap, window, raw=raw, dtype=dtype)
 
     if with_coords:
+
+        geo_coords = _grid_coords(*grid_key, window=window, dtype=coord_dtype)
+
         return_dict = {'data':data,
                        'lon':geo_coords['lon'],
-                       'lat':geo_coords['lat']}
+                       'lat':geo_coords['lat'],
+                       'attrs':_attributes('SSMI_Tb', layout, raw or mmap)}
 
 
         return(return_dict)
@@ -152,7 +322,7 @@ def SSMI_Tb(file_location, hemisphere, frequency, with_coords=False):
         return(data)
 
 def AMSR_E(file_location, freq, pol, hemisphere,
-           resolution=25, with_coords=False):
+           resolution=25, with_coords=False, region=None, dtype=None, raw=False, coord_dtype=None):
 
     """ Processes AMSR-E/Aqua daily brightness temperatures.
 
@@ -168,24 +338,45 @@ def AMSR_E(file_location, freq, pol, hemisphere,
         hemisphere (str): 'n' or 'h', hemisphere of the data (essential for supplying the right grid using with_coords).
         resolution (float): optional, the resolution of the grid you want supplied (if you do want one).
         with_coords (bool): optional, if True then a dictionary is supplied with the geocoordinates.
+        region (str or tuple): optional, a region name from get_geo_coords.REGIONS or a (lat_min, lat_max, lon_min,
+        lon_max) box. The data (and coords) are cropped to the window of the grid covering the region.
+        dtype (numpy.dtype): optional, dtype of the returned values (e.g. np.float32). Defaults to the dtype that the
+        netCDF library gives the variable.
+        raw (bool): If True, the packed values stored in the file are returned without applying any scale factor or
+        fill value masking. The bare array carries no metadata; the variable's scale_factor and _FillValue are only
+        returned under 'attrs' with with_coords=True.
+        coord_dtype (numpy.dtype): optional, dtype of the lon/lat arrays (e.g. np.float32).
 
     Returns:
         data (numpy array): a 2D grid of brightness temperatures.
 
     """
 
-    dataset = Dataset(file_location)
+    from netCDF4 import Dataset
+
+    window = _window(('ps', resolution, hemisphere), region)
+
+    with instrument.stage('io') as io:
+
+        dataset = Dataset(file_location)
+
+        variable = dataset[f'SI_25km_{hemisphere.upper()}H_{freq}{pol.upper()}_DAY']
+
+        if raw:
+            variable.set_auto_maskandscale(False)
 
-    data = np.array(dataset[f'SI_25km_{hemisphere.upper()}H_{freq}{pol.upper()}_DAY'])
+        data = np.array(variable[window] if window else variable, dtype=None if raw else dtype)
+
+        io.n_bytes = data.nbytes
 
     if with_coords:
 
-        geo_coords = get_geo_coords.polar_stereo(resolution=resolution,
-                                                 hemisphere=hemisphere)
+        geo_coords = _grid_coords('ps', resolution, hemisphere, window=window, dtype=coord_dtype)
 
         return_dict = {'data':data,
                        'lon':geo_coords['lon'],
-                       'lat':geo_coords['lat']}
+                       'lat':geo_coords['lat'],
+                       'attrs':{key: variable.getncattr(key) for key in variable.ncattrs()}}
 
         return(return_dict)
 
@@ -193,6 +384,550 @@ def AMSR_E(file_location, freq, pol, hemisphere,
         return(data)
 
 
+def read_many(file_locations, reader, with_coords=True, dtype=np.float64, out=None,
+              workers=None, backend='thread', chunk_size=1, raw=False, coord_dtype=None, cache=False, fraction=False,
+              flags=None, **kwargs):
+
+    """ Reads many daily files into a single (time, y, x) array.
+
+    The output array is allocated once and every file is decoded straight into its own slice, so there is no per-file
+    reallocation and no final np.stack copy. Dates are parsed from NSIDC file names such as tb_f17_20190711_v5_n37h.bin
+    or nt_19781111_n07_v1.1_n.bin (see parse_date).
+
+    Args:
+        file_locations (list): locations of the files to read, in the order they should appear along the time axis.
+        Compressed (gzip, bzip2 or xz) files are decompressed straight into their slices. Open binary file objects can
+        be given too, except with the 'process' backend.
+        reader (str or function): the reader to use, e.g. 'SSMI_Tb', 'concentration' or read_file.AMSR_E.
+        with_coords (bool): If True, the lon/lat grid is attached (once) to the returned dictionary.
+        dtype (numpy.dtype): dtype of the output array. Defaults to float64, like the single-file readers.
+        out (numpy.array): optional, a (time, y, x) array (e.g. a numpy.memmap) to decode the files into.
+        workers (int): optional, if given the files are read in parallel by this many workers (see
+        parallel.decode_files). Files that fail to read are then reported under the 'errors' key instead of raising, and
+        their slices are filled with NaN, or with 0 for integer output (raw=True), where they can't be told apart from
+        real data (e.g. 0 % concentration). Check 'errors' to find the failed files.
+        backend (str): 'thread' or 'process', the kind of pool used when workers is given. With 'process', the output
+        is a numpy.memmap (on a temporary file unless out is a file-backed numpy.memmap) that every worker writes into.
+        chunk_size (int): number of consecutive files handed to a worker at a time.
+        raw (bool): If True, the packed values stored in the files (e.g. uint8 concentrations or int16 tenths of a
+        Kelvin) are kept as they are, and dtype is ignored. A 40 year daily cube of 12.5 km brightness temperatures
+        then takes 8 GB rather than 32 GB.
+        coord_dtype (numpy.dtype): optional, dtype of the lon/lat arrays (e.g. np.float32).
+        cache (bool): If True, each file is read through the on-disk cache of decoded arrays (see cache.read), so
+        files that were read before aren't decoded again. Needs file locations rather than open file objects.
+        fraction (bool): concentration only, if True the cube holds fractions (0-1) with every flagged cell NaN (see
+        concentration). Can't be combined with raw.
+        flags (str): concentration and SSMI_Tb only, 'nan' or 'mask' to hide flagged cells or cells with no data (see
+        concentration and SSMI_Tb). The whole cube is masked at once after decoding. Can't be combined with raw.
+        **kwargs: arguments for the reader other than file_location, e.g. hemisphere='n', frequency=37.
+
+    Returns:
+        dictionary with keys 'data' (3D numpy.array), 'time' (numpy.datetime64 array) and 'attrs' (metadata such as
+        the units, scale factor and flag values of 'data'), plus 'lon' and 'lat' if with_coords is True, and 'errors'
+        (a list of (index, file_location, message)) if workers is given.
+
+    """
+
+    reader_name = reader if isinstance(reader, str) else reader.__name__
+
+    if reader_name not in _daily_readers:
+        raise ValueError(f'read_many supports {sorted(_daily_readers)} (one time step per file), not {reader_name}.')
+
+    _check_batch_options('read_many', reader_name, kwargs, raw, fraction, flags)
+
+    file_locations = list(file_locations)
+
+    if cache and any(hasattr(f, 'read') for f in file_locations):
+        raise ValueError('cache needs file locations; open file objects cannot be cached.')
+
+    spec, fallback_reader = _daily_readers[reader_name]
+
+    layout, grid = spec(**kwargs)
+
+    if raw:
+        dtype = layout.dtype
+        reader_kwargs = dict(kwargs, raw=True) if fallback_reader is not None else kwargs
+    else:
+        reader_kwargs = kwargs
+
+    if cache:
+        fallback_reader = array_cache.read
+        reader_kwargs = dict(kwargs, reader=reader_name, dtype=dtype, raw=raw)
+
+    shape = (len(file_locations),) + layout.shape
+
+    temporary_output = (workers is not None) and (backend == 'process') and (out is None)
+
+    if temporary_output:
+        out = parallel.shared_output(shape, dtype)
+
+    elif out is None:
+        out = np.empty(shape, dtype=dtype)
+        instrument.count('allocated_bytes', out.nbytes)
+
+    elif out.shape != shape:
+        raise ValueError(f'out must have shape {shape}.')
+
+    if workers is not None:
+
+        try:
+            errors = parallel.decode_files(file_locations, layout, out,
+                                           workers=workers,
+                                           backend=backend,
+                                           chunk_size=chunk_size,
+                                           reader=fallback_reader,
+                                           reader_kwargs=reader_kwargs,
+                                           raw=raw)
+        finally:
+            if temporary_output:
+                parallel.release_output(out)
+
+    elif (fallback_reader is None) and raw:
+
+        for i, file_location in enumerate(file_locations):
+            decode.read_binary(file_location, layout, out=out[i])
+
+    elif fallback_reader is None:
+
+        raw_buffer = np.empty(layout.shape, dtype=layout.dtype)
+
+        for i, file_location in enumerate(file_locations):
+
+            decode.read_binary(file_location, layout, out=raw_buffer)
+
+            decode.to_physical(raw_buffer, layout, out=out[i])
+
+    else:
+
+        # formats that aren't flat binary are read with their own reader, then copied into place
+
+        for i, file_location in enumerate(file_locations):
+            out[i] = fallback_reader(file_location, **reader_kwargs)
+
+    return_dict = {'data': out,
+                   'time': np.array([parse_date(f) for f in file_locations], dtype='datetime64[D]'),
+                   'attrs': _attributes(reader_name, layout, raw, fraction=fraction, hidden=bool(fraction or flags))}
+
+    if fraction or flags:
+        return_dict['data'] = _hide_flags(reader_name, out, fraction, flags)
+
+    if workers is not None:
+        return_dict['errors'] = errors
+
+    if with_coords:
+
+        geo_coords = _grid_coords(*grid, dtype=coord_dtype)
+
+        return_dict['lon'] = geo_coords['lon']
+        return_dict['lat'] = geo_coords['lat']
+
+    return(return_dict)
+
+
+def iter_files(file_locations, reader, reuse_buffer=False, prefetch=False, dtype=np.float64, raw=False, cache=False,
+               fraction=False, flags=None, **kwargs):
+
+    """ Reads daily files one at a time, yielding (timestamp, array) pairs.
+
+    This is the streaming counterpart of read_many: only one time step (two with prefetch) is held in memory at once,
+    however many files there are.
+
+    Args:
+        file_locations (list): locations of the files to read (which may be compressed), in order.
+        reader (str or function): the reader to use, e.g. 'SSMI_Tb', 'concentration' or read_file.AMSR_E.
+        reuse_buffer (bool): If True, every step is written into the same preallocated array, so each yielded array is
+        only valid until the generator is advanced (copy it if you need to keep it).
+        prefetch (bool): If True, the next file is read in a background thread while the current step is processed.
+        dtype (numpy.dtype): dtype of the yielded arrays. Defaults to float64, like the single-file readers.
+        raw (bool): If True, the packed values stored in the files are yielded as they are, and dtype is ignored.
+        cache (bool): If True, each file is read through the on-disk cache of decoded arrays (see cache.read). Unless
+        reuse_buffer is True, the yielded arrays are then read-only memory maps of the cache.
+        fraction (bool): concentration only, if True fractions (0-1) are yielded with every flagged cell NaN.
+        flags (str): concentration and SSMI_Tb only, 'nan' or 'mask' to hide flagged cells or cells with no data.
+        **kwargs: arguments for the reader other than file_location, e.g. hemisphere='n', frequency=37.
+
+    Yields:
+        timestamp (numpy.datetime64), data (numpy.array): the date parsed from the file name (see parse_date) and the
+        2D data.
+
+    """
+
+    reader_name = reader if isinstance(reader, str) else reader.__name__
+
+    if reader_name not in _daily_readers:
+        raise ValueError(f'iter_files supports {sorted(_daily_readers)} (one time step per file), not {reader_name}.')
+
+    _check_batch_options('iter_files', reader_name, kwargs, raw, fraction, flags)
+
+    file_locations = list(file_locations)
+
+    if cache and any(hasattr(f, 'read') for f in file_locations):
+        raise ValueError('cache needs file locations; open file objects cannot be cached.')
+
+    spec, fallback_reader = _daily_readers[reader_name]
+
+    layout, grid = spec(**kwargs)
+
+    if raw:
+        dtype = layout.dtype
+        if fallback_reader is not None:
+            kwargs = dict(kwargs, raw=True)
+
+    if cache:
+        fallback_reader = array_cache.read
+        kwargs = dict(kwargs, reader=reader_name, dtype=dtype, raw=raw)
+
+    # one raw buffer per file in flight; raw steps that aren't reused get a fresh array each
+
+    keep_buffers = (fallback_reader is None) and (reuse_buffer or not raw)
+
+    raw_buffers = [np.empty(layout.shape, dtype=layout.dtype) if keep_buffers else None
+                   for i in range(2 if prefetch else 1)]
+
+    def load(file_location, raw_buffer):
+        if fallback_reader is None:
+            return(decode.read_binary(file_location, layout, out=raw_buffer)[1])
+        return(fallback_reader(file_location, **kwargs))
+
+    buffer = np.empty(layout.shape, dtype=dtype) if (reuse_buffer and not (raw and fallback_reader is None)) else None
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    try:
+        pending = None
+
+        for i, file_location in enumerate(file_locations):
+
+            if pending is None:
+                packed = load(file_location, raw_buffers[i % len(raw_buffers)])
+            else:
+                packed = pending.result()
+
+            if prefetch and (i + 1 < len(file_locations)):
+                pending = executor.submit(load, file_locations[i + 1], raw_buffers[(i + 1) % len(raw_buffers)])
+            else:
+                pending = None
+
+            if (fallback_reader is None) and raw:
+                data = packed
+            elif fallback_reader is None:
+                data = decode.to_physical(packed, layout, out=buffer, dtype=dtype)
+            elif reuse_buffer:
+                buffer[...] = packed
+                data = buffer
+            else:
+                data = np.asarray(packed, dtype=dtype)
+
+            if fraction or flags:
+                data = _hide_flags(reader_name, data, fraction, flags)
+
+            yield(parse_date(file_location), data)
+
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def iter_concentration(file_locations, hemisphere, reuse_buffer=False, prefetch=False):
+
+    """ Streaming version of concentration, yielding (timestamp, array) pairs. See iter_files. """
+
+    return(iter_files(file_locations, 'concentration', reuse_buffer=reuse_buffer, prefetch=prefetch,
+                      hemisphere=hemisphere))
+
+
+def iter_SSMI_Tb(file_locations, hemisphere, frequency, reuse_buffer=False, prefetch=False):
+
+    """ Streaming version of SSMI_Tb, yielding (timestamp, array) pairs. See iter_files. """
+
+    return(iter_files(file_locations, 'SSMI_Tb', reuse_buffer=reuse_buffer, prefetch=prefetch,
+                      hemisphere=hemisphere, frequency=frequency))
+
+
+def iter_AMSR_E(file_locations, freq, pol, hemisphere, resolution=25, reuse_buffer=False, prefetch=False):
+
+    """ Streaming version of AMSR_E, yielding (timestamp, array) pairs. See iter_files. """
+
+    return(iter_files(file_locations, 'AMSR_E', reuse_buffer=reuse_buffer, prefetch=prefetch,
+                      freq=freq, pol=pol, hemisphere=hemisphere, resolution=resolution))
+
+
+def parse_date(file_location):
+
+    """ Parses the date from the name of a daily NSIDC file.
+
+    Looks for an 8 digit YYYYMMDD date in the file name, as found in e.g. tb_f17_20190711_v5_n37h.bin,
+    nt_19781111_n07_v1.1_n.bin or AMSR_E_L3_SeaIce25km_V15_20020617.hdf.
+
+    Args:
+        file_location (str or file): location or name of the file, or a file object with a name.
+
+    Returns:
+        date (numpy.datetime64): the date, or NaT if the file name doesn't contain one.
+
+    """
+
+    match = re.search(r'(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)', _file_name(file_location))
+
+    if match is None:
+        return(np.datetime64('NaT', 'D'))
+
+    return(np.datetime64('-'.join(match.groups()), 'D'))
+
+
+def _concentration_layout(hemisphere):
+
+    # 300 byte header followed by one unsigned byte per cell of the 25 km grid
+
+    dims = get_geo_coords.get_dims(proj='ps', hemisphere=hemisphere, resolution=25)
+
+    return(decode.layout(header=300, dtype='u1', shape=dims))
+
+
+def _piomas_layout(records=12, components=1):
+
+    # monthly or daily records of little-endian 4-byte floats, no header. Vector fields (e.g. drift) hold each
+    # component in turn within a record.
+
+    dims = get_geo_coords.get_dims(proj='piomas', resolution=None, hemisphere='n')
+
+    if components > 1:
+        dims = (components,) + dims
+
+    return(decode.layout(header=0, dtype='<f4', shape=(records,) + dims))
+
+
+def _piomas_records(file_location, components=1):
+
+    record_size = decode.payload_size(_piomas_layout(1, components))
+
+    size = decode.data_size(file_location)
+
+    if size is None:
+        raise ValueError(f'The size of {file_location} is only known once it is decompressed; give the number of '
+                         f'records.')
+
+    if (size == 0) or (size % record_size):
+        raise ValueError(f'{file_location} is {size} bytes, which is not a whole number of PIOMAS records of '
+                         f'{record_size} bytes.')
+
+    return(size // record_size)
+
+
+def _SSMI_resolution(frequency):
+
+    return(25 if frequency < 40 else 12.5)
+
+
+def _SSMI_Tb_layout(hemisphere, frequency):
+
+    # little-endian 2-byte signed integers in tenths of a Kelvin, no header
+
+    dims = get_geo_coords.get_dims(proj='ps', hemisphere=hemisphere, resolution=_SSMI_resolution(frequency))
+
+    return(decode.layout(header=0, dtype='<i2', shape=dims, divisor=10))
+
+
+def _concentration_spec(hemisphere):
+
+    return(_concentration_layout(hemisphere), ('ps', 25, hemisphere))
+
+
+def _SSMI_Tb_spec(hemisphere, frequency):
+
+    return(_SSMI_Tb_layout(hemisphere, frequency), ('ps', _SSMI_resolution(frequency), hemisphere))
+
+
+def _piomas_spec(records=12, components=1):
+
+    return(_piomas_layout(records, components), ('piomas', None, 'n'))
+
+
+def _piomas_times(file_location, records, daily=None):
+
+    # yearly files are named e.g. heff.H1993 (or heff.H1993.gz). Unless daily says otherwise, files of up to twelve
+    # records are monthly (the current year's file is only partly filled), with records starting on the first of each
+    # month; longer files are daily from 1 January.
+
+    if daily is None:
+        daily = records > 12
+
+    elif (not daily) and (records > 12):
+        raise ValueError(f'A monthly file has at most 12 records, not {records}.')
+
+    match = re.search(r'\.H(\d{4})(\.(gz|bz2|xz))?$', _file_name(file_location))
+
+    if (match is None) or (records > 366):
+        return(np.full(records, np.datetime64('NaT', 'D')))
+
+    if not daily:
+        return((np.datetime64(f'{match.group(1)}-01', 'M') + np.arange(records)).astype('datetime64[D]'))
+
+    return(np.datetime64(f'{match.group(1)}-01-01', 'D') + np.arange(records))
+
+
+def _file_name(file_location):
+
+    # base name of a location or of an open file object (e.g. for parse_date)
+
+    return(os.path.basename(str(getattr(file_location, 'name', file_location))))
+
+
+def _AMSR_E_spec(freq, pol, hemisphere, resolution=25):
+
+    dims = get_geo_coords.get_dims(proj='ps', hemisphere=hemisphere, resolution=resolution)
+
+    # only the shape is used, as the HDF file is read through AMSR_E itself
+
+    return(decode.layout(header=0, dtype='<i2', shape=dims), ('ps', resolution, hemisphere))
+
+
+def _grid_coords(proj, resolution, hemisphere, window=None, dtype=None):
+
+    if proj == 'piomas':
+        geo_coords = get_geo_coords.piomas_grid()
+    else:
+        geo_coords = get_geo_coords.polar_stereo(resolution=resolution, hemisphere=hemisphere)
+
+    if window and (proj == 'piomas'):
+        geo_coords = {coord: geo_coords[coord].reshape(get_geo_coords.PIOMAS_NATIVE_SHAPE)[window]
+                      for coord in ['lon', 'lat']}
+
+    elif window:
+        geo_coords = {coord: geo_coords[coord][window] for coord in ['lon', 'lat']}
+
+    if dtype is not None:
+        geo_coords = {coord: np.asarray(geo_coords[coord], dtype=dtype) for coord in ['lon', 'lat']}
+
+    return(geo_coords)
+
+
+def _check_batch_options(function_name, reader_name, kwargs, raw, fraction, flags):
+
+    # options of the single-file readers that the batch readers don't apply
+
+    unsupported = [name for name in _SINGLE_FILE_OPTIONS if name in kwargs]
+
+    if unsupported:
+        raise ValueError(f'{function_name} does not support {", ".join(unsupported)}; read the files one at a time or '
+                         f'crop the result.')
+
+    if fraction and (reader_name != 'concentration'):
+        raise ValueError(f'fraction only applies to concentration, not {reader_name}.')
+
+    if flags and (reader_name not in ('concentration', 'SSMI_Tb')):
+        raise ValueError(f'flags only applies to concentration and SSMI_Tb, not {reader_name}.')
+
+    if (fraction or flags) and raw:
+        raise ValueError('fraction and flags convert the packed values, so they cannot be used with raw.')
+
+
+def _hide_flags(reader_name, data, fraction, flags):
+
+    # applies the fraction and flags options of the single-file readers to decoded values (a step or a whole cube),
+    # in place where the array is writeable
+
+    if not data.flags['WRITEABLE']:
+        data = data.copy()
+
+    if reader_name == 'concentration':
+        hidden = nsidc_flags.flag_mask(data)
+    else:
+        hidden = nsidc_flags.tb_missing(data)
+
+    if fraction:
+        np.divide(data, nsidc_flags.CONCENTRATION_SCALE, out=data)
+
+    return(nsidc_flags.apply(data, hidden, flags or 'nan'))
+
+
+def _window(grid_key, region):
+
+    if region is None:
+        return(None)
+
+    return(get_geo_coords.region_window(*grid_key, region))
+
+
+def _read(file_location, layout, mmap=False, window=None, raw=False, dtype=np.float64):
+
+    # reads the header and the data (or a row/column window of them), either into memory or as a memmap. With raw, the
+    # packed values are returned as they are in the file.
+
+    if mmap:
+
+        data = decode.memmap(file_location, layout)
+
+        with decode.open_file(file_location) as fin:
+            header = decode.read_header(fin, layout)
+
+        if window:
+            data = data[(Ellipsis,) + window]
+
+        return(header, data)
+
+    if window is None:
+
+        header, packed = decode.read_binary(file_location, layout)
+
+    else:
+
+        with decode.open_file(file_location) as fin:
+            header = decode.read_header(fin, layout)
+            packed = decode.read_window(fin, layout, *window)
+
+    if raw:
+        return(header, packed)
+
+    return(header, decode.to_physical(packed, layout, dtype=dtype))
+
+
+def _attributes(reader_name, layout, raw=False, fraction=False, hidden=False):
+
+    # metadata describing the values returned by a reader; scale_factor is only given for packed values, so that the
+    # attributes can be written to netcdf files as they are (following the CF conventions). hidden means that the
+    # flagged cells have been set to NaN or masked.
+
+    if reader_name == 'concentration' and fraction:
+        attributes = {'long_name': 'sea ice concentration',
+                      'units': '1',
+                      'comment': 'Nasa Team, flagged cells are NaN'}
+
+    elif reader_name == 'concentration' and hidden:
+        attributes = {'long_name': 'sea ice concentration',
+                      'comment': 'Nasa Team, 0-250 for 0-100 %, flagged cells are NaN'}
+
+    elif reader_name == 'concentration':
+        attributes = {'long_name': 'sea ice concentration',
+                      'comment': 'Nasa Team, 0-250 for 0-100 %, flags above 250',
+                      'valid_range': np.array([0, nsidc_flags.CONCENTRATION_SCALE], dtype=layout.dtype),
+                      'flag_values': np.array(list(nsidc_flags.CONCENTRATION_FLAGS), dtype=layout.dtype),
+                      'flag_meanings': ' '.join(nsidc_flags.CONCENTRATION_FLAGS.values())}
+
+    elif reader_name in ('SSMI_Tb', 'AMSR_E'):
+        attributes = {'long_name': 'brightness temperature', 'units': 'K'}
+
+    else:
+        attributes = {'source': 'PIOMAS'}
+
+    if raw and layout.divisor:
+        attributes['scale_factor'] = 1 / layout.divisor
+
+    return(attributes)
+
+
+# options of the single-file readers that read_many and iter_files reject
+
+_SINGLE_FILE_OPTIONS = ('region',)
+
+# readers that return one 2D time step per file: name -> (spec function, reader to fall back on for formats that
+# aren't flat binary, or None)
+
+_daily_readers = {'concentration': (_concentration_spec, None),
+                  'SSMI_Tb': (_SSMI_Tb_spec, None),
+                  'AMSR_E': (_AMSR_E_spec, AMSR_E)}
+
+
 if __name__ == '__main__':
     # pass
     from tools import plot, dict_to_nc
@@ -0,0 +1,278 @@
+import os
+import threading
+import numpy as np
+from readice import get_geo_coords, sample, instrument
+
+# Weight matrices are saved here (as scipy .npz files) so that each grid pair is only computed once.
+
+WEIGHTS_DIR = os.environ.get('READICE_REGRID_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'readice', 'regrid'))
+
+# part of every weights file name; bump it whenever the weights computed for a grid pair change, so that files saved by
+# older versions are no longer used
+
+WEIGHTS_VERSION = 2
+
+_weights = {}
+_weights_lock = threading.Lock()
+
+
+def regrid(data, source, target, method='nearest', weights=None, **kwargs):
+
+    """ Regrids data between the PIOMAS, polar stereographic and EASE-Grid 2.0 grids.
+
+    The source-to-target weights are a sparse matrix computed once per grid pair and method (see regrid_weights), so
+    regridding a (time, y, x) cube costs one sparse matrix product, i.e. one sparse mat-vec per time step. NaNs in the
+    data are left out and the weights of the remaining source cells renormalised.
+
+    Args:
+        data (numpy.array): 2D grid, or an array whose last two dimensions are the source grid.
+        source (tuple): the source grid as (proj, resolution, hemisphere), e.g. ('piomas', None, 'n') or ('ps', 25, 'n').
+        target (tuple): the target grid, e.g. ('ps', 12.5, 'n') or ('ease2', 25, 'n').
+        method (str): 'nearest', 'bilinear' or 'conservative'.
+        weights (scipy.sparse.csr_matrix): optional, precomputed weights from regrid_weights.
+        **kwargs: passed on to regrid_weights.
+
+    Returns:
+        regridded (numpy.array): of shape data.shape[:-2] + the target grid shape. Target cells with no valid source
+        data are NaN.
+
+    """
+
+    if weights is None:
+        weights = regrid_weights(source, target, method=method, **kwargs)
+
+    data = np.asarray(data)
+
+    source_shape, target_shape = _shape(source), _shape(target)
+
+    if data.shape[-2:] != source_shape:
+        raise ValueError(f'The last two dimensions of data must be {source_shape}.')
+
+    flat = data.reshape(-1, source_shape[0] * source_shape[1]).T.astype(np.float64)
+
+    missing = np.isnan(flat)
+
+    if missing.any():
+        total = weights @ (~missing).astype(np.float64)
+        flat = np.where(missing, 0, flat)
+    else:
+        total = np.asarray(weights.sum(axis=1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        regridded = np.where(total > 0, (weights @ flat) / total, np.nan)
+
+    return(regridded.T.reshape(data.shape[:-2] + target_shape))
+
+
+def regrid_weights(source, target, method='nearest', subsamples=5, cache=True):
+
+    """ Computes (or loads) the sparse source-to-target weight matrix for a grid pair.
+
+    'nearest' takes the source cell containing each target cell centre, 'bilinear' interpolates between the four
+    source cells surrounding it, and 'conservative' area-weights every source cell overlapping the target cell. The
+    overlaps are approximated by sub-sampling each target cell on a subsamples x subsamples grid, which is exact in
+    the limit and suits regridding to a coarser or similar grid.
+
+    Weights are kept in memory and saved to WEIGHTS_DIR, so they are only computed once per grid pair.
+
+    Args:
+        source (tuple): the source grid as (proj, resolution, hemisphere), e.g. ('piomas', None, 'n').
+        target (tuple): the target grid, e.g. ('ps', 25, 'n').
+        method (str): 'nearest', 'bilinear' or 'conservative'.
+        subsamples (int): sub-sampling of each target cell for 'conservative'.
+        cache (bool): if False, the weights are neither loaded from nor saved to WEIGHTS_DIR.
+
+    Returns:
+        weights (scipy.sparse.csr_matrix): of shape (target cells, source cells), rows summing to at most 1.
+
+    """
+
+    import scipy.sparse
+
+    source, target = _normalise(source), _normalise(target)
+
+    name = '_'.join(str(x) for x in source + target + (method,))
+    if method == 'conservative':
+        name += f'_{subsamples}'
+
+    with _weights_lock:
+
+        if name in _weights:
+            instrument.count('regrid_weights_hit')
+            return(_weights[name])
+
+        weights_file = os.path.join(WEIGHTS_DIR, f'{name}_v{WEIGHTS_VERSION}.npz')
+
+        if cache and os.path.exists(weights_file):
+            instrument.count('regrid_weights_load')
+            weights = scipy.sparse.load_npz(weights_file).tocsr()
+
+        else:
+            instrument.count('regrid_weights_miss')
+
+            with instrument.stage('regrid_weights'):
+                weights = _compute_weights(source, target, method, subsamples)
+
+            if cache:
+                try:
+                    os.makedirs(WEIGHTS_DIR, exist_ok=True)
+                    tmp_file = f'{weights_file}.{os.getpid()}.tmp.npz'
+                    scipy.sparse.save_npz(tmp_file, weights)
+                    os.replace(tmp_file, weights_file)
+                except OSError:
+                    pass
+
+        _weights[name] = weights
+
+    return(weights)
+
+
+def clear_weights():
+
+    """ Forgets the weight matrices held in memory (the files in WEIGHTS_DIR are kept). """
+
+    with _weights_lock:
+        _weights.clear()
+
+
+def _normalise(grid):
+
+    proj, resolution, hemisphere = grid
+
+    if 'pio' in proj.lower():
+        return(('piomas', None, 'n'))
+
+    return((proj, resolution, hemisphere))
+
+
+def _shape(grid):
+
+    proj, resolution, hemisphere = _normalise(grid)
+
+    return(get_geo_coords.get_dims(proj=proj, resolution=resolution, hemisphere=hemisphere))
+
+
+def _coords(grid):
+
+    proj, resolution, hemisphere = _normalise(grid)
+
+    if proj == 'piomas':
+        return(get_geo_coords.piomas_grid())
+    elif proj == 'ease2':
+        return(get_geo_coords.ease2_grid(resolution=resolution, hemisphere=hemisphere))
+
+    return(get_geo_coords.polar_stereo(resolution=resolution, hemisphere=hemisphere))
+
+
+def _source_indices(source, lon, lat, method):
+
+    # flat source indices and weights for each point (one column per contributing source cell)
+
+    proj, resolution, hemisphere = source
+
+    rows, cols = sample.grid_index(lon, lat, proj=proj, resolution=resolution, hemisphere=hemisphere)
+
+    if proj == 'piomas':
+        n_rows, n_cols = get_geo_coords.PIOMAS_NATIVE_SHAPE
+    else:
+        n_rows, n_cols = _shape(source)
+
+    if method == 'bilinear':
+        row_0, col_0 = np.floor(rows), np.floor(cols)
+        row_f, col_f = rows - row_0, cols - col_0
+        corners = [(row_0, col_0, (1 - row_f) * (1 - col_f)),
+                   (row_0, col_0 + 1, (1 - row_f) * col_f),
+                   (row_0 + 1, col_0, row_f * (1 - col_f)),
+                   (row_0 + 1, col_0 + 1, row_f * col_f)]
+    else:
+        corners = [(np.rint(rows), np.rint(cols), np.ones_like(rows))]
+
+    indices, weights = [], []
+
+    for corner_rows, corner_cols, corner_weights in corners:
+
+        if proj == 'piomas':
+            corner_cols = corner_cols % n_cols
+
+        valid = ((corner_rows >= 0) & (corner_rows < n_rows) & (corner_cols >= 0) & (corner_cols < n_cols)
+                 & (corner_weights > 0))
+
+        flat = np.where(valid, corner_rows * n_cols + corner_cols, 0).astype(np.int64)
+
+        indices.append(flat)
+        weights.append(np.where(valid, corner_weights, 0))
+
+    return(indices, weights)
+
+
+def _target_points(target, subsamples):
+
+    # lon/lat of subsamples x subsamples points spread evenly over each target cell, shape (cells, subsamples ** 2)
+
+    coords = _coords(target)
+
+    proj, resolution, hemisphere = target
+
+    topology = get_geo_coords.PIOMAS_NATIVE_SHAPE if proj == 'piomas' else _shape(target)
+
+    x, y = get_geo_coords.ps_forward(coords['lon'], coords['lat'], hemisphere)
+
+    x, y = x.reshape(topology), y.reshape(topology)
+
+    if proj == 'piomas':
+        dx_dcol = (np.roll(x, -1, axis=1) - np.roll(x, 1, axis=1)) / 2
+        dy_dcol = (np.roll(y, -1, axis=1) - np.roll(y, 1, axis=1)) / 2
+    else:
+        dx_dcol, dy_dcol = np.gradient(x, axis=1), np.gradient(y, axis=1)
+
+    dx_drow, dy_drow = np.gradient(x, axis=0), np.gradient(y, axis=0)
+
+    offsets = (np.arange(subsamples) + 0.5) / subsamples - 0.5
+
+    row_offsets, col_offsets = [o.ravel() for o in np.meshgrid(offsets, offsets, indexing='ij')]
+
+    points_x = (x.reshape(-1, 1) + dx_drow.reshape(-1, 1) * row_offsets + dx_dcol.reshape(-1, 1) * col_offsets)
+    points_y = (y.reshape(-1, 1) + dy_drow.reshape(-1, 1) * row_offsets + dy_dcol.reshape(-1, 1) * col_offsets)
+
+    return(get_geo_coords.ps_inverse(points_x, points_y, hemisphere))
+
+
+def _compute_weights(source, target, method, subsamples):
+
+    import scipy.sparse
+
+    n_source = int(np.prod(_shape(source)))
+    n_target = int(np.prod(_shape(target)))
+
+    if method in ('nearest', 'bilinear'):
+
+        coords = _coords(target)
+
+        lon, lat = np.asarray(coords['lon']).ravel(), np.asarray(coords['lat']).ravel()
+
+        indices, weights = _source_indices(source, lon, lat, method)
+
+        target_indices = [np.arange(n_target)] * len(indices)
+
+    elif method == 'conservative':
+
+        lon, lat = _target_points(target, subsamples)
+
+        indices, weights = _source_indices(source, lon.ravel(), lat.ravel(), 'nearest')
+
+        weights = [w / subsamples ** 2 for w in weights]
+
+        target_indices = [np.repeat(np.arange(n_target), subsamples ** 2)]
+
+    else:
+        raise ValueError(f"method must be 'nearest', 'bilinear' or 'conservative', not {method}.")
+
+    rows = np.concatenate(target_indices)
+    cols = np.concatenate(indices)
+    values = np.concatenate(weights)
+
+    keep = values > 0
+
+    weights = scipy.sparse.coo_matrix((values[keep], (rows[keep], cols[keep])), shape=(n_target, n_source))
+
+    return(weights.tocsr())
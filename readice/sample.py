@@ -0,0 +1,177 @@
+import numpy as np
+from functools import lru_cache
+from readice import get_geo_coords
+
+
+def grid_index(lon, lat, proj='ps', resolution=25, hemisphere='n'):
+
+    """ Maps lon/lat points to fractional (row, column) positions on a readice grid.
+
+    On the polar stereographic and EASE-Grid 2.0 grids this is a direct forward projection (O(1) per point). On the
+    curvilinear PIOMAS grid the nearest cell centre is found with a cached KD-tree (O(log n) per point) and refined
+    with the local Jacobian of the grid.
+
+    Args:
+        lon (numpy.array): longitudes of the points in decimal degrees.
+        lat (numpy.array): latitudes of the points in decimal degrees.
+        proj (str): 'ps', 'ease2' or 'piomas'.
+        resolution (float): resolution of the grid in km (ignored for PIOMAS).
+        hemisphere (str): 'n' or 's' (ignored for PIOMAS).
+
+    Returns:
+        rows (numpy.array), cols (numpy.array): fractional positions, integers being cell centres. Points that are not
+        on the grid have positions outside it (or NaN on the PIOMAS grid). PIOMAS positions are on the native grid,
+        i.e. they index data.reshape(..., *get_geo_coords.PIOMAS_NATIVE_SHAPE), whose columns wrap around.
+
+    """
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+
+    if proj == 'ps':
+        return(get_geo_coords.ps_index(lon, lat, resolution, hemisphere))
+
+    elif proj == 'ease2':
+
+        x, y = get_geo_coords.ease2_forward(lon, lat, hemisphere)
+
+        cell = resolution * 1000
+
+        return((get_geo_coords.EASE2_HALF_EXTENT - y) / cell - 0.5, (x + get_geo_coords.EASE2_HALF_EXTENT) / cell - 0.5)
+
+    elif 'pio' in proj.lower():
+        return(_curvilinear_index(lon, lat))
+
+    raise ValueError(f"proj must be 'ps', 'ease2' or 'piomas', not {proj}.")
+
+
+def sample(data, lon, lat, proj='ps', resolution=25, hemisphere='n', method='nearest', time_index=None):
+
+    """ Extracts values of gridded data at lon/lat points, e.g. buoy positions or ship tracks.
+
+    All points are handled in one vectorized query, and data with leading dimensions (e.g. a (time, y, x) cube from
+    read_file.read_many) are sampled at every time step at once.
+
+    Args:
+        data (numpy.array): 2D grid, or an array whose last two dimensions are the grid.
+        lon (numpy.array): longitudes of the points in decimal degrees.
+        lat (numpy.array): latitudes of the points in decimal degrees.
+        proj (str): 'ps', 'ease2' or 'piomas'.
+        resolution (float): resolution of the grid in km (ignored for PIOMAS).
+        hemisphere (str): 'n' or 's' (ignored for PIOMAS).
+        method (str): 'nearest' for the value of the cell containing each point, or 'bilinear' to interpolate between
+        the four surrounding cell centres.
+        time_index (numpy.array): optional, for 3D data, the index along the first dimension at which to sample each
+        point (e.g. the day of each position of a buoy track).
+
+    Returns:
+        values (numpy.array): of shape data.shape[:-2] + lon.shape, or lon.shape if time_index is given. Points off the
+        grid are NaN.
+
+    """
+
+    data = np.asarray(data)
+
+    rows, cols = grid_index(lon, lat, proj=proj, resolution=resolution, hemisphere=hemisphere)
+
+    wrap = 'pio' in proj.lower()
+
+    if wrap:
+        data = data.reshape(data.shape[:-2] + get_geo_coords.PIOMAS_NATIVE_SHAPE)
+
+    if time_index is not None:
+
+        if data.ndim != 3:
+            raise ValueError('time_index needs a 3D (time, y, x) array.')
+
+        time_index = np.broadcast_to(np.asarray(time_index), rows.shape)
+
+    if method == 'nearest':
+        return(_gather(data, np.rint(rows), np.rint(cols), time_index, wrap))
+
+    elif method == 'bilinear':
+
+        row_0, col_0 = np.floor(rows), np.floor(cols)
+        row_f, col_f = rows - row_0, cols - col_0
+
+        return(_gather(data, row_0, col_0, time_index, wrap) * (1 - row_f) * (1 - col_f)
+               + _gather(data, row_0, col_0 + 1, time_index, wrap) * (1 - row_f) * col_f
+               + _gather(data, row_0 + 1, col_0, time_index, wrap) * row_f * (1 - col_f)
+               + _gather(data, row_0 + 1, col_0 + 1, time_index, wrap) * row_f * col_f)
+
+    raise ValueError(f"method must be 'nearest' or 'bilinear', not {method}.")
+
+
+def _gather(data, rows, cols, time_index=None, wrap=False):
+
+    n_rows, n_cols = data.shape[-2:]
+
+    if wrap:
+        cols = cols % n_cols
+
+    valid = (rows >= 0) & (rows < n_rows) & (cols >= 0) & (cols < n_cols)
+
+    safe_rows = np.where(valid, rows, 0).astype(np.intp)
+    safe_cols = np.where(valid, cols, 0).astype(np.intp)
+
+    if time_index is None:
+        values = data[..., safe_rows, safe_cols]
+    else:
+        values = data[time_index, safe_rows, safe_cols]
+
+    return(np.where(valid, values, np.nan))
+
+
+@lru_cache(maxsize=None)
+def _curvilinear_tree():
+
+    from scipy.spatial import cKDTree
+
+    grids = get_geo_coords.piomas_grid()
+
+    # the PIOMAS grid only covers the Arctic, so it is indexed in the northern polar stereographic plane
+
+    x, y = get_geo_coords.ps_forward(grids['lon'], grids['lat'], 'n')
+
+    x = x.reshape(get_geo_coords.PIOMAS_NATIVE_SHAPE)
+    y = y.reshape(get_geo_coords.PIOMAS_NATIVE_SHAPE)
+
+    tree = cKDTree(np.column_stack([x.ravel(), y.ravel()]))
+
+    # Jacobian of (x, y) with respect to (row, col); the columns wrap around
+
+    dx_drow, dy_drow = np.gradient(x, axis=0), np.gradient(y, axis=0)
+
+    dx_dcol = (np.roll(x, -1, axis=1) - np.roll(x, 1, axis=1)) / 2
+    dy_dcol = (np.roll(y, -1, axis=1) - np.roll(y, 1, axis=1)) / 2
+
+    return(tree, x, y, dx_drow, dx_dcol, dy_drow, dy_dcol)
+
+
+def _curvilinear_index(lon, lat):
+
+    tree, x, y, dx_drow, dx_dcol, dy_drow, dy_dcol = _curvilinear_tree()
+
+    point_x, point_y = get_geo_coords.ps_forward(lon, lat, 'n')
+
+    distance, nearest = tree.query(np.column_stack([point_x.ravel(), point_y.ravel()]))
+
+    row, col = np.unravel_index(nearest, x.shape)
+
+    a, b = dx_drow[row, col], dx_dcol[row, col]
+    c, d = dy_drow[row, col], dy_dcol[row, col]
+
+    det = a * d - b * c
+
+    offset_x, offset_y = point_x.ravel() - x[row, col], point_y.ravel() - y[row, col]
+
+    rows = row + (d * offset_x - b * offset_y) / det
+    cols = col + (a * offset_y - c * offset_x) / det
+
+    # points further than a couple of cells from the nearest centre are off the grid
+
+    off_grid = (distance > 2 * np.sqrt(np.abs(det))) | (rows < -0.5) | (rows > x.shape[0] - 0.5)
+
+    rows[off_grid], cols[off_grid] = np.nan, np.nan
+
+    return(rows.reshape(np.shape(lon)), cols.reshape(np.shape(lon)))
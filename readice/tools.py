@@ -1,8 +1,8 @@
 import numpy as np
-import xarray as xr
-import cartopy.crs as ccrs
-import cartopy
-import matplotlib.pyplot as plt
+from readice import instrument
+
+# xarray, netCDF4, cartopy and matplotlib are imported by the functions that use them, so that importing readice (e.g.
+# in a worker process that only decodes files) doesn't pay for them.
 
 def dict_to_nc(input_dict,
                 output_file_destination,
@@ -12,7 +12,9 @@ def dict_to_nc(input_dict,
 
     Args:
     input_dict (dict): 'data', 'lon', 'lat' keys. 'data' value must be 2 or 3d numpy array with two dims matching those of
-    'lon' and 'lat' values.
+    'lon' and 'lat' values. If a 3d array comes with a 'time' key (as from read_file.read_many), that is used as the
+    time coordinate rather than a month index. An 'attrs' key (as from the readers) becomes the attributes of the
+    variable, so packed data read with raw=True keep their scale factor and flag values.
     output_file_destination (str): destination of the file and filename (e.g. ~/robbie/my_netcdf.nc)
     variable_name (str): name for the netcdf variable (e.g. 'Brightness Temperature' or 'Sea Ice Thickness').
     attributes (dict): dictionary of netcdf attributes. (e.g. {'year':2016, 'creator': 'Robbie Mallett'}
@@ -22,14 +24,314 @@ def dict_to_nc(input_dict,
 
     """
 
+    ds = _dict_to_dataset(input_dict, variable_name, attributes)
+
+    with instrument.stage('netcdf_write', ds[variable_name].nbytes):
+        ds.to_netcdf(f'{output_file_destination}', 'w')
+
+    return(0)
+
+
+class NetCDFWriter:
+
+    """ Writes a netcdf file one time slice at a time.
+
+    The file is created once with an unlimited time dimension and the lon/lat grid, and time slices are then appended
+    as they become available, so memory use stays constant however long the archive is. Can be used as a context
+    manager, e.g.
+
+        with NetCDFWriter('tb.nc', 'Brightness Temperature', lon, lat) as writer:
+            for time, data in read_file.iter_SSMI_Tb(file_locations, 'n', 37):
+                writer.append(data, time)
+
+    Args:
+        output_file_destination (str): destination of the file and filename (e.g. ~/robbie/my_netcdf.nc)
+        variable_name (str): name for the netcdf variable (e.g. 'Brightness Temperature' or 'Sea Ice Thickness').
+        lon (numpy.array): 2D array of longitudes, written once.
+        lat (numpy.array): 2D array of latitudes, written once.
+        dtype (str): netcdf data type of the variable. Defaults to 'f4'.
+        chunk_time (int): number of time slices per chunk. The other dimensions are not chunked.
+        zlib (bool): compress the variable with zlib. Default True.
+        complevel (int): zlib compression level, 1-9.
+        shuffle (bool): apply the HDF5 shuffle filter before compressing. Default True.
+        fill_value (float): optional, fill value of the variable.
+        attributes (dict): dictionary of netcdf attributes. (e.g. {'year':2016, 'creator': 'Robbie Mallett'}
+        mode (str): 'w' to create the file, or 'a' to append to a file made by a previous NetCDFWriter.
+
+    """
+
+    time_units = 'days since 1970-01-01 00:00:00'
+
+    def __init__(self,
+                 output_file_destination,
+                 variable_name,
+                 lon,
+                 lat,
+                 dtype='f4',
+                 chunk_time=1,
+                 zlib=True,
+                 complevel=4,
+                 shuffle=True,
+                 fill_value=None,
+                 attributes=None,
+                 mode='w'):
+
+        from netCDF4 import Dataset
+
+        self.variable_name = variable_name
+
+        self.dataset = Dataset(output_file_destination, mode)
+
+        if mode == 'a':
+            self.variable = self.dataset[variable_name]
+            self.time = self.dataset['time']
+            return
+
+        shape = np.shape(lon)
+
+        self.dataset.createDimension('time', None)
+        self.dataset.createDimension('x', shape[0])
+        self.dataset.createDimension('y', shape[1])
+
+        self.time = self.dataset.createVariable('time', 'f8', ('time',))
+        self.time.units = self.time_units
+        self.time.calendar = 'standard'
+
+        for name, values in [('lon', lon), ('lat', lat)]:
+            coord = self.dataset.createVariable(name, 'f8', ('x', 'y'), zlib=zlib, complevel=complevel,
+                                                shuffle=shuffle)
+            coord[:] = values
+
+        self.variable = self.dataset.createVariable(variable_name, dtype, ('time', 'x', 'y'),
+                                                    zlib=zlib,
+                                                    complevel=complevel,
+                                                    shuffle=shuffle,
+                                                    chunksizes=(chunk_time, shape[0], shape[1]),
+                                                    fill_value=fill_value)
+        self.variable.coordinates = 'lon lat'
+
+        if attributes:
+            for attribute in list(attributes.keys()):
+                self.dataset.setncattr(attribute, attributes[attribute])
+
+    def append(self, data, time):
+
+        """ Appends one 2D time slice, or a 3D block of them, to the file.
+
+        Args:
+            data (numpy.array): 2D array matching the lon/lat grid, or 3D array with time as the first dimension.
+            time: a datetime, numpy.datetime64 or date string (or a sequence of them for 3D data).
+
+        Returns:
+            the number of time slices now in the file.
+        """
+
+        data = np.asarray(data)
+
+        if data.ndim == 2:
+            data, time = data[np.newaxis], [time]
+
+        times = np.array([np.datetime64(t) for t in np.atleast_1d(time)])
+
+        if len(times) != data.shape[0]:
+            raise ValueError('time must have one entry per time slice of data.')
+
+        start = len(self.time)
+
+        with instrument.stage('netcdf_write', data.nbytes):
+            self.variable[start:start + data.shape[0]] = data
+
+        self.time[start:start + data.shape[0]] = ((times - np.datetime64('1970-01-01T00:00:00'))
+                                                   / np.timedelta64(1, 'D'))
+
+        return(start + data.shape[0])
+
+    def close(self):
+
+        """ Closes the file. """
+
+        self.dataset.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def dict_to_zarr(input_dict,
+                 store,
+                 variable_name,
+                 chunks=None,
+                 compression='zstd',
+                 clevel=5,
+                 shuffle=True,
+                 append=False,
+                 attributes=None):
+    """ Takes a dict with 'data', 'lon', 'lat' keys and writes it to a Zarr store on local disk.
+
+    The chunked store gives fast random access by time and region. Needs the optional zarr package.
+
+    Args:
+    input_dict (dict): 'data', 'lon', 'lat' keys (and optionally 'time'), as for dict_to_nc.
+    store (str): location of the Zarr store (a directory, e.g. ~/robbie/tb.zarr).
+    variable_name (str): name for the variable (e.g. 'Brightness Temperature' or 'Sea Ice Thickness').
+    chunks (tuple): chunk shape of the variable, e.g. (1, 448, 304) for one chunk per day, or (1, 112, 152) for spatial
+    tiles. Defaults to one chunk per time slice.
+    compression (str): Blosc compressor, e.g. 'zstd' (default), 'lz4' or 'zlib'. None for no compression.
+    clevel (int): compression level, 1-9.
+    shuffle (bool): apply Blosc byte shuffling before compressing. Default True.
+    append (bool): if True, append the (3D) data along the time dimension of an existing store.
+    attributes (dict): dictionary of attributes. (e.g. {'year':2016, 'creator': 'Robbie Mallett'}
+
+    Returns:
+        0 if all runs successfully.
+
+    """
+
+    ds = _dict_to_dataset(input_dict, variable_name, attributes)
+
+    with instrument.stage('zarr_write', ds[variable_name].nbytes):
+
+        if append:
+            ds.drop_vars(['lon', 'lat']).to_zarr(store, append_dim='t')
+
+        else:
+            encoding = {variable_name: _zarr_encoding(ds[variable_name].shape, chunks, compression, clevel, shuffle)}
+
+            ds.to_zarr(store, mode='w', encoding=encoding)
+
+    return(0)
+
+
+def create_zarr(store,
+                variable_name,
+                lon,
+                lat,
+                time,
+                dtype='f4',
+                chunks=None,
+                compression='zstd',
+                clevel=5,
+                shuffle=True,
+                attributes=None):
+    """ Creates an empty Zarr store for a (time, x, y) variable, to be filled in by write_zarr_region.
+
+    Only the metadata and the lon/lat/time coordinates are written, so several workers can then fill in disjoint
+    regions of the variable concurrently. Needs the optional zarr and dask packages.
+
+    Args:
+    store (str): location of the Zarr store (a directory).
+    variable_name (str): name for the variable.
+    lon (numpy.array): 2D array of longitudes.
+    lat (numpy.array): 2D array of latitudes.
+    time (numpy.array): 1D array of datetimes, one per time slice.
+    dtype (str): dtype of the variable. Defaults to 'f4'.
+    chunks, compression, clevel, shuffle: as for dict_to_zarr.
+    attributes (dict): dictionary of attributes.
+
+    Returns:
+        0 if all runs successfully.
+
+    """
+
+    import dask.array
+
+    shape = (len(time),) + np.shape(lon)
+
+    chunks = chunks or (1,) + np.shape(lon)
+
+    input_dict = {'data': dask.array.full(shape, np.nan, dtype=dtype, chunks=chunks),
+                  'lon': lon,
+                  'lat': lat,
+                  'time': time}
+
+    ds = _dict_to_dataset(input_dict, variable_name, attributes)
+
+    encoding = {variable_name: _zarr_encoding(shape, chunks, compression, clevel, shuffle)}
+
+    ds.to_zarr(store, mode='w', encoding=encoding, compute=False)
+
+    return(0)
+
+
+def write_zarr_region(store, variable_name, data, time_start=0, x_start=0, y_start=0):
+    """ Writes a block of data into a store made by create_zarr.
+
+    Blocks written by different threads or processes must not share chunks, i.e. they must start and end on chunk
+    boundaries (e.g. whole days when there is one chunk per day).
+
+    Args:
+    store (str): location of the Zarr store.
+    variable_name (str): name of the variable.
+    data (numpy.array): 3D (time, x, y) block of data, or a single 2D time slice.
+    time_start (int): index along the time dimension at which the block starts.
+    x_start (int): index along the x dimension at which the block starts.
+    y_start (int): index along the y dimension at which the block starts.
+
+    Returns:
+        0 if all runs successfully.
+
+    """
+
+    data = np.asarray(data)
+
+    if data.ndim == 2:
+        data = data[np.newaxis]
+
+    region = {'t': slice(time_start, time_start + data.shape[0]),
+              'x': slice(x_start, x_start + data.shape[1]),
+              'y': slice(y_start, y_start + data.shape[2])}
+
+    import xarray as xr
+
+    with instrument.stage('zarr_write', data.nbytes):
+        xr.Dataset({variable_name: (['t', 'x', 'y'], data)}).to_zarr(store, region=region)
+
+    return(0)
+
+
+def _zarr_encoding(shape, chunks, compression, clevel, shuffle):
+
+    import zarr
+
+    chunks = chunks or (1,) * (len(shape) - 2) + tuple(shape[-2:])
+
+    encoding = {'chunks': tuple(chunks)}
+
+    if int(zarr.__version__.split('.')[0]) >= 3:
+
+        from zarr.codecs import BloscCodec
+
+        encoding['compressors'] = (BloscCodec(cname=compression, clevel=clevel,
+                                              shuffle='shuffle' if shuffle else 'noshuffle'),) if compression else None
+
+    else:
+
+        from numcodecs import Blosc
+
+        encoding['compressor'] = Blosc(cname=compression, clevel=clevel,
+                                       shuffle=Blosc.SHUFFLE if shuffle else Blosc.NOSHUFFLE) if compression else None
+
+    return(encoding)
+
+
+def _dict_to_dataset(input_dict, variable_name, attributes=None):
+
+    import xarray as xr
+
     check_dictionary_health(input_dict)
 
     if len(input_dict['data'].shape) == 3:
 
 
         coords = {'lon': (['x', 'y'], input_dict['lon']),
-                  'lat': (['x', 'y'], input_dict['lat']),
-                  'month': (['t'], np.array(range(input_dict['data'].shape[0])))}
+                  'lat': (['x', 'y'], input_dict['lat'])}
+
+        if 'time' in input_dict:
+            coords['time'] = (['t'], np.asarray(input_dict['time']))
+        else:
+            coords['month'] = (['t'], np.array(range(input_dict['data'].shape[0])))
 
         variable = {f'{variable_name}': (['t', 'x', 'y'], input_dict['data'])}
 
@@ -47,14 +349,14 @@ def dict_to_nc(input_dict,
     ds = xr.Dataset(data_vars= variable,
                     coords=coords)
 
+    if 'attrs' in input_dict:
+        ds[variable_name].attrs.update(input_dict['attrs'])
+
     if attributes:
         for attribute in list(attributes.keys()):
             ds.attrs[attribute] = attributes[attribute]
 
-
-    ds.to_netcdf(f'{output_file_destination}', 'w')
-
-    return(0)
+    return(ds)
 
 
 def plot(lon,
@@ -94,6 +396,10 @@ def plot(lon,
         Nothing.
     """
 
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+    import cartopy.feature
+
     if figsize:
         fig = plt.subplots(1,1,figsize=figsize)
     else:
@@ -144,6 +450,281 @@ def plot(lon,
 
     return(0)
 
+class FramePlotter:
+
+    """ Renders many frames of data on the same grid, e.g. the days of an animation or a quick-look archive.
+
+    The figure, polar projection, land/ocean features, gridlines, colorbar and pcolormesh are built once, and each frame
+    only swaps the mesh's array (and colour limits) before being drawn. The figure is drawn with the Agg backend
+    whatever the pyplot backend is, so no display is needed.
+
+    Args:
+        lon, lat (numpy.array): 2D arrays of the grid's longitudes and latitudes in decimal degrees.
+        bounding_lat, land, ocean, gridlines, figsize, color_scale, color_scheme, hemisphere: as for plot.
+        dpi (float): resolution of the rendered frames.
+
+    """
+
+    def __init__(self,
+                 lon,
+                 lat,
+                 bounding_lat=65,
+                 land=True,
+                 ocean=False,
+                 gridlines=True,
+                 figsize=None,
+                 color_scale=(None, None),
+                 color_scheme='plasma',
+                 hemisphere='n',
+                 dpi=100):
+
+        import cartopy.crs as ccrs
+        import cartopy.feature
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.layout_engine import TightLayoutEngine
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+
+        if hemisphere == 's':
+            bounding_lat = -abs(bounding_lat)
+            pole = -90
+            projection = ccrs.SouthPolarStereo()
+
+        elif hemisphere == 'n':
+            pole = 90
+            projection = ccrs.NorthPolarStereo()
+
+        else:
+            raise ValueError(f"hemisphere must be 'n' or 's', not {hemisphere}.")
+
+        self.ax = self.figure.add_subplot(1, 1, 1, projection=projection)
+
+        if ocean:
+            self.ax.add_feature(cartopy.feature.OCEAN, zorder=2)
+        if land:
+            self.ax.add_feature(cartopy.feature.LAND, edgecolor='black', zorder=1)
+
+        self.ax.set_extent([-180, 180, pole, bounding_lat], ccrs.PlateCarree())
+
+        if gridlines:
+            self.ax.gridlines()
+
+        self.shape = np.shape(lat)
+        self.color_scale = color_scale
+
+        # the mesh is projected once here, rather than by cartopy every time a frame is drawn
+
+        points = projection.transform_points(ccrs.PlateCarree(), np.array(lon), np.array(lat))
+
+        self.mesh = self.ax.pcolormesh(points[..., 0], points[..., 1],
+                                       np.full((self.shape[0] - 1, self.shape[1] - 1), np.nan),
+                                       vmin=color_scale[0], vmax=color_scale[1],
+                                       transform=projection, zorder=0,
+                                       cmap=color_scheme)
+
+        self.figure.colorbar(self.mesh)
+
+        # lay the figure out once, without installing a layout engine that would re-run before every frame is saved
+
+        TightLayoutEngine().execute(self.figure)
+
+    def render(self, data, file_location=None, title=None, color_scale=None):
+
+        """ Draws one frame.
+
+        Args:
+            data (numpy.array): a 2D array of values on the grid (the same shape as lon/lat, or 1 smaller). NaNs and
+            the masked cells of a numpy masked array (e.g. from concentration with flags='mask') are left blank.
+            file_location (str): optional, where to save the frame (e.g. a .png file).
+            title (str): optional, a title for the frame.
+            color_scale (tuple): optional, (vmin, vmax) for this frame. Limits that are None (here and in the
+            constructor) are taken from the data.
+
+        Returns:
+            file_location if given, otherwise the frame as an RGBA numpy.array.
+        """
+
+        data = np.ma.masked_invalid(np.ma.asarray(data))
+
+        if data.shape == self.shape:
+            data = data[:-1, :-1]
+
+        self.mesh.set_array(data)
+
+        vmin, vmax = color_scale or self.color_scale
+
+        if (vmin is None) or (vmax is None):
+            finite = data.compressed()
+            if finite.size:
+                vmin = finite.min() if vmin is None else vmin
+                vmax = finite.max() if vmax is None else vmax
+
+        self.mesh.set_clim(vmin, vmax)
+
+        if title is not None:
+            self.ax.set_title(title)
+
+        if file_location is not None:
+            self.figure.savefig(file_location)
+            return(file_location)
+
+        self.canvas.draw()
+
+        return(np.asarray(self.canvas.buffer_rgba()).copy())
+
+    def close(self):
+
+        """ Frees the figure. """
+
+        self.figure.clear()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# number of frames of an iterable handed to a worker process at a time by plot_frames
+
+FRAMES_PER_TASK = 16
+
+
+def plot_frames(lon,
+                lat,
+                frames,
+                file_pattern='frame_{:05d}.png',
+                output=None,
+                titles=None,
+                workers=None,
+                fps=10,
+                **kwargs):
+    """ Renders a sequence of 2D arrays to an image sequence or an animation, building the figure only once.
+
+    Args:
+        lon, lat (numpy.array): 2D arrays of the grid's longitudes and latitudes in decimal degrees.
+        frames (numpy.array or iterable): a (time, y, x) array (e.g. from read_file.read_many), or an iterable of 2D
+        arrays (e.g. the data yielded by read_file.iter_files).
+        file_pattern (str): where to save the frames, formatted with the frame index, e.g. 'pngs/tb_{:05d}.png'.
+        output (str): optional, an animation (.gif, or .mp4 etc. if ffmpeg is installed) to write instead of
+        separate images.
+        titles (list): optional, one title per frame (e.g. the dates from read_many).
+        workers (int): optional, render the images in this many processes, each building the figure once per block
+        of frames. An iterable is handed out in blocks of FRAMES_PER_TASK frames as it is read, so it is never held
+        in memory whole. Not used when writing an animation, whose frames are written in order.
+        fps (float): frames per second of the animation.
+        **kwargs: passed on to FramePlotter, e.g. hemisphere='s', color_scale=(0, 250), land=False.
+
+    Returns:
+        list of the files written.
+
+    """
+
+    if output is not None:
+
+        from matplotlib import animation
+
+        if output.lower().endswith('.gif'):
+            writer = animation.PillowWriter(fps=fps)
+        else:
+            writer = animation.FFMpegWriter(fps=fps)
+
+        with FramePlotter(lon, lat, **kwargs) as plotter:
+            with writer.saving(plotter.figure, output, plotter.figure.dpi):
+                for i, data in enumerate(frames):
+                    plotter.render(data, title=None if titles is None else str(titles[i]))
+                    writer.grab_frame()
+
+        return([output])
+
+    if workers is None:
+
+        file_locations = []
+
+        with FramePlotter(lon, lat, **kwargs) as plotter:
+            for i, data in enumerate(frames):
+                file_locations.append(plotter.render(data, file_pattern.format(i),
+                                                     title=None if titles is None else str(titles[i])))
+
+        return(file_locations)
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    file_locations = []
+
+    # at most two blocks per worker are in flight, so an iterable is only read as fast as the frames are rendered
+
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        for block, data in _frame_blocks(frames, workers):
+
+            if len(pending) >= 2 * workers:
+                file_locations.extend(pending.popleft().result())
+
+            pending.append(executor.submit(_render_frames, lon, lat, data,
+                                           [file_pattern.format(i) for i in block],
+                                           None if titles is None else [str(titles[i]) for i in block],
+                                           kwargs))
+
+        while pending:
+            file_locations.extend(pending.popleft().result())
+
+    return(file_locations)
+
+
+def _frame_blocks(frames, workers):
+
+    # (frame indices, frames) of contiguous blocks, so that each worker builds its figure once per block: one block per
+    # worker for an array, and blocks of FRAMES_PER_TASK copied out of an iterable (whose arrays may be reused buffers)
+
+    if hasattr(frames, 'shape'):
+
+        for block in np.array_split(np.arange(len(frames)), workers):
+            if len(block):
+                yield(block, _unmask(frames[block[0]:block[-1] + 1]))
+
+        return
+
+    from itertools import islice
+
+    iterator = iter(frames)
+
+    start = 0
+
+    while True:
+
+        data = [_unmask(frame, copy=True) for frame in islice(iterator, FRAMES_PER_TASK)]
+
+        if not data:
+            return
+
+        yield(np.arange(start, start + len(data)), np.stack(data))
+
+        start += len(data)
+
+
+def _unmask(data, copy=False):
+
+    # masked cells as NaN, so that they stay blank in the worker processes
+
+    if np.ma.isMaskedArray(data):
+        return(np.ma.filled(data.astype(np.float64), np.nan))
+
+    return(np.array(data) if copy else np.asarray(data))
+
+
+def _render_frames(lon, lat, frames, file_locations, titles, kwargs):
+
+    with FramePlotter(lon, lat, **kwargs) as plotter:
+        return([plotter.render(data, file_location, title=None if titles is None else titles[i])
+                for i, (data, file_location) in enumerate(zip(frames, file_locations))])
+
+
 def check_dictionary_health(input_dict):
 
     if len(input_dict['data'].shape) == 3:
@@ -0,0 +1,211 @@
+import os
+import re
+import threading
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray, BackendEntrypoint
+from xarray.core import indexing
+from readice import read_file, decode
+
+# name of the variable for each reader (PIOMAS variables are named after the file, e.g. heff)
+
+_variables = {'concentration': 'concentration',
+              'SSMI_Tb': 'Tb',
+              'AMSR_E': 'Tb',
+              'piomas': None}
+
+
+def open_dataset(file_location, reader=None, chunks=None, **kwargs):
+
+    """ Opens a file read by readice as a lazily loaded xarray.Dataset.
+
+    Nothing but the lon/lat grid (which is cached, see get_geo_coords) is read until the data are accessed, and then
+    only the parts of the file that are needed. With chunks (e.g. chunks={}) the variable is a dask array.
+
+    Args:
+        file_location (str): location of the file to open.
+        reader (str): the read_file reader to use, e.g. 'SSMI_Tb', 'concentration', 'AMSR_E' or 'piomas'. If not
+        given, it (and its arguments) are guessed from NSIDC/PIOMAS file names such as tb_f17_20190711_v5_n37h.bin,
+        nt_19781111_n07_v1.1_n.bin or heff.H1993.
+        chunks (dict): optional, passed on to xarray.open_dataset to get dask arrays.
+        **kwargs: arguments for the reader other than file_location, e.g. hemisphere='n', frequency=37.
+
+    Returns:
+        xarray.Dataset with a (time, x, y) data variable and 'lon', 'lat' and 'time' coordinates.
+
+    """
+
+    return(xr.open_dataset(file_location, engine=ReadiceBackendEntrypoint, chunks=chunks, reader=reader, **kwargs))
+
+
+def open_mfdataset(file_locations, reader=None, chunks=None, parallel=False, **kwargs):
+
+    """ Opens many files read by readice as one lazily loaded, dask-chunked xarray.Dataset.
+
+    The files are concatenated along time without comparing their coordinates, so opening thousands of files only
+    costs their metadata. Each file becomes (at least) one dask chunk.
+
+    Args:
+        file_locations (list or str): locations of the files (or a glob pattern), in time order.
+        reader (str): the read_file reader to use. If not given, it is guessed from each file name (see open_dataset).
+        chunks (dict): optional, chunk sizes. Defaults to one chunk per file.
+        parallel (bool): if True, open the files in parallel with dask.delayed.
+        **kwargs: arguments for the reader other than file_location, e.g. hemisphere='n', frequency=37.
+
+    Returns:
+        xarray.Dataset
+
+    """
+
+    if reader is not None:
+        kwargs['reader'] = reader
+
+    return(xr.open_mfdataset(file_locations,
+                             engine=ReadiceBackendEntrypoint,
+                             chunks={} if chunks is None else chunks,
+                             combine='nested',
+                             concat_dim='time',
+                             data_vars='minimal',
+                             coords='minimal',
+                             compat='override',
+                             join='override',
+                             parallel=parallel,
+                             **kwargs))
+
+
+def guess_reader(file_location):
+
+    """ Guesses the reader and its arguments from an NSIDC or PIOMAS file name.
+
+    Args:
+        file_location (str): location or name of the file.
+
+    Returns:
+        reader (str), kwargs (dict): e.g. ('SSMI_Tb', {'hemisphere': 'n', 'frequency': 37}).
+
+    """
+
+    name = os.path.basename(str(file_location))
+
+    # NSIDC-0001, e.g. tb_f17_20190711_v5_n37h.bin
+
+    match = re.match(r'tb_.*_([ns])(\d+)[hv]\.bin$', name)
+    if match:
+        return('SSMI_Tb', {'hemisphere': match.group(1), 'frequency': int(match.group(2))})
+
+    # NSIDC-0051, e.g. nt_19781111_n07_v1.1_n.bin
+
+    match = re.match(r'nt_.*_([ns])\.bin$', name)
+    if match:
+        return('concentration', {'hemisphere': match.group(1)})
+
+    # PIOMAS, e.g. heff.H1993
+
+    if re.match(r'\w+\.H\d{4}$', name):
+        return('piomas', {})
+
+    raise ValueError(f'Could not guess the reader for {name}; please give reader and its arguments.')
+
+
+class ReadiceBackendArray(BackendArray):
+
+    """ Lazily indexed (time, x, y) array backed by a file read by readice. """
+
+    def __init__(self, file_location, layout, shape, dtype, fallback_reader=None, reader_kwargs=None):
+
+        self.file_location = file_location
+        self.layout = layout
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.fallback_reader = fallback_reader
+        self.reader_kwargs = reader_kwargs or {}
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+
+        return(indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC,
+                                                  self._raw_indexing_method))
+
+    def _raw_indexing_method(self, key):
+
+        if self.fallback_reader is not None:
+            with self.lock:
+                raw = np.asarray(self.fallback_reader(self.file_location, **self.reader_kwargs))
+            return(raw.reshape(self.shape)[key].astype(self.dtype))
+
+        # only the pages of the file covered by key are touched
+
+        raw = decode.memmap(self.file_location, self.layout).reshape(self.shape)[key]
+
+        return(decode.to_physical(raw, self.layout, dtype=self.dtype))
+
+
+class ReadiceBackendEntrypoint(BackendEntrypoint):
+
+    """ xarray backend for the files read by readice, e.g. xr.open_dataset('tb_f17_20190711_v5_n37h.bin',
+    engine='readice'). See open_dataset. """
+
+    description = 'Open NSIDC polar stereographic binaries and PIOMAS files with readice'
+
+    open_dataset_parameters = ('filename_or_obj', 'drop_variables', 'reader', 'hemisphere', 'frequency', 'freq', 'pol',
+                               'resolution', 'daily')
+
+    def open_dataset(self, filename_or_obj, *, drop_variables=None, reader=None, **kwargs):
+
+        file_location = str(filename_or_obj)
+
+        if reader is None:
+            reader, guessed_kwargs = guess_reader(file_location)
+            kwargs = {**guessed_kwargs, **kwargs}
+
+        reader = reader if isinstance(reader, str) else reader.__name__
+
+        if reader == 'piomas':
+            daily = kwargs.pop('daily', None)
+            layout, grid = read_file._piomas_spec(read_file._piomas_records(file_location), **kwargs)
+            fallback_reader = None
+            shape = layout.shape
+            time = read_file._piomas_times(file_location, shape[0], daily)
+
+        elif reader in read_file._daily_readers:
+            spec, fallback_reader = read_file._daily_readers[reader]
+            layout, grid = spec(**kwargs)
+            shape = (1,) + layout.shape
+            time = np.array([read_file.parse_date(file_location)])
+
+        else:
+            raise ValueError(f'Unknown reader {reader}.')
+
+        variable_name = _variables[reader]
+
+        attributes = read_file._attributes(reader, layout)
+
+        if variable_name is None:
+            variable_name = os.path.basename(file_location).split('.')[0]
+
+        backend_array = ReadiceBackendArray(file_location, layout, shape, np.float64,
+                                            fallback_reader=fallback_reader,
+                                            reader_kwargs=kwargs)
+
+        data = indexing.LazilyIndexedArray(backend_array)
+
+        geo_coords = read_file._grid_coords(*grid)
+
+        ds = xr.Dataset({variable_name: xr.Variable(('time', 'x', 'y'), data, attrs=attributes)},
+                        coords={'time': ('time', time.astype('datetime64[ns]')),
+                                'lon': (('x', 'y'), np.asarray(geo_coords['lon'])),
+                                'lat': (('x', 'y'), np.asarray(geo_coords['lat']))})
+
+        if drop_variables:
+            ds = ds.drop_vars(drop_variables)
+
+        return(ds)
+
+    def guess_can_open(self, filename_or_obj):
+
+        try:
+            guess_reader(filename_or_obj)
+        except (ValueError, TypeError):
+            return(False)
+
+        return(True)
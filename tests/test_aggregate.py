@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+from readice.read_file import concentration, piomas
+from readice.get_geo_coords import cell_area, region_mask
+from readice.aggregate import concentration_totals, piomas_volume
+
+class TestAggregate(unittest.TestCase):
+
+    """This class tests the area-weighted totals."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_concentration_totals(self):
+
+        data = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n')
+
+        area = cell_area('ps', 25, 'n')
+
+        totals = concentration_totals(data, area)
+
+        # a November Arctic extent, in square km
+
+        self.assertGreater(totals['extent'], 8e6)
+        self.assertLess(totals['extent'], 13e6)
+        self.assertLess(totals['area'], totals['extent'])
+
+        fraction = np.where(data <= 250, data / 250, 0)
+        self.assertAlmostEqual(totals['area'], np.sum(fraction * area), delta=1)
+        self.assertAlmostEqual(totals['extent'], np.sum(area[fraction >= 0.15]), delta=1)
+
+        # a cube of time steps and a dictionary of regions
+
+        cube = np.stack([data, data])
+
+        masks = {'all': np.ones(area.shape, dtype=bool), 'beaufort': region_mask('ps', 25, 'n', 'beaufort')}
+
+        regional = concentration_totals(cube, area, masks=masks)
+
+        self.assertEqual(regional['extent']['all'].shape, (2,))
+        self.assertAlmostEqual(regional['extent']['all'][1], totals['extent'], delta=1)
+        self.assertLess(regional['extent']['beaufort'][0], totals['extent'])
+
+    def test_piomas_volume(self):
+
+        data = piomas('tests/test_files/heff.H1993')
+
+        volume = piomas_volume(data, cell_area('piomas', None, 'n'))
+
+        # PIOMAS Arctic volume is around 28,000 km^3 in April and 12,000 km^3 in September
+
+        self.assertEqual(volume.shape, (12,))
+        self.assertGreater(volume[3], 20000)
+        self.assertLess(volume[3], 35000)
+        self.assertLess(volume[8], volume[3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+from readice import cache
+from readice.read_file import read_many, iter_files
+
+class TestCache(unittest.TestCase):
+
+    """This class tests the on-disk cache of decoded arrays."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir, cache.CACHE_DIR = cache.CACHE_DIR, os.path.join(self.tmp_dir.name, 'cache')
+        self.max_bytes = cache.MAX_CACHE_BYTES
+
+    def tearDown(self):
+        cache.CACHE_DIR, cache.MAX_CACHE_BYTES = self.cache_dir, self.max_bytes
+        cache._cache_bytes = None
+        self.tmp_dir.cleanup()
+
+    def test_read(self):
+
+        with open('tests/test_results/SSMI_37_GHz_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        file_location = 'tests/test_files/tb_f17_20190711_v5_n37h.bin'
+
+        first = cache.read(file_location, 'SSMI_Tb', hemisphere='n', frequency=37)
+        second = cache.read(file_location, 'SSMI_Tb', hemisphere='n', frequency=37)
+
+        self.assertIsInstance(second, np.memmap)
+        self.assertEqual(second.dtype, np.float32)
+        self.assertTrue(np.allclose(second, array_for_comparison))
+        self.assertEqual(cache.cache_info()['entries'], 1)
+
+        # other arguments, or a changed file, are new entries
+
+        packed = cache.read(file_location, 'SSMI_Tb', hemisphere='n', frequency=37, raw=True)
+        self.assertEqual(packed.dtype, np.int16)
+
+        copy = os.path.join(self.tmp_dir.name, 'tb_f17_20190711_v5_n37h.bin')
+        shutil.copyfile(file_location, copy)
+
+        cache.read(copy, 'SSMI_Tb', hemisphere='n', frequency=37)
+        self.assertEqual(cache.cache_info()['entries'], 3)
+
+        # keyed by content, the copy shares an entry with the original
+
+        cache.read(file_location, 'SSMI_Tb', content_hash=True, hemisphere='n', frequency=37)
+        cache.read(copy, 'SSMI_Tb', content_hash=True, hemisphere='n', frequency=37)
+        self.assertEqual(cache.cache_info()['entries'], 4)
+
+        self.assertGreater(cache.clear_cache(), 0)
+        self.assertEqual(cache.cache_info()['entries'], 0)
+
+    def test_eviction(self):
+
+        file_location = 'tests/test_files/nt_19781111_n07_v1.1_n.bin'
+
+        cache.read(file_location, 'concentration', hemisphere='n')
+
+        # make the float32 entry the least recently used
+
+        for path, size, used in cache._entries():
+            os.utime(path, (used - 100, used - 100))
+
+        cache.read(file_location, 'concentration', hemisphere='n', dtype=np.float64)
+
+        float64_bytes = cache.cache_info()['bytes'] * 2 // 3
+
+        # room for the float64 and raw entries, but not the float32 one as well
+
+        cache.MAX_CACHE_BYTES = float64_bytes + float64_bytes // 8 + 1000
+        cache.read(file_location, 'concentration', hemisphere='n', raw=True)
+
+        self.assertLessEqual(cache.cache_info()['bytes'], cache.MAX_CACHE_BYTES)
+        self.assertEqual(cache.cache_info()['entries'], 2)
+        self.assertEqual(sorted(np.load(path, mmap_mode='r').dtype for path, size, used in cache._entries()),
+                         sorted([np.dtype(np.uint8), np.dtype(np.float64)]))
+
+        # an entry larger than the whole cache is evicted as soon as it is written, and the decoded array is returned
+
+        cache.MAX_CACHE_BYTES = 1000
+        data = cache.read(file_location, 'concentration', hemisphere='n', dtype=np.float32)
+
+        self.assertEqual(data.dtype, np.float32)
+        self.assertEqual(cache.cache_info()['entries'], 0)
+
+    def test_batch(self):
+
+        file_locations = ['tests/test_files/tb_f17_20190711_v5_n37h.bin'] * 3
+
+        expected = read_many(file_locations, 'SSMI_Tb', hemisphere='n', frequency=37)['data']
+
+        for workers in [None, 2]:
+            cube = read_many(file_locations, 'SSMI_Tb', cache=True, workers=workers, hemisphere='n', frequency=37)
+            self.assertTrue(np.array_equal(cube['data'], expected))
+
+        steps = list(iter_files(file_locations, 'SSMI_Tb', cache=True, dtype=np.float32, hemisphere='n', frequency=37))
+
+        self.assertTrue(np.allclose(steps[2][1], expected[2]))
+        self.assertEqual(cache.cache_info()['entries'], 2)
+
+        # entries are keyed by file location, so open files are rejected
+
+        with open(file_locations[0], 'rb') as f:
+
+            with self.assertRaises(ValueError):
+                cache.read(f, 'SSMI_Tb', hemisphere='n', frequency=37)
+
+            with self.assertRaises(ValueError):
+                read_many([f], 'SSMI_Tb', cache=True, hemisphere='n', frequency=37)
+
+    def test_cli(self):
+
+        cache.read('tests/test_files/heff.H1993', 'piomas')
+
+        self.assertEqual(cache.main(['info']), 0)
+        self.assertEqual(cache.main(['clear']), 0)
+        self.assertEqual(cache.cache_info()['entries'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
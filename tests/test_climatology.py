@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from readice.read_file import concentration, piomas
+from readice.climatology import Climatology, climatology, climatology_files
+
+class TestClimatology(unittest.TestCase):
+
+    """This class tests the running climatologies and anomalies."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_bins(self):
+
+        times = np.array(['2019-01-31', '2019-02-28', '2019-03-01', '2020-02-29', '2020-03-01', '2019-12-31'],
+                         dtype='datetime64[D]')
+
+        np.testing.assert_array_equal(Climatology((1,), 'month').bin_index(times), [0, 1, 2, 1, 2, 11])
+        np.testing.assert_array_equal(Climatology((1,), 'season').bin_index(times), [0, 0, 1, 0, 1, 0])
+
+        # 1 March is the same day of year in leap and other years
+
+        np.testing.assert_array_equal(Climatology((1,), 'dayofyear').bin_index(times), [30, 58, 60, 59, 60, 365])
+
+    def test_cube_and_stream(self):
+
+        rng = np.random.default_rng(0)
+
+        times = np.arange('2000-01-01', '2002-01-01', dtype='datetime64[D]')
+
+        cube = rng.normal(size=(times.size, 3, 4))
+        cube[::7, 0, 0] = np.nan
+
+        total = climatology(cube, times)
+
+        self.assertEqual(total.mean().shape, (12, 3, 4))
+
+        months = times.astype('datetime64[M]').astype(int) % 12
+
+        for month in range(12):
+            np.testing.assert_allclose(total.mean()[month], np.nanmean(cube[months == month], axis=0))
+            np.testing.assert_allclose(total.std()[month], np.nanstd(cube[months == month], axis=0), atol=1e-12)
+
+        self.assertEqual(total.counts[0, 1, 1], 62)
+        self.assertLess(total.counts[0, 0, 0], 62)
+
+        # streaming one step at a time, split over two partial accumulators
+
+        first = Climatology((3, 4)).update(zip(times[:300], cube[:300]))
+        second = Climatology((3, 4)).update(zip(times[300:], cube[300:]))
+
+        np.testing.assert_allclose(first.merge(second).mean(), total.mean())
+        np.testing.assert_array_equal(first.counts, total.counts)
+
+        anomaly = total.anomaly(cube, times)
+
+        np.testing.assert_allclose(anomaly[40], cube[40] - total.mean()[1])
+        np.testing.assert_allclose(total.anomaly(cube[40], times[40]), anomaly[40])
+
+        with self.assertRaises(ValueError):
+            first.merge(Climatology((3, 4), 'season'))
+
+    def test_flags(self):
+
+        data = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', raw=True)
+
+        total = climatology(np.stack([data, data]), np.array(['1978-11-11', '1978-11-12'], dtype='datetime64[D]'),
+                            values='concentration')
+
+        november = total.mean()[10]
+
+        # flagged cells are left out rather than averaged as concentrations above 100 %
+
+        self.assertTrue(np.all(np.isnan(november[data > 250])))
+        np.testing.assert_allclose(november[data <= 250], data[data <= 250] / 250)
+        self.assertTrue(np.all(total.counts[10][data > 250] == 0))
+
+        tb = np.array([[0, 2500], [2600, 0]], dtype=np.float64)
+
+        total = climatology(tb[np.newaxis], np.array(['2019-07-11'], dtype='datetime64[D]'), values='tb')
+
+        np.testing.assert_array_equal(total.counts[6], [[0, 1], [1, 0]])
+
+    def test_files(self):
+
+        # two copies of the daily file under different dates, read in one process and in two workers
+
+        file_locations = []
+
+        for date in ['19781111', '19781201']:
+            file_location = os.path.join(self.tmp_dir, f'nt_{date}_n07_v1.1_n.bin')
+            shutil.copy('tests/test_files/nt_19781111_n07_v1.1_n.bin', file_location)
+            file_locations.append(file_location)
+
+        total = climatology_files(file_locations, 'concentration', bins='season', hemisphere='n')
+
+        self.assertEqual(total.values, 'concentration')
+        np.testing.assert_array_equal(total.counts.max(axis=(1, 2)), [1, 0, 0, 1])
+
+        parallel = climatology_files(file_locations, 'concentration', bins='season', workers=2, hemisphere='n')
+
+        np.testing.assert_array_equal(parallel.counts, total.counts)
+        np.testing.assert_allclose(parallel.sums, total.sums)
+
+        # the monthly records of a PIOMAS year give its anomaly from a one year climatology as zero
+
+        total = climatology_files(['tests/test_files/heff.H1993'], 'piomas')
+
+        data = piomas('tests/test_files/heff.H1993')
+
+        self.assertEqual(total.mean().shape, (12,) + data.shape[1:])
+        np.testing.assert_allclose(total.anomaly(data, np.arange('1993-01', '1994-01', dtype='datetime64[M]')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import io
+import unittest
+import numpy as np
+from readice import decode
+
+class TestDecode(unittest.TestCase):
+
+    """This class tests the shared binary decoding layer."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_read_payload(self):
+
+        values = np.arange(-6, 6, dtype='<i2').reshape(3, 4)
+
+        layout = decode.layout(header=0, dtype='<i2', shape=(3, 4), divisor=10)
+
+        raw = decode.read_payload(io.BytesIO(values.tobytes()), layout)
+
+        self.assertEqual(raw.dtype, np.dtype('<i2'))
+        self.assertTrue(np.array_equal(raw, values))
+        self.assertTrue(np.array_equal(decode.to_physical(raw, layout), values.astype(float) / 10))
+
+    def test_header(self):
+
+        layout = decode.layout(header=5, dtype='u1', shape=(2, 2))
+
+        fin = io.BytesIO(b'hello' + bytes([1, 2, 3, 4]))
+
+        self.assertEqual(decode.read_header(fin, layout), 'hello')
+        self.assertTrue(np.array_equal(decode.read_payload(fin, layout), [[1, 2], [3, 4]]))
+
+    def test_truncated(self):
+
+        layout = decode.layout(header=0, dtype='<f4', shape=(10,))
+
+        with self.assertRaises(ValueError):
+            decode.read_payload(io.BytesIO(b'\x00' * 8), layout)
+
+    def test_compressed(self):
+
+        import bz2
+        import gzip
+        import lzma
+
+        values = np.arange(12, dtype='<i2').reshape(3, 4)
+
+        layout = decode.layout(header=0, dtype='<i2', shape=(3, 4))
+
+        for name, module in [('gzip', gzip), ('bz2', bz2), ('lzma', lzma)]:
+
+            fin = io.BytesIO(module.compress(values.tobytes()))
+
+            self.assertEqual(decode.compression(fin), name)
+            self.assertEqual(fin.tell(), 0)
+
+            header, raw = decode.read_binary(fin, layout)
+
+            self.assertTrue(np.array_equal(raw, values))
+
+        fin = io.BytesIO(values.tobytes())
+
+        self.assertIsNone(decode.compression(fin))
+        self.assertEqual(decode.data_size(fin), values.nbytes)
+        self.assertIsNone(decode.data_size(io.BytesIO(gzip.compress(values.tobytes()))))
+
+        # a file object passed in is left open
+
+        with decode.open_file(fin) as f:
+            self.assertIs(f, fin)
+
+        self.assertFalse(fin.closed)
+
+        # small chunks still fill the whole array
+
+        chunk, decode.READ_CHUNK = decode.READ_CHUNK, 5
+
+        try:
+            raw = decode.read_payload(gzip.GzipFile(fileobj=io.BytesIO(gzip.compress(values.tobytes()))), layout)
+        finally:
+            decode.READ_CHUNK = chunk
+
+        self.assertTrue(np.array_equal(raw, values))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+import pickle
+import numpy as np
+from readice import flags
+from readice.read_file import concentration, SSMI_Tb, read_many, iter_files
+
+class TestFlags(unittest.TestCase):
+
+    """This class tests the handling of NSIDC flag values."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_concentration_fraction(self):
+
+        with open('tests/test_results/concentration_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        packed = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', raw=True)
+
+        fraction = flags.concentration_fraction(packed)
+        fraction_from_floats = flags.concentration_fraction(array_for_comparison)
+
+        self.assertEqual(fraction.dtype, np.float32)
+        self.assertTrue(np.array_equal(fraction, fraction_from_floats, equal_nan=True))
+        self.assertTrue(np.array_equal(np.isnan(fraction), array_for_comparison > 250))
+        self.assertEqual(np.nanmax(fraction), 1)
+
+        read_as_fraction = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', fraction=True)
+
+        self.assertTrue(np.allclose(read_as_fraction, fraction, equal_nan=True))
+
+        # a whole cube at once
+
+        cube = flags.concentration_fraction(np.stack([packed, packed]))
+        self.assertEqual(cube.shape, (2, 448, 304))
+
+    def test_flag_masks(self):
+
+        with open('tests/test_results/concentration_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        masks = flags.flag_masks(array_for_comparison)
+
+        for value, name in flags.CONCENTRATION_FLAGS.items():
+            self.assertTrue(np.array_equal(masks[name], array_for_comparison == value))
+
+        self.assertTrue(masks['pole_hole'].any())
+        self.assertTrue(np.array_equal(flags.flag_mask(array_for_comparison, ('land', 'coast')),
+                                       masks['land'] | masks['coast']))
+
+        masked = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', flags='mask')
+
+        self.assertIsInstance(masked, np.ma.MaskedArray)
+        self.assertTrue(np.array_equal(masked.mask, array_for_comparison > 250))
+
+        # the packed values can't be converted or masked
+
+        for options in [{'fraction': True, 'raw': True}, {'flags': 'nan', 'mmap': True}]:
+            with self.assertRaises(ValueError):
+                concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', **options)
+
+        with self.assertRaises(ValueError):
+            SSMI_Tb('tests/test_files/tb_f17_20190711_v5_n37h.bin', 'n', 37, flags='nan', raw=True)
+
+    def test_batch(self):
+
+        file_locations = ['tests/test_files/nt_19781111_n07_v1.1_n.bin'] * 2
+
+        expected = concentration(file_locations[0], 'n', fraction=True)
+
+        for workers in [None, 2]:
+            cube = read_many(file_locations, 'concentration', hemisphere='n', fraction=True, workers=workers)
+            self.assertTrue(np.array_equal(cube['data'][1], expected, equal_nan=True))
+            self.assertEqual(cube['attrs']['units'], '1')
+
+        cube = read_many(file_locations, 'concentration', hemisphere='n', flags='mask')
+
+        self.assertIsInstance(cube['data'], np.ma.MaskedArray)
+        self.assertTrue(np.array_equal(cube['data'].mask[0], np.isnan(expected)))
+
+        tb_file = 'tests/test_files/tb_f17_20190711_v5_n37h.bin'
+
+        steps = list(iter_files([tb_file], 'SSMI_Tb', hemisphere='n', frequency=37, flags='nan'))
+
+        self.assertTrue(np.array_equal(steps[0][1], SSMI_Tb(tb_file, 'n', 37, flags='nan'), equal_nan=True))
+
+        for reader, options in [('concentration', {'hemisphere': 'n', 'fraction': True, 'raw': True}),
+                                ('SSMI_Tb', {'hemisphere': 'n', 'frequency': 37, 'fraction': True})]:
+            with self.assertRaises(ValueError):
+                read_many([tb_file], reader, **options)
+
+    def test_tb_missing(self):
+
+        with open('tests/test_results/SSMI_37_GHz_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        data = SSMI_Tb('tests/test_files/tb_f17_20190711_v5_n37h.bin', 'n', 37, flags='nan')
+
+        missing = array_for_comparison == 0
+
+        self.assertTrue(missing.any())
+        self.assertTrue(np.array_equal(np.isnan(data), missing))
+        self.assertTrue(np.array_equal(data[~missing], array_for_comparison[~missing]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
+import os
+import tempfile
 import unittest
-from readice.get_geo_coords import get_dims, piomas_grid, polar_stereo
+import numpy as np
+from readice import get_geo_coords
+from readice.get_geo_coords import get_dims, piomas_grid, polar_stereo, clear_cache, evict, cached_grids
 
 class TestTools(unittest.TestCase):
 
@@ -47,6 +51,115 @@ class TestTools(unittest.TestCase):
                          pio_coords_n['lat'].shape)
         self.assertTrue((pio_coords_n['lat'] > 0).all())
 
+    def test_analytic(self):
+
+        for resolution, hemisphere in [(25, 'n'), (25, 's'), (12.5, 'n'), (12.5, 's')]:
+
+            analytic = get_geo_coords.polar_stereo_analytic(resolution=resolution, hemisphere=hemisphere)
+            from_file = polar_stereo(resolution=resolution, hemisphere=hemisphere)
+
+            lon_difference = (analytic['lon'] - from_file['lon'] + 180) % 360 - 180
+
+            self.assertLess(np.abs(lon_difference).max(), 1e-5)
+            self.assertLess(np.abs(analytic['lat'] - from_file['lat']).max(), 1e-5)
+
+        area = get_geo_coords._load_grid_file('psn25area_v3.dat')
+        analytic = get_geo_coords.polar_stereo_analytic(resolution=25, hemisphere='n')
+        self.assertTrue(np.allclose(analytic['area'], area, rtol=1e-4))
+
+        ps6_coords_s = polar_stereo(resolution=6.25, hemisphere='s')
+        self.assertEqual(ps6_coords_s['lat'].shape, (1328, 1264))
+        self.assertTrue((ps6_coords_s['lat'] < 0).all())
+
+    def test_ease2(self):
+
+        grid = get_geo_coords.ease2_grid(resolution=25, hemisphere='s')
+        self.assertEqual(grid['lon'].shape, (720, 720))
+        self.assertAlmostEqual(grid['lat'][359:361, 359:361].min(), -89.84, places=2)
+
+        x, y = get_geo_coords.ease2_forward(grid['lon'], grid['lat'], 's')
+        self.assertAlmostEqual(x[0, 0], -8987500, places=2)
+        self.assertAlmostEqual(y[0, 0], 8987500, places=2)
+
+    def test_cell_area(self):
+
+        # the shipped area files and the analytic grid agree
+        shipped = get_geo_coords.cell_area('ps', 25, 'n')
+        analytic = get_geo_coords.polar_stereo_analytic(25, 'n')['area']
+        self.assertLess(np.abs(shipped / analytic - 1).max(), 1e-3)
+
+        # PIOMAS covers the Arctic north of about 49 N, roughly 63 million square km
+        piomas_area = get_geo_coords.cell_area('piomas', None, 'n')
+        self.assertEqual(piomas_area.shape, (360, 120))
+        self.assertAlmostEqual(piomas_area.sum() / 1e6, 63, delta=2)
+
+        mask = get_geo_coords.region_mask('ps', 25, 'n', 'beaufort')
+        self.assertEqual(mask.shape, (448, 304))
+        self.assertTrue(mask.any())
+
+    def test_region_longitudes(self):
+
+        grids = polar_stereo(resolution=25, hemisphere='n')
+
+        north = np.asarray(grids['lat']) >= 60
+
+        # boxes spanning the whole circle keep every longitude
+
+        for box in [(60, 90, -180, 180), (60, 90, 0, 360)]:
+            self.assertTrue(np.array_equal(get_geo_coords.region_mask('ps', 25, 'n', box), north))
+
+        self.assertEqual(get_geo_coords.region_window('ps', 25, 'n', (60, 90, -180, 180)),
+                         get_geo_coords.region_window('ps', 25, 'n', (60, 90, 0, 360)))
+
+        # a box crossing the antimeridian
+
+        lon = np.asarray(grids['lon'])
+        lon = (lon + 180) % 360 - 180
+
+        expected = north & ((lon >= 170) | (lon <= -170))
+
+        self.assertTrue(np.array_equal(get_geo_coords.region_mask('ps', 25, 'n', (60, 90, 170, -170)), expected))
+        self.assertTrue(np.array_equal(get_geo_coords.region_mask('ps', 25, 'n', (60, 90, 170, 190)), expected))
+
+    def test_grid_cache(self):
+
+        clear_cache()
+
+        first = polar_stereo(resolution=25, hemisphere='n')
+        second = polar_stereo(resolution=25, hemisphere='n')
+
+        self.assertIs(first['lon'], second['lon'])
+        self.assertFalse(first['lon'].flags['WRITEABLE'])
+        self.assertEqual(cached_grids(), [('ps', 25, 'n')])
+
+        self.assertTrue(evict('ps', 25, 'n'))
+        self.assertFalse(evict('ps', 25, 'n'))
+        self.assertIsNot(polar_stereo(resolution=25, hemisphere='n')['lon'], first['lon'])
+
+        clear_cache()
+        self.assertEqual(cached_grids(), [])
+
+    def test_grid_store(self):
+
+        store_dir = get_geo_coords.GRID_STORE_DIR
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            get_geo_coords.GRID_STORE_DIR = tmp_dir
+
+            try:
+                lon = get_geo_coords._load_grid_file('pio_longrid.dat')
+                self.assertTrue(os.path.exists(os.path.join(tmp_dir, 'pio_longrid.npy')))
+                self.assertIsInstance(lon, np.memmap)
+                self.assertEqual(lon.shape, (360, 120))
+
+                # a store file older than its source is regenerated
+                os.utime(os.path.join(tmp_dir, 'pio_longrid.npy'), (0, 0))
+                self.assertIn(os.path.join(tmp_dir, 'pio_longrid.npy'), get_geo_coords.build_grid_store())
+
+            finally:
+                get_geo_coords.GRID_STORE_DIR = store_dir
+
 
 
 if __name__ == '__main__':
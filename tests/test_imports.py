@@ -0,0 +1,62 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+
+# Modules that readice should only import when a function needing them is called.
+
+HEAVY_MODULES = ['netCDF4', 'xarray', 'cartopy', 'matplotlib', 'pandas', 'scipy', 'dask', 'zarr']
+
+# Seconds that importing readice may take on top of numpy, which every reader needs anyway.
+
+IMPORT_TIME_BUDGET = 0.5
+
+SCRIPT = """
+import json, sys, time
+import numpy
+start = time.perf_counter()
+import readice.read_file, readice.get_geo_coords, readice.decode, readice.parallel, readice.tools
+import readice.aggregate, readice.sample, readice.regrid, readice.instrument, readice.flags
+import readice.climatology
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+class TestImports(unittest.TestCase):
+
+    """This class tests that importing readice stays light."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _import_readice(self):
+
+        repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        process = subprocess.run([sys.executable, '-c', SCRIPT], capture_output=True, text=True, cwd=repo_dir,
+                                 check=True)
+
+        return(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    def test_no_heavy_imports(self):
+
+        modules = self._import_readice()['modules']
+
+        imported = [name for name in HEAVY_MODULES if name in modules]
+
+        self.assertEqual(imported, [])
+
+    def test_import_time(self):
+
+        # the best of a few runs, so that a busy machine doesn't fail the test
+
+        elapsed = min(self._import_readice()['elapsed'] for i in range(3))
+
+        self.assertLess(elapsed, IMPORT_TIME_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main()
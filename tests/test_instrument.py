@@ -0,0 +1,88 @@
+import unittest
+import os
+import json
+import tempfile
+from readice import instrument, get_geo_coords
+from readice.read_file import SSMI_Tb, read_many
+from readice.tools import dict_to_nc
+
+class TestInstrument(unittest.TestCase):
+
+    """This class tests recording where the time goes in readice."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_disabled(self):
+
+        self.assertFalse(instrument.enabled())
+
+        with instrument.stage('io', 10) as stage:
+            stage.n_bytes = 20
+
+        instrument.count('grid_cache_hit')
+
+        self.assertFalse(instrument.enabled())
+
+    def test_record(self):
+
+        file_location = 'tests/test_files/tb_f17_20190711_v5_n37h.bin'
+
+        get_geo_coords.clear_cache()
+
+        with instrument.record() as stats:
+
+            self.assertTrue(instrument.enabled())
+
+            SSMI_Tb(file_location, 'n', 37, with_coords=True)
+            SSMI_Tb(file_location, 'n', 37, with_coords=True)
+
+        self.assertFalse(instrument.enabled())
+
+        results = stats.as_dict()
+
+        self.assertEqual(results['stages']['io']['calls'], 2)
+        self.assertEqual(results['stages']['io']['bytes'], 2 * os.path.getsize(file_location))
+        self.assertEqual(results['stages']['decode']['calls'], 2)
+        self.assertEqual(results['counters']['grid_cache_miss'], 1)
+        self.assertEqual(results['counters']['grid_cache_hit'], 1)
+        self.assertGreater(results['counters']['allocated_bytes'], 0)
+
+        # nothing is recorded once the block has ended
+
+        SSMI_Tb(file_location, 'n', 37)
+        self.assertEqual(stats.as_dict()['stages']['io']['calls'], 2)
+
+    def test_batch(self):
+
+        file_locations = ['tests/test_files/tb_f17_20190711_v5_n37h.bin'] * 4
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            with instrument.record() as stats:
+
+                with instrument.record() as inner:
+                    information = read_many(file_locations, 'SSMI_Tb', workers=2, hemisphere='n', frequency=37)
+
+                dict_to_nc(information, os.path.join(tmp_dir, 'out.nc'), 'Tb')
+
+            json_file = os.path.join(tmp_dir, 'stats.json')
+            stats.to_json(json_file)
+
+            with open(json_file) as fin:
+                results = json.load(fin)
+
+        # the worker threads report into the batch, and the nested recorder into the enclosing one
+
+        self.assertEqual(inner.as_dict()['stages']['io']['calls'], 4)
+        self.assertEqual(results['stages']['io']['calls'], 4)
+        self.assertEqual(results['stages']['netcdf_write']['bytes'], information['data'].nbytes)
+
+        merged = instrument.Recorder().merge(stats).merge(stats.as_dict())
+        self.assertEqual(merged.as_dict()['stages']['io']['calls'], 8)
+
+if __name__ == '__main__':
+    unittest.main()
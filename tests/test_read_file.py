@@ -1,7 +1,11 @@
+import os
+import shutil
+import tempfile
 import unittest
 import pickle
 import numpy as np
-from readice.read_file import SSMI_Tb, concentration, piomas
+from readice import get_geo_coords
+from readice.read_file import SSMI_Tb, concentration, piomas, piomas_many, read_many, parse_date, iter_concentration, iter_files
 
 class TestTools(unittest.TestCase):
 
@@ -102,5 +106,347 @@ class TestTools(unittest.TestCase):
 
         self.assertTrue(test_result)
 
+    def test_mmap(self):
+
+        with open('tests/test_results/piomas.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        array = piomas('tests/test_files/heff.H1993', mmap=True)
+
+        self.assertIsInstance(array, np.memmap)
+        self.assertFalse(array.flags['WRITEABLE'])
+        self.assertTrue(np.array_equal(array[3, 100:200], array_for_comparison[3, 100:200]))
+
+        with open('tests/test_results/SSMI_37_GHz_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        array = SSMI_Tb('tests/test_files/tb_f17_20190711_v5_n37h.bin', 'n', 37, mmap=True)
+
+        self.assertEqual(array.dtype, np.int16)
+        self.assertTrue(np.array_equal(array / 10, array_for_comparison))
+
+        # an open file is mapped from where it is, and its header is still read
+
+        with open('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'rb') as f:
+
+            mapped = concentration(f, 'n', mmap=True)
+
+            f.seek(0)
+
+            self.assertTrue(np.array_equal(mapped, concentration(f, 'n', raw=True)))
+
+    def test_read_many(self):
+
+        file_locations = ['tests/test_files/nt_19781111_n07_v1.1_n.bin',
+                          'tests/test_files/nt_19781111_n07_v1.1_n.bin']
+
+        cube = read_many(file_locations, 'concentration', hemisphere='n')
+
+        with open('tests/test_results/concentration_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        self.assertEqual(cube['data'].shape, (2, 448, 304))
+        self.assertTrue(np.array_equal(cube['data'][1], array_for_comparison))
+        self.assertEqual(cube['lon'].shape, (448, 304))
+        self.assertEqual(list(cube['time']), [np.datetime64('1978-11-11')] * 2)
+
+    def test_read_many_parallel(self):
+
+        file_locations = ['tests/test_files/tb_f17_20190711_v5_n37h.bin',
+                          'tests/test_files/missing_20190712_n37h.bin',
+                          'tests/test_files/tb_f17_20190711_v5_n37h.bin']
+
+        with open('tests/test_results/SSMI_37_GHz_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        for backend in ['thread', 'process']:
+
+            cube = read_many(file_locations, 'SSMI_Tb', hemisphere='n', frequency=37,
+                             workers=2, backend=backend, chunk_size=2)
+
+            self.assertTrue(np.array_equal(cube['data'][0], array_for_comparison))
+            self.assertTrue(np.array_equal(cube['data'][2], array_for_comparison))
+            self.assertTrue(np.isnan(cube['data'][1]).all())
+            self.assertEqual([error[:2] for error in cube['errors']],
+                             [(1, 'tests/test_files/missing_20190712_n37h.bin')])
+
+    def test_iter(self):
+
+        file_locations = ['tests/test_files/nt_19781113_n07_v1.1_s.bin'] * 3
+
+        with open('tests/test_results/concentration_sh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        steps = list(iter_concentration(file_locations, 's', reuse_buffer=True, prefetch=True))
+
+        self.assertEqual(len(steps), 3)
+        self.assertIs(steps[0][1], steps[2][1])
+        self.assertEqual(steps[0][0], np.datetime64('1978-11-13'))
+        self.assertTrue(np.array_equal(steps[2][1], array_for_comparison))
+
+    def test_region(self):
+
+        with open('tests/test_results/concentration_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        cropped = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n',
+                                with_coords=True, region='beaufort')
+
+        rows, cols = get_geo_coords.region_window('ps', 25, 'n', 'beaufort')
+
+        self.assertTrue(np.array_equal(cropped['data'], array_for_comparison[rows, cols]))
+        self.assertEqual(cropped['lat'].shape, cropped['data'].shape)
+        self.assertTrue((cropped['lat'] > 60).all())
+
+        # PIOMAS windows are on the native 120 x 360 grid, covering a small part of it
+
+        cropped = piomas('tests/test_files/heff.H1993', with_coords=True, region='beaufort')
+
+        rows, cols = get_geo_coords.region_window('piomas', None, 'n', 'beaufort')
+
+        native = piomas('tests/test_files/heff.H1993').reshape((12,) + get_geo_coords.PIOMAS_NATIVE_SHAPE)
+
+        self.assertTrue(np.array_equal(cropped['data'], native[:, rows, cols]))
+        self.assertEqual(cropped['lat'].shape, cropped['data'].shape[1:])
+        self.assertLess(cropped['lat'].size, 120 * 360 / 10)
+        self.assertTrue(((cropped['lat'] > 65) & (cropped['lat'] < 83)).all())
+
+        with self.assertRaises(ValueError):
+            read_many(['tests/test_files/nt_19781111_n07_v1.1_n.bin'], 'concentration', hemisphere='n',
+                      region='beaufort')
+
+    def test_compact_dtypes(self):
+
+        with open('tests/test_results/SSMI_37_GHz_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        file_location = 'tests/test_files/tb_f17_20190711_v5_n37h.bin'
+
+        packed = SSMI_Tb(file_location, 'n', 37, with_coords=True, raw=True, coord_dtype=np.float32)
+
+        self.assertEqual(packed['data'].dtype, np.int16)
+        self.assertEqual(packed['lon'].dtype, np.float32)
+        self.assertTrue(np.allclose(packed['data'] * packed['attrs']['scale_factor'], array_for_comparison))
+
+        single = SSMI_Tb(file_location, 'n', 37, dtype=np.float32)
+
+        self.assertEqual(single.dtype, np.float32)
+        self.assertTrue(np.allclose(single, array_for_comparison))
+
+        self.assertEqual(piomas('tests/test_files/heff.H1993', raw=True).dtype, np.float32)
+
+        flags = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', with_coords=True, raw=True)
+
+        self.assertEqual(flags['data'].dtype, np.uint8)
+        self.assertEqual(list(flags['attrs']['flag_values']), [251, 252, 253, 254, 255])
+        self.assertNotIn('scale_factor', flags['attrs'])
+
+        for workers in [None, 2]:
+
+            cube = read_many([file_location] * 2, 'SSMI_Tb', raw=True, workers=workers, hemisphere='n', frequency=37)
+
+            self.assertEqual(cube['data'].dtype, np.int16)
+            self.assertTrue(np.array_equal(cube['data'][1], packed['data']))
+            self.assertEqual(cube['attrs']['scale_factor'], 0.1)
+
+        steps = [data for time, data in iter_files([file_location] * 2, 'SSMI_Tb', raw=True, hemisphere='n',
+                                                    frequency=37)]
+
+        self.assertIsNot(steps[0], steps[1])
+        self.assertTrue(np.array_equal(steps[1], packed['data']))
+
+    def test_piomas_daily(self):
+
+        tmp_dir = tempfile.mkdtemp()
+
+        try:
+            # a daily file of a leap year and a monthly file only filled up to March
+
+            daily = np.random.default_rng(0).random((366, 360, 120), dtype=np.float32)
+            daily.tofile(os.path.join(tmp_dir, 'heff.H2020'))
+
+            monthly = piomas('tests/test_files/heff.H1993', raw=True)
+            monthly[:3].tofile(os.path.join(tmp_dir, 'heff.H2021'))
+
+            array = piomas(os.path.join(tmp_dir, 'heff.H2020'), dtype=np.float32)
+
+            self.assertEqual(array.shape, (366, 360, 120))
+            self.assertTrue(np.array_equal(array, daily))
+
+            # vector fields hold each component in turn
+
+            drift = piomas(os.path.join(tmp_dir, 'heff.H2020'), components=2, raw=True)
+
+            self.assertEqual(drift.shape, (183, 2, 360, 120))
+            self.assertTrue(np.array_equal(drift[1, 0], daily[2]))
+
+            file_locations = ['tests/test_files/heff.H1993'] + [os.path.join(tmp_dir, f'heff.H{year}')
+                                                                for year in [2020, 2021]]
+
+            for workers in [None, 2]:
+
+                cube = piomas_many(file_locations, workers=workers)
+
+                self.assertIsInstance(cube['data'], np.memmap)
+                self.assertEqual(cube['data'].shape, (12 + 366 + 3, 360, 120))
+                self.assertTrue(np.array_equal(cube['data'][:12], monthly))
+                self.assertTrue(np.array_equal(cube['data'][12:378], daily))
+                self.assertTrue(np.array_equal(cube['data'][378:], monthly[:3]))
+
+            self.assertEqual(cube['time'][11], np.datetime64('1993-12-01'))
+            self.assertEqual(cube['time'][12 + 59], np.datetime64('2020-02-29'))
+            self.assertEqual(cube['time'][-1], np.datetime64('2021-03-01'))
+            self.assertEqual(cube['lon'].shape, (360, 120))
+
+            cube = piomas_many(file_locations[:1], dtype=np.float64, file_location=os.path.join(tmp_dir, 'cube.dat'),
+                               with_coords=False)
+
+            self.assertEqual(cube['data'].filename, os.path.join(tmp_dir, 'cube.dat'))
+            self.assertTrue(np.array_equal(cube['data'], piomas('tests/test_files/heff.H1993')))
+
+            # a preallocated output is decoded into whatever its dtype
+
+            out = np.empty((12, 360, 120), dtype=np.float64)
+
+            cube = piomas_many(file_locations[:1], out=out, with_coords=False)
+
+            self.assertIs(cube['data'], out)
+            self.assertTrue(np.array_equal(out, piomas('tests/test_files/heff.H1993')))
+
+            # a daily file of the first days of January is only told apart from a monthly one by daily=True
+
+            daily[:5].tofile(os.path.join(tmp_dir, 'heff.H2023'))
+
+            early = piomas(os.path.join(tmp_dir, 'heff.H2023'), with_coords=True)
+            self.assertEqual(early['time'][-1], np.datetime64('2023-05-01'))
+
+            early = piomas(os.path.join(tmp_dir, 'heff.H2023'), with_coords=True, daily=True)
+            self.assertEqual(early['time'][-1], np.datetime64('2023-01-05'))
+
+            cube = piomas_many(file_locations[1:2] + [os.path.join(tmp_dir, 'heff.H2023')], daily=True,
+                               with_coords=False)
+            self.assertEqual(cube['time'][-1], np.datetime64('2023-01-05'))
+
+            with self.assertRaises(ValueError):
+                piomas_many(file_locations[1:2], daily=False)
+
+            with open(os.path.join(tmp_dir, 'heff.H2022'), 'wb') as fout:
+                fout.write(b'0' * 1000)
+
+            with self.assertRaises(ValueError):
+                piomas(os.path.join(tmp_dir, 'heff.H2022'))
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_compressed(self):
+
+        import bz2
+        import gzip
+
+        tmp_dir = tempfile.mkdtemp()
+
+        try:
+            file_location = 'tests/test_files/nt_19781111_n07_v1.1_n.bin'
+
+            with open(file_location, 'rb') as fin:
+                contents = fin.read()
+
+            gz_location = os.path.join(tmp_dir, 'nt_19781111_n07_v1.1_n.bin.gz')
+            bz2_location = os.path.join(tmp_dir, 'nt_19781112_n07_v1.1_n.bin.bz2')
+
+            with gzip.open(gz_location, 'wb') as fout:
+                fout.write(contents)
+
+            with bz2.open(bz2_location, 'wb') as fout:
+                fout.write(contents)
+
+            expected = concentration(file_location, 'n', with_coords=True)
+
+            for source in [gz_location, bz2_location]:
+
+                array = concentration(source, 'n', with_coords=True)
+
+                self.assertEqual(array['head'], expected['head'])
+                self.assertTrue(np.array_equal(array['data'], expected['data']))
+
+            with open(gz_location, 'rb') as fin:
+                self.assertTrue(np.array_equal(concentration(fin, 'n'), expected['data']))
+
+            array = concentration(gz_location, 'n', region='beaufort')
+            self.assertTrue(np.array_equal(array, concentration(file_location, 'n', region='beaufort')))
+
+            with self.assertRaises(ValueError):
+                concentration(gz_location, 'n', mmap=True)
+
+            # the batch and parallel paths
+
+            file_locations = [gz_location, bz2_location, file_location]
+
+            cube = read_many(file_locations, 'concentration', hemisphere='n', with_coords=False)
+
+            self.assertEqual(list(cube['time']), list(np.array(['1978-11-11', '1978-11-12', '1978-11-11'],
+                                                               dtype='datetime64[D]')))
+
+            for backend in ['thread', 'process']:
+
+                parallel_cube = read_many(file_locations, 'concentration', hemisphere='n', with_coords=False,
+                                          workers=2, backend=backend)
+
+                self.assertEqual(parallel_cube['errors'], [])
+                self.assertTrue(np.array_equal(parallel_cube['data'], cube['data']))
+
+            steps = list(iter_files(file_locations, 'concentration', hemisphere='n'))
+            self.assertTrue(np.array_equal(steps[1][1], expected['data']))
+
+            # PIOMAS records are counted from the gzip trailer; bzip2 files need them given
+
+            with open('tests/test_files/heff.H1993', 'rb') as fin:
+                contents = fin.read()
+
+            with gzip.open(os.path.join(tmp_dir, 'heff.H1993.gz'), 'wb') as fout:
+                fout.write(contents)
+
+            with bz2.open(os.path.join(tmp_dir, 'heff.H1993.bz2'), 'wb') as fout:
+                fout.write(contents)
+
+            expected = piomas('tests/test_files/heff.H1993')
+
+            self.assertTrue(np.array_equal(piomas(os.path.join(tmp_dir, 'heff.H1993.gz')), expected))
+            self.assertTrue(np.array_equal(piomas(os.path.join(tmp_dir, 'heff.H1993.bz2'), records=12), expected))
+
+            with self.assertRaises(ValueError):
+                piomas(os.path.join(tmp_dir, 'heff.H1993.bz2'))
+
+            cube = piomas_many([os.path.join(tmp_dir, 'heff.H1993.gz')], dtype=np.float64)
+
+            self.assertTrue(np.array_equal(cube['data'], expected))
+
+            compressed = [os.path.join(tmp_dir, 'heff.H1993.gz'), os.path.join(tmp_dir, 'heff.H1993.bz2')]
+
+            for records in [12, [None, 12]]:
+                cube = piomas_many(compressed, dtype=np.float64, records=records, with_coords=False)
+                self.assertTrue(np.array_equal(cube['data'], np.concatenate([expected, expected])))
+
+            with self.assertRaises(ValueError):
+                piomas_many(compressed)
+            self.assertEqual(cube['time'][0], np.datetime64('1993-01-01'))
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_parse_date(self):
+
+        self.assertEqual(parse_date('tests/test_files/tb_f17_20190711_v5_n37h.bin'), np.datetime64('2019-07-11'))
+        self.assertEqual(parse_date('AMSR_E_L3_SeaIce25km_V15_20020617.hdf'), np.datetime64('2002-06-17'))
+        self.assertTrue(np.isnat(parse_date('heff.H1993')))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
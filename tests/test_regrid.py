@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from readice import regrid
+from readice.read_file import piomas, concentration
+
+class TestRegrid(unittest.TestCase):
+
+    """This class tests regridding between the PIOMAS and polar stereographic grids."""
+
+    def setUp(self):
+        self.weights_dir = regrid.WEIGHTS_DIR
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        regrid.WEIGHTS_DIR = self.tmp_dir.name
+        regrid.clear_weights()
+
+    def tearDown(self):
+        regrid.WEIGHTS_DIR = self.weights_dir
+        regrid.clear_weights()
+        self.tmp_dir.cleanup()
+
+    def test_identity(self):
+
+        grid = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n')
+
+        for method in ['nearest', 'conservative']:
+            self.assertTrue(np.array_equal(regrid.regrid(grid, ('ps', 25, 'n'), ('ps', 25, 'n'), method), grid))
+
+    def test_piomas_to_ps(self):
+
+        thickness = piomas('tests/test_files/heff.H1993')
+
+        regridded = regrid.regrid(thickness, ('piomas', None, 'n'), ('ps', 25, 'n'), method='bilinear')
+
+        self.assertEqual(regridded.shape, (12, 448, 304))
+        weights_name = f'piomas_None_n_ps_25_n_bilinear_v{regrid.WEIGHTS_VERSION}.npz'
+
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, weights_name)))
+
+        # thickness is non-negative and the Arctic basin is covered
+
+        self.assertGreaterEqual(np.nanmin(regridded), 0)
+        self.assertFalse(np.isnan(regridded[:, 200:250, 130:170]).any())
+
+        # weights are reused, from memory or disk
+
+        weights = regrid.regrid_weights(('piomas', None, 'n'), ('ps', 25, 'n'), method='bilinear')
+        regrid.clear_weights()
+        self.assertEqual((weights != regrid.regrid_weights(('piomas', None, 'n'), ('ps', 25, 'n'),
+                                                           method='bilinear')).nnz, 0)
+
+    def test_missing(self):
+
+        grid = np.ones((448, 304))
+        grid[:, ::2] = np.nan
+
+        regridded = regrid.regrid(grid, ('ps', 25, 'n'), ('ps', 12.5, 'n'), method='bilinear')
+
+        self.assertTrue(np.allclose(regridded[~np.isnan(regridded)], 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import pickle
+import numpy as np
+from readice.get_geo_coords import polar_stereo, piomas_grid
+from readice.sample import grid_index, sample
+
+class TestSample(unittest.TestCase):
+
+    """This class tests extracting values at lon/lat points."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_ps_index(self):
+
+        coords = polar_stereo(resolution=12.5, hemisphere='s')
+
+        rows, cols = grid_index(coords['lon'], coords['lat'], resolution=12.5, hemisphere='s')
+
+        expected_rows, expected_cols = np.indices(coords['lon'].shape)
+
+        self.assertLess(np.abs(rows - expected_rows).max(), 1e-3)
+        self.assertLess(np.abs(cols - expected_cols).max(), 1e-3)
+
+    def test_piomas_index(self):
+
+        coords = piomas_grid()
+
+        rows, cols = grid_index(coords['lon'][::7, ::7], coords['lat'][::7, ::7], proj='piomas')
+
+        expected_rows, expected_cols = np.indices((120, 360))
+
+        self.assertLess(np.abs(rows - expected_rows.reshape(360, 120)[::7, ::7]).max(), 1e-6)
+        self.assertLess(np.abs(cols - expected_cols.reshape(360, 120)[::7, ::7]).max(), 1e-6)
+
+        # halfway between two neighbouring cells, including across the seam where the columns wrap around
+
+        lon = np.asarray(coords['lon']).reshape(120, 360)
+        lat = np.asarray(coords['lat']).reshape(120, 360)
+
+        native_rows, native_cols = np.indices((120, 360))
+
+        field = (native_rows + np.cos(np.radians(native_cols))).reshape(360, 120)
+
+        for col, next_col in [(10, 11), (359, 0)]:
+
+            midpoint_lon = np.degrees(np.angle(np.exp(1j * np.radians(lon[50, col]))
+                                               + np.exp(1j * np.radians(lon[50, next_col]))))
+            midpoint_lat = (lat[50, col] + lat[50, next_col]) / 2
+
+            value = sample(field, midpoint_lon, midpoint_lat, proj='piomas', method='bilinear')
+
+            self.assertAlmostEqual(float(value), 50 + np.cos(np.radians(col + 0.5)), places=1)
+
+    def test_sample(self):
+
+        with open('tests/test_results/SSMI_37_GHz_nh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        coords = polar_stereo(resolution=25, hemisphere='n')
+
+        lon, lat = coords['lon'][[100, 200], [50, 150]], coords['lat'][[100, 200], [50, 150]]
+
+        cube = np.stack([array_for_comparison, array_for_comparison + 1])
+
+        nearest = sample(cube, lon, lat)
+        self.assertTrue(np.array_equal(nearest[1], array_for_comparison[[100, 200], [50, 150]] + 1))
+
+        bilinear = sample(array_for_comparison, lon, lat, method='bilinear')
+        self.assertTrue(np.allclose(bilinear, array_for_comparison[[100, 200], [50, 150]], atol=0.1))
+
+        tracked = sample(cube, lon, lat, time_index=[0, 1])
+        self.assertTrue(np.array_equal(tracked, [array_for_comparison[100, 50], array_for_comparison[200, 150] + 1]))
+
+        self.assertTrue(np.isnan(sample(array_for_comparison, 0, 30)))
+
+
+if __name__ == '__main__':
+    unittest.main()
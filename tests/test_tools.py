@@ -0,0 +1,130 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import xarray as xr
+from readice.read_file import concentration, iter_concentration, iter_files, read_many
+from readice import tools
+from readice.get_geo_coords import polar_stereo
+from readice.tools import NetCDFWriter, dict_to_zarr, create_zarr, write_zarr_region, FramePlotter, plot_frames
+
+class TestTools(unittest.TestCase):
+
+    """This class tests the output tools."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_netcdf_writer(self):
+
+        file_locations = ['tests/test_files/nt_19781111_n07_v1.1_n.bin'] * 3
+
+        coords = polar_stereo(resolution=25, hemisphere='n')
+
+        output = os.path.join(self.tmp_dir.name, 'concentration.nc')
+
+        with NetCDFWriter(output, 'concentration', coords['lon'], coords['lat']) as writer:
+            for time, data in iter_concentration(file_locations[:2], 'n', reuse_buffer=True):
+                writer.append(data, time)
+
+        with NetCDFWriter(output, 'concentration', coords['lon'], coords['lat'], mode='a') as writer:
+            self.assertEqual(writer.append(data, '1978-11-12'), 3)
+
+        with xr.open_dataset(output) as ds:
+            self.assertEqual(ds['concentration'].shape, (3, 448, 304))
+            self.assertEqual(str(ds['time'].values[2])[:10], '1978-11-12')
+            self.assertTrue(np.array_equal(ds['concentration'].values[0], data))
+            self.assertTrue(np.array_equal(ds['lat'].values, coords['lat']))
+
+    def test_zarr(self):
+
+        cube = read_many(['tests/test_files/nt_19781111_n07_v1.1_n.bin'] * 2, 'concentration', hemisphere='n')
+
+        store = os.path.join(self.tmp_dir.name, 'concentration.zarr')
+
+        dict_to_zarr(cube, store, 'concentration', chunks=(1, 224, 152))
+        dict_to_zarr(cube, store, 'concentration', append=True)
+
+        with xr.open_zarr(store) as ds:
+            self.assertEqual(ds['concentration'].shape, (4, 448, 304))
+            self.assertEqual(ds['concentration'].encoding['chunks'], (1, 224, 152))
+            self.assertTrue(np.array_equal(ds['concentration'].values[3], cube['data'][1]))
+
+    def test_zarr_regions(self):
+
+        cube = read_many(['tests/test_files/nt_19781111_n07_v1.1_n.bin'] * 3, 'concentration', hemisphere='n')
+
+        store = os.path.join(self.tmp_dir.name, 'regions.zarr')
+
+        create_zarr(store, 'concentration', cube['lon'], cube['lat'], cube['time'])
+
+        for i in [2, 0, 1]:
+            write_zarr_region(store, 'concentration', cube['data'][i], time_start=i)
+
+        with xr.open_zarr(store) as ds:
+            self.assertTrue(np.array_equal(ds['concentration'].values, cube['data']))
+            self.assertTrue(np.array_equal(ds['time'].values, cube['time'].astype('datetime64[ns]')))
+
+
+    def test_plot_frames(self):
+
+        cube = read_many(['tests/test_files/tb_f17_20190711_v5_n37h.bin'] * 3, 'SSMI_Tb', hemisphere='n', frequency=37)
+
+        with FramePlotter(cube['lon'], cube['lat'], land=False, color_scale=(100, 300)) as plotter:
+
+            first = plotter.render(cube['data'][0])
+            second = plotter.render(cube['data'][1] - 50)
+
+        self.assertEqual(first.ndim, 3)
+        self.assertFalse(np.array_equal(first, second))
+
+        # masked cells are left blank and don't count towards the colour limits
+
+        flagged = concentration('tests/test_files/nt_19781111_n07_v1.1_n.bin', 'n', with_coords=True, flags='mask')
+
+        with FramePlotter(flagged['lon'], flagged['lat'], land=False) as plotter:
+
+            plotter.render(flagged['data'])
+
+            vmin, vmax = plotter.mesh.get_clim()
+
+            self.assertLessEqual(vmax, 250)
+            self.assertEqual(np.ma.getmaskarray(plotter.mesh.get_array()).sum(),
+                             flagged['data'][:-1, :-1].mask.sum())
+
+        pattern = os.path.join(self.tmp_dir.name, 'tb_{:03d}.png')
+
+        for workers in [None, 2]:
+
+            written = plot_frames(cube['lon'], cube['lat'], cube['data'], file_pattern=pattern, titles=cube['time'],
+                                  workers=workers, land=False)
+
+            self.assertEqual(written, [pattern.format(i) for i in range(3)])
+            self.assertTrue(all(os.path.getsize(f) > 0 for f in written))
+
+        # a generator, read in blocks for the workers; iter_files reuses one buffer for every step
+
+        steps = iter_files(['tests/test_files/tb_f17_20190711_v5_n37h.bin'] * 3, 'SSMI_Tb', reuse_buffer=True,
+                           hemisphere='n', frequency=37)
+
+        frames_per_task, tools.FRAMES_PER_TASK = tools.FRAMES_PER_TASK, 2
+
+        try:
+            written = plot_frames(cube['lon'], cube['lat'], (data for time, data in steps), file_pattern=pattern,
+                                  workers=2, land=False)
+        finally:
+            tools.FRAMES_PER_TASK = frames_per_task
+
+        self.assertEqual(written, [pattern.format(i) for i in range(3)])
+
+        animation = os.path.join(self.tmp_dir.name, 'tb.gif')
+
+        self.assertEqual(plot_frames(cube['lon'], cube['lat'], iter(cube['data']), output=animation, land=False),
+                         [animation])
+        self.assertGreater(os.path.getsize(animation), 0)
+
+if __name__ == '__main__':
+    unittest.main()
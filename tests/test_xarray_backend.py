@@ -0,0 +1,50 @@
+import unittest
+import pickle
+import numpy as np
+from readice.xarray_backend import open_dataset, open_mfdataset, guess_reader
+
+class TestXarrayBackend(unittest.TestCase):
+
+    """This class tests opening readice files lazily with xarray."""
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_guess_reader(self):
+
+        self.assertEqual(guess_reader('tests/test_files/tb_f17_20190710_v5_s19v.bin'),
+                         ('SSMI_Tb', {'hemisphere': 's', 'frequency': 19}))
+        self.assertEqual(guess_reader('nt_19781111_n07_v1.1_n.bin'), ('concentration', {'hemisphere': 'n'}))
+        self.assertEqual(guess_reader('heff.H1993'), ('piomas', {}))
+
+    def test_open_dataset(self):
+
+        with open('tests/test_results/SSMI_19_GHz_sh.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        ds = open_dataset('tests/test_files/tb_f17_20190710_v5_s19v.bin')
+
+        self.assertEqual(ds['Tb'].shape, (1, 332, 316))
+        self.assertEqual(ds['lon'].shape, (332, 316))
+        self.assertEqual(ds['time'].values[0], np.datetime64('2019-07-10'))
+        self.assertTrue(np.array_equal(ds['Tb'][0, 10:20].values, array_for_comparison[10:20]))
+
+    def test_open_mfdataset(self):
+
+        with open('tests/test_results/piomas.p', 'rb') as f:
+
+            array_for_comparison = pickle.load(f)
+
+        ds = open_mfdataset(['tests/test_files/heff.H1993'] * 2, chunks={'time': 1})
+
+        self.assertEqual(ds['heff'].shape, (24, 360, 120))
+        self.assertEqual(ds['heff'].data.chunksize, (1, 360, 120))
+        self.assertTrue(np.array_equal(ds['heff'][12:].values, array_for_comparison))
+
+
+if __name__ == '__main__':
+    unittest.main()